@@ -0,0 +1,141 @@
+"""
+In-memory audio decoding to the float32 16 kHz mono buffer Whisper expects.
+WAV is parsed straight from the upload bytes (zero-copy views of the sample data),
+FLAC goes through soundfile when installed, and anything else is piped through
+ffmpeg's stdin/stdout. MP4/M4A is the exception: its index (moov atom) is often
+at the end of the file and ffmpeg cannot seek a pipe, so it goes via a temp file.
+"""
+import io
+import os
+import tempfile
+import struct
+import logging
+import subprocess
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000  # whisper.audio.SAMPLE_RATE
+
+_WAVE_FORMAT_PCM = 1
+_WAVE_FORMAT_IEEE_FLOAT = 3
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class AudioDecodeError(Exception):
+    pass
+
+
+def _parse_wav(buf: memoryview):
+    """Return (samples, sample_rate, channels) where samples is a view into buf when possible."""
+    fmt = None
+    data = None
+    pos = 12
+    while pos + 8 <= len(buf):
+        chunk_id = bytes(buf[pos:pos + 4])
+        size = struct.unpack_from("<I", buf, pos + 4)[0]
+        body = buf[pos + 8:pos + 8 + size]
+        if chunk_id == b"fmt ":
+            fmt = struct.unpack_from("<HHIIHH", body)
+            if fmt[0] == _WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                # real format code is the first two bytes of the SubFormat GUID
+                fmt = (struct.unpack_from("<H", body, 24)[0],) + fmt[1:]
+        elif chunk_id == b"data":
+            data = body
+            break
+        pos += 8 + size + (size & 1)  # chunks are word-aligned
+
+    if fmt is None or data is None:
+        raise AudioDecodeError("WAV missing fmt or data chunk")
+
+    audio_format, channels, sample_rate, _, block_align, bits = fmt
+    usable = len(data) - len(data) % block_align
+    data = data[:usable]
+
+    if audio_format == _WAVE_FORMAT_PCM and bits == 16:
+        samples = np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+    elif audio_format == _WAVE_FORMAT_PCM and bits == 32:
+        samples = np.frombuffer(data, dtype="<i4").astype(np.float32) / 2147483648.0
+    elif audio_format == _WAVE_FORMAT_PCM and bits == 8:
+        samples = (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif audio_format == _WAVE_FORMAT_PCM and bits == 24:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+        ints = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8)
+                | (raw[:, 2].astype(np.int8).astype(np.int32) << 16))
+        samples = ints.astype(np.float32) / 8388608.0
+    elif audio_format == _WAVE_FORMAT_IEEE_FLOAT and bits == 32:
+        samples = np.frombuffer(data, dtype="<f4")  # zero-copy
+    elif audio_format == _WAVE_FORMAT_IEEE_FLOAT and bits == 64:
+        samples = np.frombuffer(data, dtype="<f8").astype(np.float32)
+    else:
+        raise AudioDecodeError(f"Unsupported WAV encoding (format={audio_format}, bits={bits})")
+    return samples, sample_rate, channels
+
+
+def _to_mono_16k(samples: np.ndarray, sample_rate: int, channels: int) -> np.ndarray:
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+    if sample_rate != SAMPLE_RATE:
+        from math import gcd
+        from scipy.signal import resample_poly
+        g = gcd(SAMPLE_RATE, sample_rate)
+        samples = resample_poly(samples, SAMPLE_RATE // g, sample_rate // g).astype(np.float32)
+    return samples
+
+
+def _decode_flac(audio_bytes: bytes):
+    try:
+        import soundfile
+    except ImportError:
+        return None
+    samples, sample_rate = soundfile.read(io.BytesIO(audio_bytes), dtype="float32", always_2d=True)
+    channels = samples.shape[1]
+    return _to_mono_16k(samples.reshape(-1), sample_rate, channels)
+
+
+def _is_mp4(audio_bytes: bytes) -> bool:
+    """ISO-BMFF (MP4/M4A/MOV): the first box is `ftyp` at byte offset 4."""
+    return audio_bytes[4:8] == b"ftyp"
+
+
+def decode_with_ffmpeg(audio_bytes: bytes, sr: int = SAMPLE_RATE) -> np.ndarray:
+    """Decode any ffmpeg-readable payload to stdout (mirrors whisper.load_audio).
+
+    Input goes through stdin, except MP4 payloads, which need a seekable file.
+    """
+    tmp_path = None
+    if _is_mp4(audio_bytes):
+        with tempfile.NamedTemporaryFile(suffix=".m4a", delete=False) as tmp:
+            tmp.write(audio_bytes)
+            tmp_path = tmp.name
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0", "-i", tmp_path or "pipe:0",
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sr), "pipe:1",
+    ]
+    try:
+        out = subprocess.run(cmd, input=None if tmp_path else audio_bytes,
+                             capture_output=True, check=True).stdout
+    except FileNotFoundError:
+        raise AudioDecodeError("ffmpeg not found; install ffmpeg to decode compressed audio")
+    except subprocess.CalledProcessError as e:
+        raise AudioDecodeError(f"ffmpeg failed to decode audio: {e.stderr.decode(errors='ignore')[-500:]}")
+    finally:
+        if tmp_path:
+            os.unlink(tmp_path)
+    return np.frombuffer(out, np.int16).astype(np.float32) / 32768.0
+
+
+def decode_audio_bytes(audio_bytes: bytes) -> np.ndarray:
+    """Decode an uploaded payload to a float32 mono 16 kHz array."""
+    head = audio_bytes[:12]
+    if head[:4] in (b"RIFF", b"RF64") and head[8:12] == b"WAVE":
+        try:
+            samples, sample_rate, channels = _parse_wav(memoryview(audio_bytes))
+            return _to_mono_16k(samples, sample_rate, channels)
+        except (AudioDecodeError, struct.error, ValueError) as e:
+            logger.warning(f"In-memory WAV decode failed, using ffmpeg: {e}")
+    elif head[:4] == b"fLaC":
+        decoded = _decode_flac(audio_bytes)
+        if decoded is not None:
+            return decoded
+    return decode_with_ffmpeg(audio_bytes)
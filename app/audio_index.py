@@ -0,0 +1,248 @@
+"""
+Persistent index of an audio directory.
+One os.scandir pass records every file's (size, mtime); later refreshes only
+stat the directory itself and rescan when its mtime moved, stat'ing just the
+names that appeared. Lookups are dict hits, so resolving a manifest costs no
+per-file metadata calls. Each file carries the index generation in which it
+first appeared, which lets batch jobs ask for files that are new since their
+last run. The index is saved as JSON under AUDIO_INDEX_DIR between runs.
+
+A file rewritten in place does not change its directory's mtime, and on
+filesystems with coarse timestamps a file added in the same tick as the last
+scan does not either. So the first check after loading, and every
+AUDIO_INDEX_FULL_RESCAN_EVERY checks after that, re-stat every file, and a
+directory mtime too close to the scan that read it is not trusted.
+refresh(full=True) forces a full re-stat.
+
+Several processes may share a saved index: a save never replaces a newer
+generation on disk (it adopts that listing instead) and keeps the furthest
+checkpoint of each consumer.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from app.config import AUDIO_INDEX_DIR, AUDIO_INDEX_CHECK_INTERVAL, AUDIO_INDEX_FULL_RESCAN_EVERY
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".flac", ".ogg")
+# FAT's mtime resolution; a directory changed this close to a scan may change again unseen
+_MTIME_SLACK_NS = 2_000_000_000
+
+
+class AudioDirIndex:
+    """name -> (size, mtime_ns, first_generation) for the files directly inside a directory."""
+
+    def __init__(self, directory: str, state_dir: str = AUDIO_INDEX_DIR,
+                 check_interval: float = AUDIO_INDEX_CHECK_INTERVAL,
+                 full_rescan_every: int = AUDIO_INDEX_FULL_RESCAN_EVERY):
+        self.directory = directory
+        key = hashlib.sha1(os.path.abspath(directory).encode("utf-8")).hexdigest()[:16]
+        self.state_path = os.path.join(state_dir, f"{key}.json") if state_dir else None
+        self.check_interval = check_interval
+        self.full_rescan_every = full_rescan_every
+        self.dir_mtime_ns = None
+        self.generation = 0
+        self.files = {}
+        self.checkpoints = {}  # consumer -> {"generation": last processed, "retry": failed names}
+        self._checked = 0.0
+        self._checks = 0       # directory checks since the last full re-stat
+        self._verified = False # whether this process has re-stat'ed the loaded listing
+        self._audio = None     # sorted audio names, rebuilt after changes
+        self._lock = threading.Lock()
+        self._load()
+
+    # ---------- persistence ----------
+    def _read_state(self):
+        """The saved state for this directory, or None."""
+        if not self.state_path:
+            return None
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable audio index %s: %s", self.state_path, e)
+            return None
+        if state.get("format") != FORMAT_VERSION or state.get("directory") != os.path.abspath(self.directory):
+            return None
+        return state
+
+    def _adopt(self, state: dict):
+        self.dir_mtime_ns = state["dir_mtime_ns"]
+        self.generation = state["generation"]
+        self.files = {name: tuple(entry) for name, entry in state["files"].items()}
+        self._audio = None
+
+    def _load(self):
+        state = self._read_state()
+        if state is not None:
+            self._adopt(state)
+            self.checkpoints = state.get("checkpoints", {})
+
+    def _save(self):
+        if not self.state_path:
+            return
+        disk = self._read_state()
+        if disk is not None:
+            if disk["generation"] > self.generation:
+                # another process saved a newer listing; take it rather than roll it back
+                self._adopt(disk)
+            for consumer, theirs in disk.get("checkpoints", {}).items():
+                ours = self.checkpoints.get(consumer)
+                if ours is None or theirs.get("generation", 0) > ours.get("generation", 0):
+                    self.checkpoints[consumer] = theirs
+        state = {
+            "format": FORMAT_VERSION,
+            "directory": os.path.abspath(self.directory),
+            "dir_mtime_ns": self.dir_mtime_ns,
+            "generation": self.generation,
+            "checkpoints": self.checkpoints,
+            "files": self.files,
+        }
+        try:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            # per-writer temp name so concurrent saves never interleave in one file
+            tmp = f"{self.state_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f, separators=(",", ":"))
+            os.replace(tmp, self.state_path)
+        except OSError as e:
+            logger.warning("Could not save audio index %s: %s", self.state_path, e)
+
+    # ---------- refresh ----------
+    def refresh(self, full: bool = False, force: bool = False) -> bool:
+        """Bring the index up to date. Returns True when files were added, changed or removed.
+
+        Unless forced, the directory is checked at most once per check_interval, so
+        per-file lookups cost no syscall; listings force the (single stat) check.
+        The first check in a process and every full_rescan_every-th one are full.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not (full or force) and now - self._checked < self.check_interval:
+                return False
+            self._checked = now
+            self._checks += 1
+            if not self._verified or (self.full_rescan_every and self._checks >= self.full_rescan_every):
+                full = True
+            try:
+                dir_mtime_ns = os.stat(self.directory).st_mtime_ns
+            except FileNotFoundError:
+                if not self.files:
+                    return False
+                self.files, self._audio, self.dir_mtime_ns = {}, None, None
+                self._save()
+                return True
+            if not full and dir_mtime_ns == self.dir_mtime_ns:
+                return False
+            changed = self._scan(full)
+            if full:
+                self._verified, self._checks = True, 0
+            # an mtime within one coarse tick of now may not move for the next change: rescan next time
+            self.dir_mtime_ns = dir_mtime_ns if time.time_ns() - dir_mtime_ns > _MTIME_SLACK_NS else None
+            if changed or full:
+                self._save()
+            return changed
+
+    def _scan(self, full: bool) -> bool:
+        generation = self.generation + 1
+        files, added, modified = {}, 0, 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                old = self.files.get(entry.name)
+                if old is not None and not full:
+                    files[entry.name] = old
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                if old is not None and (old[0], old[1]) == (st.st_size, st.st_mtime_ns):
+                    files[entry.name] = old
+                    continue
+                files[entry.name] = (st.st_size, st.st_mtime_ns, generation)
+                if old is None:
+                    added += 1
+                else:
+                    modified += 1
+        removed = len(self.files.keys() - files.keys())
+        self.files = files
+        self._audio = None
+        if added or modified:
+            self.generation = generation
+        if added or modified or removed:
+            logger.info("Audio index %s: +%d ~%d -%d files (%d total)",
+                        self.directory, added, modified, removed, len(files))
+        return bool(added or modified or removed)
+
+    # ---------- lookups ----------
+    def __contains__(self, name: str) -> bool:
+        self.refresh()
+        return name in self.files
+
+    def names(self) -> set:
+        self.refresh(force=True)
+        return set(self.files)
+
+    def path(self, name: str):
+        """Full path of name, or None if it is not in the directory."""
+        self.refresh()
+        return os.path.join(self.directory, name) if name in self.files else None
+
+    def audio_files(self) -> list:
+        """Sorted full paths of the audio files."""
+        self.refresh(force=True)
+        with self._lock:
+            if self._audio is None:
+                self._audio = sorted(n for n in self.files if n.lower().endswith(AUDIO_EXTENSIONS))
+            audio = self._audio
+        return [os.path.join(self.directory, n) for n in audio]
+
+    # ---------- new since last run ----------
+    def new_since(self, consumer: str) -> tuple:
+        """(sorted paths of audio files added or changed since consumer's last mark, generation).
+
+        Files the consumer reported as failed at its last mark are included again.
+        Pass the generation to mark_processed once those files are done.
+        """
+        self.refresh(force=True)
+        with self._lock:
+            checkpoint = self.checkpoints.get(consumer, {})
+            since, retry = checkpoint.get("generation", 0), set(checkpoint.get("retry", ()))
+            names = sorted(n for n, entry in self.files.items()
+                           if (entry[2] > since or n in retry) and n.lower().endswith(AUDIO_EXTENSIONS))
+            generation = self.generation
+        return [os.path.join(self.directory, n) for n in names], generation
+
+    def mark_processed(self, consumer: str, generation: int, failed=()):
+        """Advance consumer to generation; failed (file names or paths) come back from new_since."""
+        with self._lock:
+            checkpoint = self.checkpoints.get(consumer, {})
+            self.checkpoints[consumer] = {
+                "generation": max(generation, checkpoint.get("generation", 0)),
+                "retry": sorted(os.path.basename(f) for f in failed),
+            }
+            self._save()
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_audio_index(directory: str) -> AudioDirIndex:
+    """Shared index for a directory, created (and loaded from disk) on first use."""
+    key = os.path.abspath(directory)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = AudioDirIndex(directory)
+            _indexes[key] = index
+        return index
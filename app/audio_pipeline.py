@@ -0,0 +1,340 @@
+"""
+Staged batch pipeline for /batch/process-audio.
+Files flow decode -> ASR -> grammar -> scoring through bounded queues, each
+stage served by its own pool of threads, and the caller writes rows as they
+come out. Stages overlap (Whisper on one clip while LanguageTool corrects
+another), so throughput is set by the slowest stage rather than the sum, and
+the bounded queues keep memory flat however many files there are. Stages
+with a batch function take whatever has queued up (up to a batch size) in one
+call, so grammar correction and scoring keep their batched paths.
+"""
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from app.config import (
+    PIPELINE_QUEUE_SIZE, PIPELINE_DECODE_WORKERS, PIPELINE_ASR_WORKERS,
+    PIPELINE_GRAMMAR_WORKERS, PIPELINE_SCORE_WORKERS, PIPELINE_BATCH_SIZE, PIPELINE_MAX_PENDING
+)
+from app.result_writer import ResultWriter
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+_POLL_S = 0.1
+
+RESULT_COLUMNS = ["audio", "asr_text", "corrected_text", "wer", "score"]
+ALIGNMENT_COLUMNS = ["alignment_ops", "alignment_edits"]
+
+
+class Stage:
+    """fn(item) -> item run by `workers` threads; items carrying an "error" pass straight through.
+
+    With batch_fn(items) -> items, a worker hands it up to batch_size items that
+    are already waiting; if the batch call fails its items are retried one by one.
+    """
+
+    def __init__(self, name: str, fn, workers: int = 1, batch_fn=None, batch_size: int = 1):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.batch_fn = batch_fn
+        self.batch_size = max(1, batch_size) if batch_fn else 1
+        self.items = 0
+        self.errors = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+
+    def process(self, item: dict) -> dict:
+        if "error" in item:
+            return item
+        started = time.perf_counter()
+        try:
+            item = self.fn(item)
+            failed = False
+        except Exception as e:
+            logger.warning("Pipeline stage %s failed on %s: %s", self.name, item.get("audio"), e)
+            item["error"] = str(e)
+            failed = True
+        self._record(1, failed, time.perf_counter() - started)
+        return item
+
+    def process_batch(self, items: list) -> list:
+        todo = [item for item in items if "error" not in item]
+        if len(todo) < 2:
+            return [self.process(item) for item in items]
+        started = time.perf_counter()
+        try:
+            self.batch_fn(todo)
+        except Exception as e:
+            logger.warning("Pipeline stage %s batch of %d failed, retrying singly: %s", self.name, len(todo), e)
+            return [self.process(item) for item in items]
+        self._record(len(todo), 0, time.perf_counter() - started)
+        return items
+
+    def _record(self, items: int, errors: int, elapsed: float):
+        with self._lock:
+            self.items += items
+            self.errors += errors
+            self.busy += elapsed
+
+    def stats(self, wall: float) -> dict:
+        return {
+            "workers": self.workers,
+            "items": self.items,
+            "errors": self.errors,
+            "busy_s": round(self.busy, 3),
+            "avg_ms": round(self.busy / self.items * 1000, 2) if self.items else 0.0,
+            # share of the stage's thread-time spent working; the bottleneck is near 1
+            "utilisation": round(self.busy / (wall * self.workers), 3) if wall > 0 else 0.0,
+        }
+
+
+class StagedPipeline:
+    """Chain of Stages connected by bounded queues.
+
+    With max_pending, at most that many items are inside the pipeline or held
+    by the consumer at once: the consumer calls release() for each item it is
+    done with, and input is not read further until it does.
+    """
+
+    def __init__(self, stages: list, queue_size: int = PIPELINE_QUEUE_SIZE, max_pending: int = None):
+        self.stages = stages
+        self.queue_size = max(1, queue_size)
+        self.max_pending = max_pending
+        self._stop = threading.Event()
+        self._failure = None
+        self._window = None
+
+    def release(self):
+        if self._window is not None:
+            self._window.release()
+
+    def _acquire(self) -> bool:
+        while not self._stop.is_set():
+            if self._window.acquire(timeout=_POLL_S):
+                return True
+        return False
+
+    def _put(self, q: queue.Queue, value) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(value, timeout=_POLL_S)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=_POLL_S)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _feed(self, items, out: queue.Queue):
+        try:
+            for item in items:
+                if self._window is not None and not self._acquire():
+                    return
+                if not self._put(out, item):
+                    return
+        except Exception as e:
+            logger.exception("Pipeline input failed: %s", e)
+            self._failure = e
+            self._stop.set()
+        finally:
+            self._put(out, _DONE)
+
+    def _work(self, stage: Stage, inq: queue.Queue, outq: queue.Queue, remaining: list, lock):
+        try:
+            self._drain(stage, inq, outq, remaining, lock)
+        except Exception as e:
+            # a broken worker would leave the stage short of its end marker; stop everything instead
+            logger.exception("Pipeline worker for stage %s crashed: %s", stage.name, e)
+            self._failure = e
+            self._stop.set()
+
+    def _drain(self, stage: Stage, inq: queue.Queue, outq: queue.Queue, remaining: list, lock):
+        while True:
+            item = self._get(inq)
+            if item is _DONE:
+                # let the stage's other workers see the end marker too; the last one forwards it
+                self._put(inq, _DONE)
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    self._put(outq, _DONE)
+                return
+            if stage.batch_size == 1:
+                if not self._put(outq, stage.process(item)):
+                    return
+                continue
+            batch, done = [item], False
+            while len(batch) < stage.batch_size:
+                try:
+                    more = inq.get_nowait()
+                except queue.Empty:
+                    break
+                if more is _DONE:
+                    done = True
+                    break
+                batch.append(more)
+            for out in stage.process_batch(batch):
+                if not self._put(outq, out):
+                    return
+            if done:
+                # handle the end marker taken while filling the batch
+                self._put(inq, _DONE)
+
+    def run(self, items):
+        """Yield processed items in completion order; items is consumed lazily."""
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(target=self._feed, args=(items, queues[0]), name="pipeline-feed", daemon=True)]
+        for k, stage in enumerate(self.stages):
+            remaining, lock = [stage.workers], threading.Lock()
+            threads += [
+                threading.Thread(target=self._work, args=(stage, queues[k], queues[k + 1], remaining, lock),
+                                 name=f"pipeline-{stage.name}-{w}", daemon=True)
+                for w in range(stage.workers)
+            ]
+        self._stop.clear()
+        self._failure = None
+        self._window = threading.Semaphore(self.max_pending) if self.max_pending else None
+        for t in threads:
+            t.start()
+        try:
+            while True:
+                item = self._get(queues[-1])
+                if item is _DONE:
+                    if self._failure is not None:
+                        raise RuntimeError("batch pipeline stopped") from self._failure
+                    return
+                yield item
+        finally:
+            # consumer finished or gave up: unblock every stage and let the threads exit
+            self._stop.set()
+            for t in threads:
+                t.join(timeout=5)
+
+
+# ---------- /batch/process-audio stages ----------
+def _decode(item: dict) -> dict:
+    """Fingerprint the file and resolve cached transcripts, so cache hits skip ASR."""
+    from app.transcriber_enhanced import hash_audio_files, load_many_from_cache, cache_backends
+
+    path = item["path"]
+    sha = hash_audio_files([path])[path]
+    item["sha256"] = sha
+    cached = load_many_from_cache([sha], cache_backends()).get(sha)
+    if cached:
+        item["asr_text"] = cached
+    return item
+
+
+def _asr(item: dict) -> dict:
+    from app.transcriber_enhanced import transcribe_uncached_path
+
+    if "asr_text" not in item:
+        item["asr_text"] = transcribe_uncached_path(item["path"], item["sha256"])
+    return item
+
+
+def _grammar(item: dict) -> dict:
+    from app.grammar_enhanced import correct_grammar
+
+    item["corrected_text"] = correct_grammar(item["asr_text"])
+    return item
+
+
+def _grammar_batch(items: list) -> list:
+    # LanguageTool across its pool, leftovers through FLAN-T5 in padded batches
+    from app.grammar_enhanced import correct_grammar_batch
+
+    for item, corrected in zip(items, correct_grammar_batch([item["asr_text"] for item in items])):
+        item["corrected_text"] = corrected
+    return items
+
+
+def _score(alignment: bool):
+    from app.scoring import compute_wer_and_score
+
+    def score(item: dict) -> dict:
+        wer_val, score_val, *edits = compute_wer_and_score(
+            item["asr_text"], item["corrected_text"], return_alignment=alignment)
+        item["wer"] = round(wer_val, 4)
+        item["score"] = score_val
+        if edits:
+            item["alignment_ops"] = edits[0]["ops"]
+            item["alignment_edits"] = json.dumps(edits[0]["edits"])
+        return item
+    return score
+
+
+def _score_batch(items: list) -> list:
+    from app.scoring import compute_wer_and_score_batch
+
+    scores = compute_wer_and_score_batch([item["asr_text"] for item in items],
+                                         [item["corrected_text"] for item in items])
+    for item, (wer_val, score_val) in zip(items, scores):
+        item["wer"] = round(wer_val, 4)
+        item["score"] = score_val
+    return items
+
+
+def process_audio_files(audio_files: list, out_path: str, alignment: bool = False, progress=None) -> dict:
+    """Run every file through the pipeline and write one CSV row per file, in input order.
+
+    progress(done=, total=, errors=, item=) is called after each written row; an
+    exception it raises (e.g. job cancellation) stops the pipeline.
+    Returns the row counts, the paths that failed and per-stage timings.
+    """
+    stages = [
+        Stage("decode", _decode, PIPELINE_DECODE_WORKERS),
+        Stage("asr", _asr, PIPELINE_ASR_WORKERS),
+        Stage("grammar", _grammar, PIPELINE_GRAMMAR_WORKERS, _grammar_batch, PIPELINE_BATCH_SIZE),
+        # alignment needs the per-pair path; plain WER goes through the vectorised engine
+        Stage("score", _score(alignment), PIPELINE_SCORE_WORKERS,
+              None if alignment else _score_batch, PIPELINE_BATCH_SIZE),
+    ]
+    columns = RESULT_COLUMNS + (ALIGNMENT_COLUMNS if alignment else []) + ["error"]
+    items = ({"index": i, "path": p, "audio": os.path.basename(p)} for i, p in enumerate(audio_files))
+
+    started = time.perf_counter()
+    write_time = 0.0
+    failed = []
+    pending, next_index = {}, 0
+    # bounds the reorder buffer: workers run at most PIPELINE_MAX_PENDING files ahead of the writer
+    pipeline = StagedPipeline(stages, max_pending=PIPELINE_MAX_PENDING)
+    results = pipeline.run(items)
+    with ResultWriter(out_path, columns) as writer:
+        try:
+            for item in results:
+                # rows finish out of order; hold them until their predecessors are written
+                pending[item["index"]] = item
+                t = time.perf_counter()
+                while next_index in pending:
+                    row = pending.pop(next_index)
+                    if "error" in row:
+                        failed.append(row["path"])
+                    writer.write(row)
+                    pipeline.release()
+                    next_index += 1
+                    if progress:
+                        progress(done=next_index, total=len(audio_files), errors=len(failed),
+                                 item={k: row[k] for k in columns if k in row})
+                write_time += time.perf_counter() - t
+        finally:
+            results.close()
+    wall = time.perf_counter() - started
+
+    timings = {stage.name: stage.stats(wall) for stage in stages}
+    timings["write"] = {"workers": 1, "items": next_index, "busy_s": round(write_time, 3)}
+    logger.info("Batch pipeline: %d files in %.1fs (%s)", next_index, wall,
+                ", ".join(f"{s.name} {s.busy:.1f}s" for s in stages))
+    return {"processed": next_index, "errors": len(failed), "failed": failed, "wall_s": round(wall, 3),
+            "stages": timings}
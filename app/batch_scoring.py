@@ -1,9 +1,10 @@
-from app.grammar_enhanced import correct_grammar
-from app.scoring import compute_wer_and_score
+from app.grammar_enhanced import correct_grammar, correct_grammar_batch
+from app.scoring import compute_wer_and_score, compute_wer_and_score_batch
 
-def score_text_item(text: str):
+def score_text_item(text: str, corrected: str = None):
     try:
-        corrected = correct_grammar(text)
+        if corrected is None:
+            corrected = correct_grammar(text)
         wer_value, score = compute_wer_and_score(text, corrected)
         return {
             "input": text,
@@ -18,7 +19,14 @@ def score_text_item(text: str):
         }
 
 def score_text_batch(texts: list[str]):
+    # correct all texts in one batched pass, then score each pair
+    corrected = correct_grammar_batch(texts)
     results = []
-    for t in texts:
-        results.append(score_text_item(t))
+    for t, c, (wer_value, score) in zip(texts, corrected, compute_wer_and_score_batch(texts, corrected)):
+        results.append({
+            "input": t,
+            "corrected": c,
+            "wer": round(wer_value, 4),
+            "score": score
+        })
     return results
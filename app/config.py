@@ -9,9 +9,17 @@ load_dotenv(dotenv_path=Path(__file__).parent.parent / ".env")
 # Use local Whisper (offline, no API quota limits) - RECOMMENDED
 USE_LOCAL_WHISPER = os.getenv("USE_LOCAL_WHISPER", "true").lower() in ("1", "true", "yes")
 LOCAL_WHISPER_MODEL = os.getenv("LOCAL_WHISPER_MODEL", "base").strip()  # tiny, base, small, medium, large
+WHISPER_DEVICE = os.getenv("WHISPER_DEVICE", "").strip()  # cpu, cuda (empty = auto-detect)
+WHISPER_DTYPE = os.getenv("WHISPER_DTYPE", "float32").strip()  # float32, float16 (GPU only)
+WHISPER_MAX_RESIDENT_MODELS = int(os.getenv("WHISPER_MAX_RESIDENT_MODELS", "1"))
+WHISPER_WARMUP = os.getenv("WHISPER_WARMUP", "lazy").strip().lower()  # lazy, eager
 
 # Use local LanguageTool (offline, rule-based grammar) - RECOMMENDED
 USE_LOCAL_LANGUAGE_TOOL = os.getenv("USE_LOCAL_LANGUAGE_TOOL", "true").lower() in ("1", "true", "yes")
+LANGUAGE_TOOL_LANGUAGE = os.getenv("LANGUAGE_TOOL_LANGUAGE", "en-US").strip()
+LANGUAGE_TOOL_POOL_SIZE = int(os.getenv("LANGUAGE_TOOL_POOL_SIZE", "2"))  # JVM-backed instances
+LANGUAGE_TOOL_SERVER_URL = os.getenv("LANGUAGE_TOOL_SERVER_URL", "").strip()  # optional external server
+LANGUAGE_TOOL_RETRY_BACKOFF = float(os.getenv("LANGUAGE_TOOL_RETRY_BACKOFF", "30"))  # seconds before retrying a failed start (doubles)
 
 # ==================== FALLBACK APIS ====================
 # GROQ (limited tier ~25 req/min free)
@@ -23,11 +31,73 @@ GROQ_LLM_MODEL = os.getenv("GROQ_LLM_MODEL", "llama-3.3-70b-versatile").strip()
 USE_HF_FALLBACK = os.getenv("USE_HF_FALLBACK", "true").lower() in ("1", "true", "yes")
 HF_TOKEN = os.getenv("HF_TOKEN", "").strip()
 HF_GRAMMAR_MODEL = os.getenv("HF_GRAMMAR_MODEL", "pszemraj/flan-t5-base-grammar-synthesis").strip()
+HF_BATCH_SIZE = int(os.getenv("HF_BATCH_SIZE", "16"))  # texts per batched generate() call
+HF_NUM_BEAMS = int(os.getenv("HF_NUM_BEAMS", "4"))
+HF_MAX_LENGTH = int(os.getenv("HF_MAX_LENGTH", "512"))
 
 # ==================== PERFORMANCE SETTINGS ====================
 MAX_CHARS = int(os.getenv("MAX_CHARS", "500"))
 REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", "30"))
 BATCH_SIZE = int(os.getenv("BATCH_SIZE", "4"))
+# Persistent Whisper worker pool (batch transcription)
+ASR_WORKERS = int(os.getenv("ASR_WORKERS", str(BATCH_SIZE)))
+ASR_TORCH_THREADS = int(os.getenv("ASR_TORCH_THREADS", "0"))  # 0 = cpu_count // ASR_WORKERS
+ASR_CHUNK_SIZE = int(os.getenv("ASR_CHUNK_SIZE", "4"))  # files dispatched per worker task
+# /batch/process-audio stage concurrency (threads per stage) and queue bound between stages
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "16"))
+PIPELINE_DECODE_WORKERS = int(os.getenv("PIPELINE_DECODE_WORKERS", "2"))
+PIPELINE_ASR_WORKERS = int(os.getenv("PIPELINE_ASR_WORKERS", str(ASR_WORKERS)))  # files in flight on the Whisper pool
+PIPELINE_GRAMMAR_WORKERS = int(os.getenv("PIPELINE_GRAMMAR_WORKERS", str(LANGUAGE_TOOL_POOL_SIZE)))
+PIPELINE_SCORE_WORKERS = int(os.getenv("PIPELINE_SCORE_WORKERS", "1"))
+PIPELINE_BATCH_SIZE = int(os.getenv("PIPELINE_BATCH_SIZE", "8"))  # max queued clips a grammar/score call takes
+PIPELINE_MAX_PENDING = int(os.getenv("PIPELINE_MAX_PENDING", "64"))  # clips in flight ahead of the results writer
+
+# Long recordings: split at pauses and transcribe segments in parallel on the pool
+LONG_AUDIO_THRESHOLD_S = float(os.getenv("LONG_AUDIO_THRESHOLD_S", "90"))
+VAD_MAX_SEGMENT_S = float(os.getenv("VAD_MAX_SEGMENT_S", "30"))
+VAD_MIN_SILENCE_MS = float(os.getenv("VAD_MIN_SILENCE_MS", "300"))
+VAD_ENERGY_THRESHOLD_DB = float(os.getenv("VAD_ENERGY_THRESHOLD_DB", "-40"))  # dBFS below = silence
+VAD_FRAME_MS = float(os.getenv("VAD_FRAME_MS", "30"))
+
+# /score/ inference executor (admission control + timeouts)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+INFERENCE_QUEUE_DEPTH = int(os.getenv("INFERENCE_QUEUE_DEPTH", "8"))  # requests waiting beyond workers
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", "120"))  # seconds per /score/ request
+INFERENCE_RETRY_AFTER = int(os.getenv("INFERENCE_RETRY_AFTER", "5"))  # Retry-After seconds when saturated
+# background jobs (/batch/process-audio, /kaggle/submit, /train/evaluate, /model/predict-kaggle)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))  # jobs running at once
+JOB_QUEUE_DEPTH = int(os.getenv("JOB_QUEUE_DEPTH", "4"))  # jobs waiting beyond JOB_WORKERS
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "50"))  # finished jobs kept for polling
+JOB_PARTIAL_RESULTS = int(os.getenv("JOB_PARTIAL_RESULTS", "20"))  # latest rows shown per job
+JOB_EVENT_INTERVAL = float(os.getenv("JOB_EVENT_INTERVAL", "0.5"))  # SSE polling period (seconds)
+RESULT_FLUSH_ROWS = int(os.getenv("RESULT_FLUSH_ROWS", "50"))  # rows buffered before batch outputs are flushed
+# Micro-batching of concurrent /score/ requests (opt-in; 0 window disables)
+MICRO_BATCH_WINDOW_MS = float(os.getenv("MICRO_BATCH_WINDOW_MS", "0"))
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", "8"))
+MICRO_BATCH_SLO_MS = float(os.getenv("MICRO_BATCH_SLO_MS", "0"))  # per-request latency budget (0 = none)
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))  # event-loop lag sampling period
+# Batch WER engine (offline scoring)
+WER_WORKERS = int(os.getenv("WER_WORKERS", "0"))  # processes for very large batches (0 = cpu_count)
+WER_PARALLEL_MIN_PAIRS = int(os.getenv("WER_PARALLEL_MIN_PAIRS", "50000"))  # below this, score in-process
+PREDICT_N_JOBS = int(os.getenv("PREDICT_N_JOBS", "-1"))  # threads for batch model.predict (-1 = all cores)
+MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", "2"))  # seconds between model artifact checks (0 = off)
+# /model/train?mode=search
+TRAIN_CV_FOLDS = int(os.getenv("TRAIN_CV_FOLDS", "5"))
+TRAIN_SEARCH_FACTOR = int(os.getenv("TRAIN_SEARCH_FACTOR", "3"))  # successive halving: keep 1/factor per round
+TRAIN_SEARCH_SPACE = os.getenv("TRAIN_SEARCH_SPACE", "").strip()  # optional JSON file overriding the default grid
+TRAIN_N_JOBS = int(os.getenv("TRAIN_N_JOBS", "-1"))  # parallel CV fits (-1 = all cores)
+
+# ==================== STORAGE ====================
+TRANSCRIPT_DB_PATH = os.getenv("TRANSCRIPT_DB_PATH", "data/transcripts.sqlite3").strip()
+# serve imported pre-store transcripts (backend/model unknown) when nothing else is cached
+USE_LEGACY_TRANSCRIPTS = os.getenv("USE_LEGACY_TRANSCRIPTS", "false").lower() in ("1", "true", "yes")
+FEATURE_STORE_DIR = os.getenv("FEATURE_STORE_DIR", "data/feature_store").strip()  # columnar train features
+TRAIN_SHARD_SIZE = int(os.getenv("TRAIN_SHARD_SIZE", "256"))  # clips per checkpointed /train/evaluate shard
+TRAIN_CHECKPOINT_DIR = os.getenv("TRAIN_CHECKPOINT_DIR", "data/kaggle/train_eval").strip()
+MANIFEST_CHUNK_ROWS = int(os.getenv("MANIFEST_CHUNK_ROWS", "10000"))  # train/test.csv rows read per chunk
+AUDIO_INDEX_DIR = os.getenv("AUDIO_INDEX_DIR", "data/audio_index").strip()  # persisted audio directory listings
+AUDIO_INDEX_CHECK_INTERVAL = float(os.getenv("AUDIO_INDEX_CHECK_INTERVAL", "1"))  # seconds between directory mtime checks
+AUDIO_INDEX_FULL_RESCAN_EVERY = int(os.getenv("AUDIO_INDEX_FULL_RESCAN_EVERY", "100"))  # checks between full re-stats (0 = never)
 
 # ==================== LOGGING ====================
 import logging
@@ -0,0 +1,320 @@
+"""
+Columnar store for training features.
+Each column is a standalone .npy file (text columns are a UTF-8 byte blob plus
+offsets), so readers memory-map only the columns they need. Rows are keyed by
+clip filename and transcript hash; an update recomputes features only for new
+or changed clips and for feature columns whose registered version changed, then
+publishes the new generation by atomically replacing manifest.json.
+"""
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from app.config import FEATURE_STORE_DIR
+from app.fluency_features import extract_fluency_features_batch, registered_features, feature_version
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+
+TEXT_COLUMNS = ("filename", "transcript_sha", "asr_text", "error")
+# True where the row has features (no file/transcription error)
+VALID_COLUMN = "has_features"
+
+
+def transcript_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _encode_text(values) -> tuple:
+    encoded = [(v or "").encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+class FeatureStore:
+    """Generation-versioned directory of column files described by manifest.json."""
+
+    def __init__(self, root: str = FEATURE_STORE_DIR):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+
+    # ---------- reading ----------
+    def manifest(self):
+        try:
+            with open(self.root / MANIFEST, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        if manifest.get("format") != FORMAT_VERSION:
+            logger.warning("Ignoring feature store with format %s", manifest.get("format"))
+            return None
+        return manifest
+
+    def exists(self) -> bool:
+        return self.manifest() is not None
+
+    def _array(self, manifest: dict, name: str, mmap: bool = True) -> np.ndarray:
+        return np.load(self.root / manifest["columns"][name]["file"], mmap_mode="r" if mmap else None)
+
+    def _text(self, manifest: dict, name: str) -> list:
+        info = manifest["columns"][name]
+        blob = np.load(self.root / info["file"], mmap_mode="r")
+        offsets = np.load(self.root / info["offsets"])
+        data = blob.tobytes() if len(blob) else b""
+        return [data[a:b].decode("utf-8") for a, b in zip(offsets[:-1], offsets[1:])]
+
+    def load_arrays(self, columns: list, manifest: dict = None) -> dict:
+        """Numeric columns as read-only memory maps (no NaN masking)."""
+        manifest = manifest or self.manifest()
+        if manifest is None:
+            raise FileNotFoundError(f"No feature store at {self.root}")
+        return {c: self._array(manifest, c) for c in columns}
+
+    def load(self, columns: list = None) -> pd.DataFrame:
+        """DataFrame of the requested columns; feature values are NaN on rows without features."""
+        manifest = self.manifest()
+        if manifest is None:
+            raise FileNotFoundError(f"No feature store at {self.root}")
+        columns = list(columns or manifest["columns"])
+        valid = self._array(manifest, VALID_COLUMN)
+        data = {}
+        for c in columns:
+            info = manifest["columns"][c]
+            if info["kind"] == "text":
+                data[c] = self._text(manifest, c)
+            elif info["kind"] == "feature":
+                data[c] = np.where(valid, self._array(manifest, c), np.nan)
+            else:
+                data[c] = np.asarray(self._array(manifest, c))
+        return pd.DataFrame(data, columns=columns)
+
+    # ---------- writing ----------
+    def update(self, filenames: list, labels: list, texts: list, errors: list) -> dict:
+        """Replace the store contents with these rows, reusing stored feature values.
+
+        texts[i] is the transcript (None when errors[i] is set). Features are
+        computed only for rows whose (filename, transcript hash) is not stored
+        yet and for columns that are new or whose registered version changed.
+        Returns the per-row feature values plus counts of what was computed.
+        """
+        with self.open_update() as update:
+            part = update.append(filenames, labels, texts, errors)
+        return {**part, "stats": update.stats}
+
+    def open_update(self) -> "StoreUpdate":
+        """Start replacing the store contents part by part; see StoreUpdate."""
+        return StoreUpdate(self)
+
+
+class _ColumnSink:
+    """One column of the next generation, appended to a raw file and framed as .npy on close."""
+
+    def __init__(self, path: Path, dtype):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.length = 0
+        self._raw = open(f"{path}.raw", "wb")
+
+    def append(self, values):
+        arr = np.ascontiguousarray(values, dtype=self.dtype)
+        self._raw.write(arr.tobytes())
+        self.length += len(arr)
+
+    def close(self):
+        self._raw.close()
+        header = {"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False,
+                  "shape": (self.length,)}
+        with open(self.path, "wb") as out, open(self._raw.name, "rb") as raw:
+            np.lib.format.write_array_header_1_0(out, header)
+            shutil.copyfileobj(raw, out)
+        os.remove(self._raw.name)
+
+    def abort(self):
+        self._raw.close()
+        for p in (self._raw.name, self.path):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+
+class _TextSink:
+    """UTF-8 blob plus int64 offsets, the layout FeatureStore._text reads."""
+
+    def __init__(self, path: Path, offsets_path: Path):
+        self.blob = _ColumnSink(path, np.uint8)
+        self.offsets = _ColumnSink(offsets_path, np.int64)
+        self.offsets.append([0])
+        self._end = 0
+
+    def append(self, values):
+        blob, offsets = _encode_text(values)
+        self.blob.append(blob)
+        self.offsets.append(offsets[1:] + self._end)
+        self._end += int(offsets[-1])
+
+    def close(self):
+        self.blob.close()
+        self.offsets.close()
+
+    def abort(self):
+        self.blob.abort()
+        self.offsets.abort()
+
+
+class StoreUpdate:
+    """Next store generation, written one part of rows at a time.
+
+    Use as a context manager: append() each part in order, and the new
+    generation is published on a clean exit (discarded on an exception). Only
+    the current part and the (filename, transcript hash) keys of the previous
+    generation are held in memory; old feature values are read from its
+    memory-mapped columns.
+    """
+
+    def __init__(self, store: FeatureStore):
+        self.store = store
+        self.columns = registered_features()
+        self.stats = {"rows": 0, "computed_rows": 0, "reused_rows": 0, "recomputed_columns": []}
+        self._sinks = {}
+
+    def __enter__(self) -> "StoreUpdate":
+        self.store._lock.acquire()
+        try:
+            self._open()
+        except BaseException:
+            self.store._lock.release()
+            raise
+        return self
+
+    def _open(self):
+        root = self.store.root
+        root.mkdir(parents=True, exist_ok=True)
+        self.old = self.store.manifest()
+        self.generation = (self.old or {}).get("generation", 0) + 1
+        self.index = {}
+        self.current = []
+        if self.old is not None:
+            old_valid = self.store._array(self.old, VALID_COLUMN)
+            self.index = {
+                key: i for i, key in enumerate(zip(self.store._text(self.old, "filename"),
+                                                   self.store._text(self.old, "transcript_sha")))
+                if old_valid[i]
+            }
+            self.current = [c for c in self.columns
+                            if self.old["columns"].get(c, {}).get("version") == feature_version(c)]
+        self.stale = [c for c in self.columns if c not in self.current]
+        self.dtypes = extract_fluency_features_batch([""], self.columns).dtypes
+
+        def path(name):
+            return root / f"{name}.{self.generation}.npy"
+
+        for name in TEXT_COLUMNS:
+            self._sinks[name] = _TextSink(path(name), root / f"{name}.offsets.{self.generation}.npy")
+        self._sinks["true_label"] = _ColumnSink(path("true_label"), np.float64)
+        self._sinks[VALID_COLUMN] = _ColumnSink(path(VALID_COLUMN), bool)
+        for c in self.columns:
+            self._sinks[c] = _ColumnSink(path(c), self.dtypes[c])
+
+    def append(self, filenames: list, labels: list, texts: list, errors: list) -> dict:
+        """Add rows; returns their validity mask and feature values (like FeatureStore.update)."""
+        n = len(filenames)
+        valid = np.array([t is not None and not e for t, e in zip(texts, errors)], dtype=bool)
+        shas = [transcript_hash(t) if ok else "" for t, ok in zip(texts, valid)]
+        src = np.array([self.index.get((fn, sha), -1) if ok else -1
+                        for fn, sha, ok in zip(filenames, shas, valid)], dtype=np.int64)
+        reuse = src >= 0
+        fresh = valid & ~reuse
+
+        texts = np.array(texts, dtype=object)
+        new_feats = extract_fluency_features_batch(texts[fresh], self.columns) if fresh.any() else None
+        stale_feats = (extract_fluency_features_batch(texts[reuse], self.stale)
+                       if reuse.any() and self.stale else None)
+
+        values = {}
+        for c in self.columns:
+            col = np.zeros(n, dtype=self.dtypes[c])
+            if new_feats is not None:
+                col[fresh] = new_feats[c].to_numpy()
+            if reuse.any():
+                col[reuse] = (self.store._array(self.old, c)[src[reuse]] if c in self.current
+                              else stale_feats[c].to_numpy())
+            values[c] = col
+
+        self._sinks["filename"].append(filenames)
+        self._sinks["transcript_sha"].append(shas)
+        self._sinks["asr_text"].append([t if ok else "" for t, ok in zip(texts, valid)])
+        self._sinks["error"].append([e or "" for e in errors])
+        self._sinks["true_label"].append(np.asarray(labels, dtype=np.float64))
+        self._sinks[VALID_COLUMN].append(valid)
+        for c in self.columns:
+            self._sinks[c].append(values[c])
+
+        self.stats["rows"] += n
+        self.stats["computed_rows"] += int(fresh.sum())
+        self.stats["reused_rows"] += int(reuse.sum())
+        if reuse.any():
+            self.stats["recomputed_columns"] = self.stale
+        return {"valid": valid, "values": values}
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._publish()
+            else:
+                for sink in self._sinks.values():
+                    sink.abort()
+        finally:
+            self.store._lock.release()
+        return False
+
+    def _publish(self):
+        for sink in self._sinks.values():
+            sink.close()
+        root = self.store.root
+        columns = {}
+        for name in TEXT_COLUMNS:
+            sink = self._sinks[name]
+            columns[name] = {"file": sink.blob.path.name, "kind": "text", "offsets": sink.offsets.path.name}
+        columns["true_label"] = {"file": self._sinks["true_label"].path.name, "kind": "label"}
+        columns[VALID_COLUMN] = {"file": self._sinks[VALID_COLUMN].path.name, "kind": "mask"}
+        for c in self.columns:
+            columns[c] = {"file": self._sinks[c].path.name, "kind": "feature", "version": feature_version(c),
+                          "dtype": str(self._sinks[c].dtype)}
+
+        manifest = {"format": FORMAT_VERSION, "generation": self.generation, "rows": self.stats["rows"],
+                    "columns": columns}
+        tmp = root / f"{MANIFEST}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, root / MANIFEST)
+        logger.info("Feature store updated: %s", self.stats)
+
+        # drop files of earlier generations (open memory maps stay valid on POSIX)
+        keep = {i["file"] for i in columns.values()} | {i["offsets"] for i in columns.values() if "offsets" in i}
+        for p in root.glob("*.npy"):
+            if p.name not in keep:
+                try:
+                    p.unlink()
+                except OSError:
+                    pass
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_feature_store() -> FeatureStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FeatureStore()
+        return _store
@@ -0,0 +1,138 @@
+"""
+Columnar fluency features over whole transcript corpora.
+Every transcript is tokenised once (str.split) into one flat array of token
+codes against a shared vocabulary; each feature is then a vectorised reduction
+over those codes, with per-token properties (length, filler, punctuation)
+computed once per distinct token. Output matches
+train_evaluate.extract_fluency_features row for row.
+
+New columns are added with @register_feature and reuse the same tokenisation;
+each carries a version so the feature store knows when to recompute it.
+"""
+import numpy as np
+import pandas as pd
+
+FILLERS = frozenset({"uh", "um", "erm", "hmm"})
+PUNCTUATION = (".", ",", "?", "!")
+
+# default model inputs, in the order the model was trained with
+FLUENCY_FEATURES = ["len_words", "avg_word_len", "fillers", "repetitions", "punctuation"]
+
+_FEATURES = {}
+_VERSIONS = {}
+
+
+def register_feature(name: str, version: int = 1):
+    """Register fn(corpus) -> array of one value per document as feature `name`.
+
+    Bump version when the definition changes so stored values get recomputed.
+    """
+    def decorator(fn):
+        _FEATURES[name] = fn
+        _VERSIONS[name] = version
+        return fn
+    return decorator
+
+
+def registered_features() -> list:
+    return list(_FEATURES)
+
+
+def feature_version(name: str) -> int:
+    return _VERSIONS[name]
+
+
+class TokenizedCorpus:
+    """Flat token codes for a sequence of transcripts.
+
+    codes[k] is the vocabulary index of token k, doc_ids[k] its document and
+    starts/lengths the token range of each document.
+    """
+
+    def __init__(self, texts):
+        self.texts = texts
+        tokens, lengths = [], np.zeros(len(texts), dtype=np.int64)
+        self.valid = np.ones(len(texts), dtype=bool)
+        for i, text in enumerate(texts):
+            if not isinstance(text, str):
+                self.valid[i] = False
+                continue
+            words = text.split()
+            tokens.extend(words)
+            lengths[i] = len(words)
+        if tokens:
+            self.codes, self.vocab = pd.factorize(np.array(tokens, dtype=object))
+        else:
+            self.codes, self.vocab = np.zeros(0, dtype=np.int64), np.array([], dtype=object)
+        self.lengths = lengths
+        self.starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) if len(texts) else lengths
+        self.doc_ids = np.repeat(np.arange(len(texts)), lengths)
+        self._token_props = {}
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def token_property(self, name: str, fn, dtype=np.int64) -> np.ndarray:
+        """fn applied once per distinct token, broadcast to every token occurrence."""
+        if name not in self._token_props:
+            per_vocab = np.fromiter((fn(w) for w in self.vocab), dtype=dtype, count=len(self.vocab))
+            self._token_props[name] = per_vocab[self.codes]
+        return self._token_props[name]
+
+    def per_doc_sum(self, values: np.ndarray) -> np.ndarray:
+        return np.bincount(self.doc_ids, weights=values, minlength=len(self)).astype(values.dtype)
+
+
+@register_feature("len_words")
+def _len_words(corpus: TokenizedCorpus) -> np.ndarray:
+    return corpus.lengths
+
+
+@register_feature("avg_word_len")
+def _avg_word_len(corpus: TokenizedCorpus) -> np.ndarray:
+    chars = corpus.per_doc_sum(corpus.token_property("len", len))
+    out = np.zeros(len(corpus), dtype=np.float64)
+    np.divide(chars, corpus.lengths, out=out, where=corpus.lengths > 0)
+    return out
+
+
+@register_feature("fillers")
+def _fillers(corpus: TokenizedCorpus) -> np.ndarray:
+    return corpus.per_doc_sum(corpus.token_property("filler", lambda w: w.lower() in FILLERS))
+
+
+@register_feature("repetitions")
+def _repetitions(corpus: TokenizedCorpus) -> np.ndarray:
+    # a token equal to its predecessor in the same document
+    same = (corpus.codes[1:] == corpus.codes[:-1]) & (corpus.doc_ids[1:] == corpus.doc_ids[:-1])
+    return np.bincount(corpus.doc_ids[1:][same], minlength=len(corpus)).astype(np.int64)
+
+
+@register_feature("punctuation")
+def _punctuation(corpus: TokenizedCorpus) -> np.ndarray:
+    # punctuation never sits in whitespace, so counting it per token equals text.count
+    return corpus.per_doc_sum(corpus.token_property("punct", lambda w: sum(w.count(p) for p in PUNCTUATION)))
+
+
+def extract_fluency_features_batch(texts, columns=None) -> pd.DataFrame:
+    """Feature matrix (one row per transcript) for a list, pandas Series or Arrow column.
+
+    columns defaults to every registered feature. Rows for non-string inputs are NaN.
+    """
+    if hasattr(texts, "to_pylist"):
+        texts = texts.to_pylist()
+    elif hasattr(texts, "tolist"):
+        texts = texts.tolist()
+    else:
+        texts = list(texts)
+    columns = list(columns or _FEATURES)
+    unknown = [c for c in columns if c not in _FEATURES]
+    if unknown:
+        raise KeyError(f"unknown fluency feature(s): {unknown}")
+
+    corpus = TokenizedCorpus(texts)
+    df = pd.DataFrame({name: _FEATURES[name](corpus) for name in columns})
+    if not corpus.valid.all():
+        df = df.astype(np.float64)
+        df.loc[~corpus.valid, :] = np.nan
+    return df
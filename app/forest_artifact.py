@@ -0,0 +1,184 @@
+"""
+Flattened tree-ensemble artifact for the grammar regressor.
+All trees' node arrays are packed into contiguous NumPy arrays and saved
+uncompressed next to a small meta.json. Loading memory-maps them, which takes
+milliseconds, and the OS shares the pages copy-on-write across worker processes.
+The evaluator walks every tree for every row at once and reproduces sklearn's
+arithmetic exactly (float32 inputs, `<=` against float64 thresholds, trees
+summed in order, then divided by the tree count), so predictions are
+bit-identical to RandomForestRegressor.predict.
+"""
+import os
+import json
+import shutil
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+META = "meta.json"
+_ARRAYS = ("feature", "threshold", "children", "value", "missing_left", "roots")
+# from this many rows on, predict walks tree by tree instead of all trees per level
+_TREE_MAJOR_MIN_ROWS = 1024
+
+
+def export_forest(model, out_dir: str) -> str:
+    """Write a fitted single-output RandomForestRegressor as a flat artifact directory."""
+    if getattr(model, "n_outputs_", 1) != 1:
+        raise ValueError("only single-output forests are supported")
+    trees = [est.tree_ for est in model.estimators_]
+    sizes = np.array([t.node_count for t in trees], dtype=np.int64)
+    roots = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64)
+
+    def pack(get, dtype):
+        return np.concatenate([np.asarray(get(t), dtype=dtype) for t in trees])
+
+    left = pack(lambda t: t.children_left, np.int64)
+    right = pack(lambda t: t.children_right, np.int64)
+    # child indices become global; leaves point at themselves with an always-true
+    # split, so the evaluator can take max_depth steps without checking for leaves
+    offsets = np.repeat(roots, sizes)
+    is_leaf = left < 0
+    own = np.arange(len(left), dtype=np.int64)
+    children = np.stack([np.where(is_leaf, own, left + offsets),
+                         np.where(is_leaf, own, right + offsets)], axis=1)
+    if children.max(initial=0) > np.iinfo(np.int32).max:
+        raise ValueError("forest too large for 32-bit node indices")
+    arrays = {
+        "feature": np.where(is_leaf, 0, pack(lambda t: t.feature, np.int64)).astype(np.int32),
+        "threshold": np.where(is_leaf, np.inf, pack(lambda t: t.threshold, np.float64)),
+        "children": children.astype(np.int32),
+        "value": pack(lambda t: t.value[:, 0, 0], np.float64),
+        "missing_left": pack(lambda t: getattr(t, "missing_go_to_left", np.zeros(t.node_count)), np.bool_),
+        "roots": roots.astype(np.int32),
+    }
+    meta = {
+        "format": FORMAT_VERSION,
+        "kind": type(model).__name__,
+        "n_trees": len(trees),
+        "n_nodes": int(sizes.sum()),
+        "max_depth": int(max(t.max_depth for t in trees)),
+        "n_features": int(model.n_features_in_),
+        "feature_names": [str(c) for c in getattr(model, "feature_names_in_", [])],
+    }
+
+    # build next to the target, then swap it in so readers never see half an artifact
+    tmp = f"{out_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name, arr in arrays.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(arr))
+    with open(os.path.join(tmp, META), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    old = f"{out_dir}.old-{os.getpid()}"
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old)
+    os.replace(tmp, out_dir)
+    shutil.rmtree(old, ignore_errors=True)
+    logger.info("Exported %d trees (%d nodes) to %s", meta["n_trees"], meta["n_nodes"], out_dir)
+    return out_dir
+
+
+class CompiledForest:
+    """Vectorised evaluator over a flattened forest."""
+
+    def __init__(self, arrays: dict, meta: dict):
+        self.meta = meta
+        self.n_trees = meta["n_trees"]
+        self.max_depth = meta["max_depth"]
+        self.n_features_in_ = meta["n_features"]
+        self.feature_names = meta.get("feature_names") or None
+        for name in _ARRAYS:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "CompiledForest":
+        with open(os.path.join(path, META), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"unsupported forest artifact format {meta.get('format')}")
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+            for name in _ARRAYS
+        }
+        return cls(arrays, meta)
+
+    def _as_matrix(self, X) -> np.ndarray:
+        if hasattr(X, "columns") and self.feature_names:
+            X = X[self.feature_names].to_numpy()
+        # sklearn evaluates trees on float32 inputs
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"expected {self.n_features_in_} features, got shape {X.shape}")
+        return X
+
+    def apply(self, X) -> np.ndarray:
+        """Leaf node index of every (row, tree) pair."""
+        X = self._as_matrix(X)
+        n_features = X.shape[1]
+        flat_x = X.ravel()
+        row_base = (np.arange(len(X), dtype=np.int64) * n_features)[:, None]
+        children = np.asarray(self.children).ravel()
+        has_nan = bool(np.isnan(flat_x).any())
+        node = np.broadcast_to(np.asarray(self.roots), (len(X), self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            x = flat_x[row_base + self.feature[node]]
+            # float32 value vs float64 threshold compares in float64, as in sklearn's Cython
+            go_right = ~(x <= self.threshold[node])
+            if has_nan:
+                go_right &= ~(np.isnan(x) & self.missing_left[node])
+            node = children[2 * node + go_right]
+        return node
+
+    def predict(self, X) -> np.ndarray:
+        X = self._as_matrix(X)
+        if len(X) < _TREE_MAJOR_MIN_ROWS:
+            leaves = self.value[self.apply(X)]
+            # sum tree by tree in estimator order (not pairwise) to match sklearn's accumulation
+            y = np.zeros(len(leaves), dtype=np.float64)
+            for t in range(self.n_trees):
+                y += leaves[:, t]
+        else:
+            # large batches: one tree at a time keeps that tree's nodes in cache
+            y = np.zeros(len(X), dtype=np.float64)
+            flat_x = X.ravel()
+            row_base = np.arange(len(X), dtype=np.int64) * X.shape[1]
+            children = np.asarray(self.children).ravel()
+            has_nan = bool(np.isnan(flat_x).any())
+            for root in np.asarray(self.roots):
+                node = np.full(len(X), root, dtype=np.int64)
+                for _ in range(self.max_depth):
+                    x = flat_x[row_base + self.feature[node]]
+                    go_right = ~(x <= self.threshold[node])
+                    if has_nan:
+                        go_right &= ~(np.isnan(x) & self.missing_left[node])
+                    node = children[2 * node + go_right]
+                y += self.value[node]
+        y /= self.n_trees
+        return y
+
+
+def resolve_model_source(artifact_dir: str, pickle_path: str):
+    """("compiled", dir) when the artifact is at least as new as the pickle, else ("pickle", path).
+
+    Returns None when neither exists.
+    """
+    meta = os.path.join(artifact_dir, META)
+    has_meta, has_pickle = os.path.exists(meta), os.path.exists(pickle_path)
+    if has_meta and (not has_pickle or os.path.getmtime(meta) >= os.path.getmtime(pickle_path)):
+        return "compiled", artifact_dir
+    if has_pickle:
+        return "pickle", pickle_path
+    return None
+
+
+def load_model(artifact_dir: str, pickle_path: str):
+    """Compiled artifact when it is at least as new as the pickle, else the pickled model."""
+    source = resolve_model_source(artifact_dir, pickle_path)
+    if source is None:
+        raise FileNotFoundError(f"No model at {artifact_dir} or {pickle_path}")
+    if source[0] == "compiled":
+        return CompiledForest.load(artifact_dir)
+    import joblib
+    return joblib.load(pickle_path)
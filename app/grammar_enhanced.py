@@ -5,8 +5,10 @@ Priority: LanguageTool (local) → HF transformer (local) → Groq API (limited)
 import logging
 from app.config import (
     GROQ_API_KEY, GROQ_LLM_MODEL, REQUEST_TIMEOUT,
-    USE_HF_FALLBACK, HF_TOKEN, HF_GRAMMAR_MODEL, USE_LOCAL_LANGUAGE_TOOL
+    USE_HF_FALLBACK, USE_LOCAL_LANGUAGE_TOOL
 )
+from app.language_tool_pool import get_language_tool_pool
+from app.hf_corrector import get_hf_corrector
 
 logger = logging.getLogger(__name__)
 
@@ -14,18 +16,10 @@ logger = logging.getLogger(__name__)
 def correct_with_language_tool(text: str) -> str:
     """
     Correct grammar using LanguageTool (offline, rule-based, free).
-    No API keys needed. Fast and reliable.
+    No API keys needed. Uses the shared instance pool, so the JVM starts once.
     """
     try:
-        import language_tool_python
-    except ImportError:
-        logger.error("language_tool_python not installed. Run: pip install language-tool-python")
-        raise ImportError("Install language-tool-python: pip install language-tool-python")
-    
-    try:
-        tool = language_tool_python.LanguageTool('en-US')
-        matches = tool.check(text)
-        corrected = language_tool_python.utils.correct(text, matches)
+        corrected, matches = get_language_tool_pool().correct(text)
         logger.info(f"LanguageTool corrected {len(matches)} issues")
         return corrected
     except Exception as e:
@@ -36,22 +30,10 @@ def correct_with_language_tool(text: str) -> str:
 def correct_with_hf_transformer(text: str) -> str:
     """
     Correct grammar using Hugging Face FLAN-T5 (local, transformer-based).
-    More advanced than rule-based, but slower. Runs on CPU.
+    More advanced than rule-based, but slower. Runs on CPU with a resident model.
     """
     try:
-        from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
-    except ImportError:
-        logger.error("transformers not installed. Run: pip install transformers torch")
-        raise ImportError("Install transformers: pip install transformers torch")
-    
-    try:
-        tokenizer = AutoTokenizer.from_pretrained(HF_GRAMMAR_MODEL)
-        model = AutoModelForSeq2SeqLM.from_pretrained(HF_GRAMMAR_MODEL)
-        
-        inputs = tokenizer(text, return_tensors="pt", max_length=512, truncation=True)
-        outputs = model.generate(**inputs, max_length=512, num_beams=4)
-        corrected = tokenizer.decode(outputs[0], skip_special_tokens=True)
-        
+        corrected = get_hf_corrector().correct_batch([text])[0]
         logger.info(f"HF FLAN-T5 corrected grammar")
         return corrected
     except Exception as e:
@@ -138,3 +120,50 @@ def correct_grammar(text: str) -> str:
         # Return original text if all methods fail
         logger.info("Returning original text (no correction applied)")
         return text
+
+
+def correct_grammar_batch(texts: list[str]) -> list[str]:
+    """
+    Batched version of correct_grammar with the same priority order.
+    LanguageTool checks run concurrently across the instance pool, whatever it
+    could not correct goes to FLAN-T5 in padded batches, and the rest to Groq.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    results = list(texts)
+    pending = [i for i, t in enumerate(texts) if t and isinstance(t, str)]
+
+    if USE_LOCAL_LANGUAGE_TOOL and pending:
+        def _lt(i):
+            try:
+                return i, correct_with_language_tool(texts[i])
+            except Exception as e:
+                logger.warning(f"LanguageTool failed, trying alternatives: {e}")
+                return i, None
+
+        failed = []
+        with ThreadPoolExecutor(max_workers=get_language_tool_pool().size) as exe:
+            for i, corrected in exe.map(_lt, pending):
+                if corrected is None:
+                    failed.append(i)
+                else:
+                    results[i] = corrected
+        pending = failed
+
+    if pending:
+        try:
+            corrected = get_hf_corrector().correct_batch([texts[i] for i in pending])
+            for i, c in zip(pending, corrected):
+                results[i] = c
+            logger.info("Grammar correction: HF transformer corrected %d text(s)", len(pending))
+            pending = []
+        except Exception as e:
+            logger.warning(f"HF transformer failed, trying Groq: {e}")
+
+    for i in pending:
+        try:
+            results[i] = correct_with_groq_llm(texts[i])
+        except Exception as e:
+            logger.error(f"All grammar correction methods failed: {e}")
+
+    return results
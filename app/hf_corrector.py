@@ -0,0 +1,78 @@
+"""
+Resident FLAN-T5 grammar corrector.
+Loads tokenizer and model once and corrects texts in length-sorted, dynamically
+padded batches instead of one generate() call per sentence.
+"""
+import logging
+import threading
+from app.config import HF_GRAMMAR_MODEL, HF_BATCH_SIZE, HF_NUM_BEAMS, HF_MAX_LENGTH
+
+logger = logging.getLogger(__name__)
+
+
+class FlanT5Corrector:
+    """Seq2seq grammar corrector running batched beam search on CPU."""
+
+    def __init__(self, model_name: str = HF_GRAMMAR_MODEL, batch_size: int = HF_BATCH_SIZE,
+                 num_beams: int = HF_NUM_BEAMS, max_length: int = HF_MAX_LENGTH):
+        try:
+            import torch
+            from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+        except ImportError:
+            logger.error("transformers not installed. Run: pip install transformers torch")
+            raise ImportError("Install transformers: pip install transformers torch")
+
+        self._torch = torch
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.num_beams = max(1, num_beams)
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModelForSeq2SeqLM.from_pretrained(model_name).to("cpu").eval()
+        # generate() is not re-entrant friendly on a shared model; serialise batches
+        self._lock = threading.Lock()
+        logger.info("Loaded HF grammar model %s", model_name)
+
+    def correct_batch(self, texts, batch_size: int = None, num_beams: int = None):
+        """Correct a list of texts, returning corrections in input order."""
+        texts = list(texts)
+        if not texts:
+            return []
+        batch_size = batch_size or self.batch_size
+        num_beams = num_beams or self.num_beams
+
+        # tokenize once without padding, then sort by token length so each batch
+        # is padded only up to its own longest member
+        encoded = self.tokenizer(texts, max_length=self.max_length, truncation=True)
+        order = sorted(range(len(texts)), key=lambda i: len(encoded["input_ids"][i]))
+
+        corrected = [None] * len(texts)
+        with self._lock, self._torch.inference_mode():
+            for start in range(0, len(order), batch_size):
+                idx = order[start:start + batch_size]
+                batch = self.tokenizer.pad(
+                    {k: [encoded[k][i] for i in idx] for k in ("input_ids", "attention_mask")},
+                    padding="longest",
+                    return_tensors="pt",
+                )
+                outputs = self.model.generate(**batch, max_length=self.max_length, num_beams=num_beams)
+                decoded = self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+                for i, text in zip(idx, decoded):
+                    corrected[i] = text
+
+        logger.info("HF FLAN-T5 corrected %d text(s) in %d batch(es)",
+                    len(texts), -(-len(texts) // batch_size))
+        return corrected
+
+
+_corrector = None
+_corrector_lock = threading.Lock()
+
+
+def get_hf_corrector() -> FlanT5Corrector:
+    """Return the process-wide corrector, loading it on first use."""
+    global _corrector
+    with _corrector_lock:
+        if _corrector is None:
+            _corrector = FlanT5Corrector()
+        return _corrector
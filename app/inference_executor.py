@@ -0,0 +1,215 @@
+"""
+Bounded executor for blocking inference called from async endpoints.
+Keeps Whisper/grammar work off the event loop, rejects work beyond a fixed
+queue depth (so callers can answer 503 + Retry-After) and cancels timed-out work:
+queued jobs never start, running jobs stop at their next checkpoint. A request
+that also waits on other futures (micro-batches) runs as a flow: it holds an
+admission for its whole life but a worker only for its blocking steps.
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.config import INFERENCE_WORKERS, INFERENCE_QUEUE_DEPTH, LOOP_LAG_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorSaturated(Exception):
+    """Raised when every worker is busy and the queue is full."""
+
+
+class InferenceCancelled(Exception):
+    """Raised inside a job when its caller has given up on it."""
+
+
+class CancelToken:
+    """Cooperative cancellation flag passed to every job."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def check(self):
+        """Call between pipeline stages; raises once the request has timed out."""
+        if self._event.is_set():
+            raise InferenceCancelled("inference cancelled")
+
+
+class InferenceExecutor:
+    """Thread pool with admission control: workers running + queue_depth waiting."""
+
+    def __init__(self, workers: int = INFERENCE_WORKERS, queue_depth: int = INFERENCE_QUEUE_DEPTH):
+        self.workers = max(1, workers)
+        self.queue_depth = max(0, queue_depth)
+        self.capacity = self.workers + self.queue_depth
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self.in_flight = 0   # admitted and not finished (running + queued)
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.cancelled = 0
+
+    def _admit(self) -> bool:
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def _release(self, fut):
+        if fut.cancelled():
+            self._finish("cancelled")
+        elif fut.exception() is not None:
+            self._finish("cancelled" if isinstance(fut.exception(), InferenceCancelled) else "failed")
+        else:
+            self._finish("completed")
+
+    def _finish(self, outcome: str):
+        with self._lock:
+            self.in_flight -= 1
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def _run_job(self, token: CancelToken, fn, args, kwargs):
+        token.check()
+        with self._lock:
+            self.running += 1
+        try:
+            return fn(token, *args, **kwargs)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    async def run(self, fn, *args, timeout: float = None, reserved: bool = False, **kwargs):
+        """Run fn(token, *args, **kwargs) in the pool and await its result.
+
+        Raises ExecutorSaturated when full and asyncio.TimeoutError after `timeout`
+        seconds, in which case the job is cancelled (see module docstring).
+        reserved=True is for steps of a run_flow() flow, which already holds the admission.
+        """
+        if not reserved and not self._admit():
+            raise ExecutorSaturated(f"inference queue full ({self.capacity} in flight)")
+        token = CancelToken()
+        cf = self._executor.submit(self._run_job, token, fn, args, kwargs)
+        if not reserved:
+            # the slot is freed when the work really ends, not when the caller stops waiting
+            cf.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(cf), timeout)
+        except asyncio.TimeoutError:
+            token.cancel()
+            cf.cancel()
+            with self._lock:
+                self.timeouts += 1
+            raise
+        except asyncio.CancelledError:
+            # the enclosing flow timed out
+            token.cancel()
+            cf.cancel()
+            raise
+
+    async def run_flow(self, flow, *args, timeout: float = None):
+        """Await the coroutine flow(*args) under one admission.
+
+        Its blocking steps go through run(..., reserved=True); while it awaits
+        anything else (e.g. a micro-batch) it holds no worker. Raises like run().
+        """
+        if not self._admit():
+            raise ExecutorSaturated(f"inference queue full ({self.capacity} in flight)")
+        outcome = "failed"
+        try:
+            result = await asyncio.wait_for(flow(*args), timeout)
+            outcome = "completed"
+            return result
+        except asyncio.TimeoutError:
+            outcome = "cancelled"
+            with self._lock:
+                self.timeouts += 1
+            raise
+        except (InferenceCancelled, asyncio.CancelledError):
+            outcome = "cancelled"
+            raise
+        finally:
+            self._finish(outcome)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "in_flight": self.in_flight,
+                "running": self.running,
+                "queue_depth": self.in_flight - self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "cancelled": self.cancelled,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up from a fixed sleep."""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self.last = 0.0
+        self.max = 0.0
+        self.avg = 0.0
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            self.last = lag
+            self.max = max(self.max, lag)
+            self.avg = lag if self.avg == 0.0 else 0.9 * self.avg + 0.1 * lag
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def metrics(self) -> dict:
+        return {
+            "event_loop_lag_ms": round(self.last * 1000, 2),
+            "event_loop_lag_avg_ms": round(self.avg * 1000, 2),
+            "event_loop_lag_max_ms": round(self.max * 1000, 2),
+        }
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_lag_monitor = LoopLagMonitor()
+
+
+def get_inference_executor() -> InferenceExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = InferenceExecutor()
+        return _executor
+
+
+def get_loop_lag_monitor() -> LoopLagMonitor:
+    return _lag_monitor
@@ -0,0 +1,235 @@
+"""
+Background jobs for long-running batch endpoints.
+A POST registers a job and returns its id at once; the work runs on a small
+dedicated thread pool (separate from the /score/ inference executor, so batch
+work cannot take its slots). The workload reports progress through its
+JobContext, which also raises InferenceCancelled at the next report once the
+job is cancelled. Finished jobs are kept for polling until JOB_HISTORY newer
+ones push them out.
+"""
+import json
+import time
+import uuid
+import asyncio
+import logging
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from app.config import JOB_WORKERS, JOB_QUEUE_DEPTH, JOB_HISTORY, JOB_PARTIAL_RESULTS, JOB_EVENT_INTERVAL
+from app.inference_executor import CancelToken, InferenceCancelled
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+TERMINAL = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobQueueFull(Exception):
+    """Raised when JOB_WORKERS jobs are running and JOB_QUEUE_DEPTH more are waiting."""
+
+
+class JobNotFound(KeyError):
+    pass
+
+
+class JobContext:
+    """Handle a job function uses to report progress and honour cancellation."""
+
+    def __init__(self, job: "Job"):
+        self._job = job
+        self.token = job.token
+
+    def check(self):
+        self.token.check()
+
+    def progress(self, done: int = None, total: int = None, errors: int = None, item: dict = None,
+                 phase: str = None):
+        """Update the counters (absolute values) and append item to the partial results."""
+        self._job.update(done=done, total=total, errors=errors, item=item, phase=phase)
+        self.token.check()
+
+
+class Job:
+    def __init__(self, kind: str, params: dict):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = QUEUED
+        self.token = CancelToken()
+        self.future = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.phase = None
+        self.done = 0
+        self.total = None
+        self.errors = 0
+        self.partial = deque(maxlen=JOB_PARTIAL_RESULTS)
+        self.result = None
+        self.error = None
+        self.version = 0  # bumped on every change, so event streams only send news
+        self._lock = threading.Lock()
+
+    def update(self, done=None, total=None, errors=None, item=None, phase=None, **fields):
+        with self._lock:
+            if done is not None:
+                self.done = done
+            if total is not None:
+                self.total = total
+            if errors is not None:
+                self.errors = errors
+            if item is not None:
+                self.partial.append(item)
+            if phase is not None:
+                self.phase = phase
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.version += 1
+
+    def snapshot(self, partial: bool = True) -> dict:
+        with self._lock:
+            end = self.finished_at or time.time()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            rate = self.done / elapsed if elapsed > 0 and self.done else None
+            eta = None
+            if rate and self.total is not None and self.status == RUNNING:
+                eta = round(max(self.total - self.done, 0) / rate, 1)
+            snap = {
+                "job_id": self.id,
+                "kind": self.kind,
+                "params": self.params,
+                "status": self.status,
+                "cancel_requested": self.token.cancelled and self.status not in TERMINAL,
+                "phase": self.phase,
+                "done": self.done,
+                "total": self.total,
+                "errors": self.errors,
+                "elapsed_s": round(elapsed, 2),
+                "items_per_s": round(rate, 3) if rate else None,
+                "eta_s": eta,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "result": self.result,
+                "error": self.error,
+                "version": self.version,
+            }
+            if partial:
+                snap["partial_results"] = list(self.partial)
+            return snap
+
+
+class JobManager:
+    """Bounded pool of background jobs with cancellation and history."""
+
+    def __init__(self, workers: int = JOB_WORKERS, queue_depth: int = JOB_QUEUE_DEPTH, history: int = JOB_HISTORY):
+        self.workers = max(1, workers)
+        self.capacity = self.workers + max(0, queue_depth)
+        self.history = max(1, history)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _active(self) -> int:
+        return sum(1 for j in self._jobs.values() if j.status not in TERMINAL)
+
+    def _prune(self):
+        finished = [jid for jid, j in self._jobs.items() if j.status in TERMINAL]
+        for jid in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[jid]
+
+    def submit(self, kind: str, fn, params: dict = None) -> Job:
+        """Queue fn(ctx, **params); raises JobQueueFull at capacity."""
+        params = params or {}
+        with self._lock:
+            if self._active() >= self.capacity:
+                raise JobQueueFull(f"{self.capacity} jobs already queued or running")
+            job = Job(kind, params)
+            self._jobs[job.id] = job
+            self._prune()
+        job.future = self._executor.submit(self._run, job, fn)
+        logger.info("Job %s (%s) queued", job.id, kind)
+        return job
+
+    def _run(self, job: Job, fn):
+        if job.token.cancelled:
+            job.update(status=CANCELLED, finished_at=time.time())
+            return
+        job.update(status=RUNNING, started_at=time.time())
+        try:
+            result = fn(JobContext(job), **job.params)
+        except InferenceCancelled:
+            job.update(status=CANCELLED, finished_at=time.time())
+            logger.info("Job %s cancelled", job.id)
+        except Exception as e:
+            job.update(status=FAILED, error=str(e), finished_at=time.time())
+            logger.exception("Job %s (%s) failed: %s", job.id, job.kind, e)
+        else:
+            job.update(status=SUCCEEDED, result=result, finished_at=time.time())
+            logger.info("Job %s (%s) finished", job.id, job.kind)
+
+    def get(self, job_id: str) -> Job:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise JobNotFound(job_id)
+        return job
+
+    def list(self) -> list:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [j.snapshot(partial=False) for j in reversed(jobs)]
+
+    def cancel(self, job_id: str) -> Job:
+        """Queued jobs never start; running jobs stop at their next progress report."""
+        job = self.get(job_id)
+        if job.status in TERMINAL:
+            return job
+        job.token.cancel()
+        if job.future is not None and job.future.cancel():
+            job.update(status=CANCELLED, finished_at=time.time())
+        return job
+
+    async def events(self, job_id: str, interval: float = JOB_EVENT_INTERVAL):
+        """Server-sent events: a snapshot whenever the job changes, ending with its final state."""
+        job = self.get(job_id)
+        seen = -1
+        while True:
+            snap = job.snapshot()
+            if snap["version"] != seen:
+                seen = snap["version"]
+                event = "end" if snap["status"] in TERMINAL else "progress"
+                yield f"event: {event}\ndata: {json.dumps(snap, default=str)}\n\n"
+                if event == "end":
+                    return
+            await asyncio.sleep(interval)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "running": sum(1 for j in jobs if j.status == RUNNING),
+            "queued": sum(1 for j in jobs if j.status == QUEUED),
+        }
+
+    def shutdown(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            if job.status not in TERMINAL:
+                job.token.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
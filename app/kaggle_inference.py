@@ -1,36 +1,61 @@
-import os
-from app.transcriber_enhanced import transcribe_from_path
+from app.transcriber_enhanced import transcribe_from_path, transcribe_batch
 from app.grammar_enhanced import correct_grammar
+from app.result_writer import ResultWriter
+from app.manifest_reader import iter_manifest, count_manifest_rows
 
 TEST_AUDIO_DIR = "data/kaggle/test_audio"
 TEST_CSV = "data/kaggle/test.csv"
 OUTPUT_CSV = "data/kaggle/submission.csv"
 
-def run_kaggle_inference():
-    df = pd.read_csv(TEST_CSV)
-
-    predictions = []
-
-    for _, row in df.iterrows():
-        filename = row["filename"]
-        audio_path = os.path.join(TEST_AUDIO_DIR, filename)
-
-        if not os.path.exists(audio_path):
-            predictions.append({"filename": filename, "prediction": ""})
-            continue
-
-        try:
-            asr = transcribe_from_path(audio_path)
-            corrected = correct_grammar(asr)
-        except Exception:
-            corrected = ""
-
-        predictions.append({
-            "filename": filename,
-            "prediction": corrected
-        })
-
-    out_df = pd.DataFrame(predictions)
-    out_df.to_csv(OUTPUT_CSV, index=False)
+def run_kaggle_inference(progress=None):
+    """Write corrected transcripts for test.csv; progress(done=, total=, ...) is called per clip.
+
+    done counts transcribed clips; each corrected row is reported as it is written.
+    """
+    if progress:
+        progress(total=count_manifest_rows(TEST_CSV), phase="transcribe")
+
+    done = 0
+    failed = 0
+
+    # rows go to disk as they are produced; the file appears at OUTPUT_CSV when complete
+    with ResultWriter(OUTPUT_CSV, ["filename", "prediction"]) as writer:
+        for chunk in iter_manifest(TEST_CSV, audio_dir=TEST_AUDIO_DIR):
+            # Transcribe the chunk up front on the shared worker pool; files the pool
+            # could not handle fall back to transcribe_from_path (Groq) in the loop below.
+            # done counts transcribed clips here, so ETA and cancellation work during ASR.
+            paths = [p for p in chunk["audio_path"] if p is not None]
+            missing = len(chunk["filename"]) - len(paths)
+            on_transcribed = None
+            if progress:
+                def on_transcribed(n, base=done + missing):
+                    progress(done=base + n, phase="transcribe")
+            transcripts = transcribe_batch(paths, progress=on_transcribed)
+            if progress:
+                progress(phase="correct")
+
+            for filename, audio_path in zip(chunk["filename"], chunk["audio_path"]):
+                if audio_path is None:
+                    prediction = {"filename": filename, "prediction": ""}
+                    failed += 1
+                else:
+                    try:
+                        asr = transcripts.get(audio_path) or transcribe_from_path(audio_path)
+                        corrected = correct_grammar(asr)
+                    except Exception:
+                        corrected = ""
+                        failed += 1
+
+                    prediction = {
+                        "filename": filename,
+                        "prediction": corrected
+                    }
+
+                writer.write(prediction)
+                if progress:
+                    progress(errors=failed, item=prediction)
+            done += len(chunk["filename"])
+            if progress:
+                progress(done=done)
 
     return OUTPUT_CSV
@@ -1,5 +1,6 @@
 import os
-from typing import List
+from typing import List, Tuple
+from app.audio_index import get_audio_index
 
 # Default paths for your batch audio processing
 DEFAULT_BATCH_AUDIO_DIR = "data/kaggle_samples/audio"
@@ -13,34 +14,46 @@ TEST_AUDIO_DIR = "data/kaggle/test_audio"
 
 def load_train_audio_path(filename: str):
     """Return full path to train audio file, or None if missing"""
-    path = os.path.join(TRAIN_AUDIO_DIR, filename + ".wav")
-    if os.path.exists(path):
-        return path
-    return None
+    return get_audio_index(TRAIN_AUDIO_DIR).path(filename + ".wav")
 
 def load_test_audio_path(filename: str):
     """Return full path to test audio file, or None if missing"""
-    path = os.path.join(TEST_AUDIO_DIR, filename + ".wav")
-    if os.path.exists(path):
-        return path
-    return None
+    return get_audio_index(TEST_AUDIO_DIR).path(filename + ".wav")
+
+def list_audio_dir(directory: str) -> set:
+    """Names of the files in directory, from its index (empty if it does not exist)."""
+    return get_audio_index(directory).names()
+
+
+def resolve_audio_paths(filenames, directory: str, suffix: str = "", names: set = None) -> list:
+    """Full path (or None if missing) per filename + suffix, checked against one directory listing.
+
+    Pass names from list_audio_dir to reuse a listing across calls.
+    """
+    names = list_audio_dir(directory) if names is None else names
+    return [os.path.join(directory, fn + suffix) if fn + suffix in names else None for fn in filenames]
+
 
 def load_audio_files(directory: str = DEFAULT_BATCH_AUDIO_DIR) -> List[str]:
     """
     Loads all audio file paths from a given directory.
     Default: data/kaggle_samples/audio
     """
-    if not os.path.exists(directory):
-        return []
+    return get_audio_index(directory).audio_files()
+
 
-    valid_ext = (".wav", ".mp3", ".m4a", ".flac", ".ogg")
+def load_new_audio_files(consumer: str, directory: str = DEFAULT_BATCH_AUDIO_DIR) -> Tuple[List[str], int]:
+    """
+    Audio files that arrived (or changed) in directory since consumer last called
+    mark_audio_processed, plus the generation to pass to it once they are done.
+    """
+    return get_audio_index(directory).new_since(consumer)
 
-    audio_files = []
-    for f in os.listdir(directory):
-        if f.lower().endswith(valid_ext):
-            audio_files.append(os.path.join(directory, f))
 
-    return sorted(audio_files)
+def mark_audio_processed(consumer: str, generation: int, failed: List[str] = (),
+                         directory: str = DEFAULT_BATCH_AUDIO_DIR):
+    """Record consumer's run up to generation; failed files are offered again next time."""
+    get_audio_index(directory).mark_processed(consumer, generation, failed)
 
 
 def load_train_audio_files() -> List[str]:
@@ -0,0 +1,201 @@
+"""
+Managed pool of LanguageTool instances.
+Each instance owns (or attaches to) a JVM server, so they are started once,
+shared by all requests, restarted if their JVM dies and closed on shutdown.
+Instances still borrowed when the pool is closed are closed on return instead
+of going back into circulation. When starting fails, requests do not respawn
+the JVMs each time: they fail fast until a backoff (doubling per failure) runs out.
+"""
+import time
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from app.config import (
+    LANGUAGE_TOOL_LANGUAGE, LANGUAGE_TOOL_POOL_SIZE, LANGUAGE_TOOL_SERVER_URL, LANGUAGE_TOOL_RETRY_BACKOFF,
+    REQUEST_TIMEOUT
+)
+
+logger = logging.getLogger(__name__)
+
+# cap on the doubling startup backoff, as a multiple of the base delay
+_MAX_BACKOFF_FACTOR = 16
+
+
+class LanguageToolUnavailable(RuntimeError):
+    """Raised while the pool is waiting out the backoff after a failed start."""
+
+
+def _import_language_tool():
+    try:
+        import language_tool_python
+    except ImportError:
+        logger.error("language_tool_python not installed. Run: pip install language-tool-python")
+        raise ImportError("Install language-tool-python: pip install language-tool-python")
+    return language_tool_python
+
+
+class LanguageToolPool:
+    """Fixed-size pool; a request borrows one instance so checks run in parallel."""
+
+    def __init__(self, size: int = LANGUAGE_TOOL_POOL_SIZE, language: str = LANGUAGE_TOOL_LANGUAGE,
+                 remote_server: str = LANGUAGE_TOOL_SERVER_URL, retry_backoff: float = LANGUAGE_TOOL_RETRY_BACKOFF):
+        self.size = max(1, size)
+        self.language = language
+        self.remote_server = remote_server or None
+        self.restarts = 0
+        self.retry_backoff = retry_backoff
+        self.start_failures = 0   # consecutive failed starts
+        self._retry_at = 0.0      # monotonic time before which requests don't retry start()
+        self._idle = queue.Queue()
+        self._tools = []
+        self._lock = threading.Lock()
+        self._started = False
+        self._epoch = 0  # bumped by close(); instances from an older epoch are not reused
+
+    def _new_tool(self):
+        language_tool_python = _import_language_tool()
+        if self.remote_server:
+            return language_tool_python.LanguageTool(self.language, remote_server=self.remote_server)
+        return language_tool_python.LanguageTool(self.language)
+
+    @staticmethod
+    def _is_alive(tool) -> bool:
+        if getattr(tool, "_remote", False):
+            return True
+        is_alive = getattr(tool, "_server_is_alive", None)
+        return bool(is_alive()) if is_alive else True
+
+    def start(self):
+        """Start every instance. Safe to call more than once."""
+        with self._lock:
+            self._start_locked()
+
+    def _start_if_due(self):
+        """start() for the request path: fails fast while a failed start is backing off."""
+        with self._lock:
+            wait = self._retry_at - time.monotonic()
+            if not self._started and wait > 0:
+                raise LanguageToolUnavailable(f"LanguageTool failed to start; next attempt in {wait:.0f}s")
+            self._start_locked()
+
+    def _start_locked(self):
+        if self._started:
+            return
+        tools = []
+        try:
+            for _ in range(self.size):
+                tools.append(self._new_tool())
+        except Exception as e:
+            for tool in tools:
+                tool.close()
+            self.start_failures += 1
+            delay = self.retry_backoff * min(2 ** (self.start_failures - 1), _MAX_BACKOFF_FACTOR)
+            self._retry_at = time.monotonic() + delay
+            logger.warning("LanguageTool pool failed to start (%d in a row), retrying in %.0fs: %s",
+                           self.start_failures, delay, e)
+            raise
+        for tool in tools:
+            self._tools.append(tool)
+            self._idle.put(tool)
+        self._started = True
+        self.start_failures, self._retry_at = 0, 0.0
+        logger.info("LanguageTool pool started (%d instance(s), %s)", self.size, self.language)
+
+    def _replace(self, tool):
+        """Close a broken instance and start a fresh one in its slot."""
+        try:
+            tool.close()
+        except Exception:
+            pass
+        new_tool = self._new_tool()
+        with self._lock:
+            # after a close() the old slot is gone; _release then closes new_tool
+            self._tools = [new_tool if t is tool else t for t in self._tools]
+            self.restarts += 1
+        logger.warning("Restarted LanguageTool instance (restarts=%d)", self.restarts)
+        return new_tool
+
+    @contextmanager
+    def acquire(self, timeout: float = REQUEST_TIMEOUT):
+        """Borrow an instance; blocks up to `timeout` seconds when all are busy."""
+        if not self._started:
+            self._start_if_due()
+        with self._lock:
+            idle, epoch = self._idle, self._epoch
+        try:
+            tool = idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No LanguageTool instance free after {timeout}s")
+        try:
+            if not self._is_alive(tool):
+                tool = self._replace(tool)
+            yield tool
+        finally:
+            self._release(tool, idle, epoch)
+
+    def _release(self, tool, idle: queue.Queue, epoch: int):
+        with self._lock:
+            current = epoch == self._epoch
+            if current:
+                idle.put(tool)
+        if not current:
+            # the pool was closed while this instance was borrowed
+            try:
+                tool.close()
+            except Exception as e:
+                logger.warning("Failed to close LanguageTool instance: %s", e)
+
+    def check(self, text: str):
+        """Return LanguageTool matches for text, restarting a dead JVM once."""
+        with self.acquire() as tool:
+            try:
+                return tool.check(text)
+            except Exception:
+                if self._is_alive(tool):
+                    raise
+            # JVM died mid-request: this slot is replaced and the check retried once
+        with self.acquire() as tool:
+            return tool.check(text)
+
+    def correct(self, text: str):
+        """Return (corrected_text, matches)."""
+        language_tool_python = _import_language_tool()
+        matches = self.check(text)
+        return language_tool_python.utils.correct(text, matches), matches
+
+    def health(self) -> dict:
+        with self._lock:
+            tools = list(self._tools)
+        alive = sum(1 for t in tools if self._is_alive(t))
+        return {
+            "started": self._started,
+            "size": self.size,
+            "alive": alive,
+            "idle": self._idle.qsize(),
+            "restarts": self.restarts,
+            "start_failures": self.start_failures,
+            "status": "ok" if self._started and alive == self.size else "degraded",
+        }
+
+    def close(self):
+        with self._lock:
+            tools, self._tools = self._tools, []
+            self._started = False
+            self._epoch += 1
+            self._idle = queue.Queue()
+        # borrowed instances are in `tools` too: closed here, then dropped by _release
+        for tool in tools:
+            try:
+                tool.close()
+            except Exception as e:
+                logger.warning("Failed to close LanguageTool instance: %s", e)
+        if tools:
+            logger.info("LanguageTool pool closed")
+
+
+_pool = LanguageToolPool()
+
+
+def get_language_tool_pool() -> LanguageToolPool:
+    return _pool
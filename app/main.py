@@ -1,34 +1,100 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse, FileResponse
-import sys, os
+from fastapi import FastAPI, UploadFile, File, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
+import sys, os, json, asyncio
+import logging
 import numpy as _np
 
-from app.transcriber_enhanced import transcribe_bytes_from_bytes, transcribe_from_path
+from app.transcriber_enhanced import (
+    transcribe_bytes_from_bytes, transcribe_from_path, prepare_upload_for_batch, save_batched_transcript,
+    transcribe_upload_unbatched, load_words_from_cache, hash_audio_bytes
+)
+from app.whisper_registry import get_whisper_registry
+from app.transcription_pool import shutdown_transcription_pools
+from app.language_tool_pool import get_language_tool_pool
+from app.inference_executor import (
+    get_inference_executor, get_loop_lag_monitor, ExecutorSaturated
+)
+from app.streaming import StreamingScorer
+from app.micro_batcher import micro_batching_enabled, get_asr_batcher, get_grammar_batcher, micro_batch_metrics
+from app.config import (
+    USE_LOCAL_WHISPER, WHISPER_WARMUP, USE_LOCAL_LANGUAGE_TOOL, INFERENCE_TIMEOUT, INFERENCE_RETRY_AFTER,
+    TRAIN_CV_FOLDS
+)
 
 from app.grammar_enhanced import correct_grammar
 
 from app.scoring import compute_wer_and_score, batch_score
 
-from app.kaggle_loader import load_audio_files, load_train_audio_files, load_test_audio_files
+from app.kaggle_loader import (
+    load_audio_files, load_new_audio_files, mark_audio_processed, load_train_audio_files, load_test_audio_files
+)
 from app.kaggle_inference import run_kaggle_inference
+from app.audio_pipeline import process_audio_files
 
 from app.train_evaluate import run_train_evaluation
 from app.model_train import train_regression_model
-from app.model_predict import predict_kaggle_submission
+from app.model_predict import predict_kaggle_submission, predict_label
+from app.model_manager import get_model_manager
+from app.jobs import get_job_manager, JobQueueFull, JobNotFound
 
 
-from app.utils import save_results_csv
+from app.utils import merge_results_csv
+from app.result_writer import is_writing, follow_result_file
 
+logger = logging.getLogger(__name__)
 
 
 app = FastAPI(title="Grammar Scoring Engine",
               description="ASR (Groq) → Grammar (Groq LLM/HF fallback) → WER & Score",
               version="1.0.0")
 
+@app.on_event("startup")
+async def start_loop_lag_monitor():
+    get_loop_lag_monitor().start()
+
+
+@app.on_event("startup")
+def startup():
+    # eager warmup moves the Whisper load out of the first /score/ request
+    if USE_LOCAL_WHISPER and WHISPER_WARMUP == "eager":
+        get_whisper_registry().warmup()
+    if USE_LOCAL_LANGUAGE_TOOL:
+        try:
+            get_language_tool_pool().start()
+        except Exception as e:
+            # correct_grammar falls back to HF/Groq, so a missing JVM is not fatal
+            logger.warning("LanguageTool pool failed to start, using fallbacks: %s", e)
+    get_model_manager().start()
+
+
+@app.on_event("shutdown")
+def shutdown():
+    get_loop_lag_monitor().stop()
+    get_model_manager().stop()
+    get_job_manager().shutdown()
+    get_inference_executor().shutdown()
+    get_language_tool_pool().close()
+    shutdown_transcription_pools()
+    get_whisper_registry().unload_all()
+
+
 @app.get('/health')
 def health():
     return {"status": "ok"}
 
+@app.get('/health/language-tool')
+def health_language_tool():
+    return get_language_tool_pool().health()
+
+@app.get('/metrics')
+def metrics():
+    return {
+        **get_inference_executor().metrics(),
+        **get_loop_lag_monitor().metrics(),
+        "micro_batches": micro_batch_metrics(),
+        "jobs": get_job_manager().metrics(),
+    }
+
 @app.get('/debug')
 def debug():
     return {
@@ -36,11 +102,24 @@ def debug():
         "numpy_version": _np.__version__,
     }
 
+@app.get("/asr/models")
+def asr_models():
+    return {"loaded": [list(k) for k in get_whisper_registry().loaded()]}
+
+
+@app.post("/asr/unload")
+def asr_unload(model: str = None):
+    if model:
+        return {"unloaded": get_whisper_registry().unload(model)}
+    get_whisper_registry().unload_all()
+    return {"unloaded": True}
+
+
 # -----------------------------
 # Single Audio Scoring API
 # -----------------------------
 @app.post("/score/")
-async def score_endpoint(file: UploadFile = File(...)):
+async def score_endpoint(file: UploadFile = File(...), alignment: bool = False, words: bool = False):
 
     if not file.filename.lower().endswith(('.wav', '.mp3', '.m4a', '.flac', '.ogg')):
         raise HTTPException(status_code=400, detail="Upload a valid audio file")
@@ -50,69 +129,248 @@ async def score_endpoint(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="Empty file uploaded")
 
     try:
-        asr_text = transcribe_bytes_from_bytes(audio_bytes)
-        corrected_text = correct_grammar(asr_text)
-        wer_val, score = compute_wer_and_score(asr_text, corrected_text)
-
-        return JSONResponse({
-            "filename": file.filename,
-            "asr_text": asr_text,
-            "corrected_text": corrected_text,
-            "wer": round(wer_val, 4),
-            "grammar_score_0_100": score
-        })
-
+        if micro_batching_enabled():
+            asr_text, corrected_text, wer_val, score, edits = await get_inference_executor().run_flow(
+                _score_audio_coalesced, audio_bytes, alignment, timeout=INFERENCE_TIMEOUT
+            )
+        else:
+            asr_text, corrected_text, wer_val, score, edits = await get_inference_executor().run(
+                _score_audio_bytes, audio_bytes, alignment, timeout=INFERENCE_TIMEOUT
+            )
+    except ExecutorSaturated:
+        raise HTTPException(
+            status_code=503,
+            detail="Scoring capacity exhausted, retry later",
+            headers={"Retry-After": str(INFERENCE_RETRY_AFTER)},
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Scoring timed out after {INFERENCE_TIMEOUT}s")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    response = {
+        "filename": file.filename,
+        "asr_text": asr_text,
+        "corrected_text": corrected_text,
+        "wer": round(wer_val, 4),
+        "grammar_score_0_100": score
+    }
+    if alignment:
+        response["alignment"] = edits
+    if words:
+        # kept with the transcript for recordings long enough to be segmented; null otherwise
+        response["words"] = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: load_words_from_cache(hash_audio_bytes(audio_bytes)))
+    return JSONResponse(response)
+
+
+def _score_audio_bytes(token, audio_bytes: bytes, alignment: bool = False):
+    """Blocking /score/ pipeline; runs on the inference executor, checking for cancellation between stages."""
+    asr_text = transcribe_bytes_from_bytes(audio_bytes)
+    token.check()
+    corrected_text = correct_grammar(asr_text)
+    token.check()
+    return _score_texts(token, asr_text, corrected_text, alignment)
+
+
+def _score_texts(token, asr_text: str, corrected_text: str, alignment: bool = False):
+    if alignment:
+        wer_val, score, edits = compute_wer_and_score(asr_text, corrected_text, return_alignment=True)
+    else:
+        (wer_val, score), edits = compute_wer_and_score(asr_text, corrected_text), None
+    return asr_text, corrected_text, wer_val, score, edits
+
+
+# With micro-batching on, /score/ runs as an executor flow: decoding and scoring take a
+# worker, but the batched Whisper and grammar calls are awaited on the event loop, so
+# every admitted request (not just INFERENCE_WORKERS of them) can join a batch.
+async def _transcribe_upload_coalesced(audio_bytes: bytes) -> str:
+    executor = get_inference_executor()
+    sha, text, audio = await executor.run(
+        lambda token: prepare_upload_for_batch(audio_bytes), reserved=True)
+    if text is not None:
+        return text
+    try:
+        text = await asyncio.wrap_future(get_asr_batcher().submit(audio))
+    except Exception:
+        return await executor.run(
+            lambda token: transcribe_upload_unbatched(sha, audio_bytes), reserved=True)
+    await executor.run(lambda token: save_batched_transcript(sha, text), reserved=True)
+    return text
+
+
+async def _score_audio_coalesced(audio_bytes: bytes, alignment: bool = False):
+    asr_text = await _transcribe_upload_coalesced(audio_bytes)
+    corrected_text = await asyncio.wrap_future(get_grammar_batcher().submit(asr_text))
+    return await get_inference_executor().run(
+        _score_texts, asr_text, corrected_text, alignment, reserved=True)
+
 
 # -----------------------------
-# Batch Processing: All files in data/kaggle_samples/audio
+# Streaming (live audio) Scoring API
 # -----------------------------
-@app.post("/batch/process-audio")
-def batch_process_audio():
+def _is_end_frame(text) -> bool:
+    if not text:
+        return False
+    if text.strip().lower() == "end":
+        return True
+    try:
+        return json.loads(text).get("event") == "end"
+    except (ValueError, AttributeError):
+        return False
 
-    audio_files = load_audio_files()
 
-    if not audio_files:
-        return {"message": "done", "processed": 0, "note": "no audio files found"}
+@app.websocket("/ws/score")
+async def score_stream(websocket: WebSocket, sample_rate: int = 16000, encoding: str = "pcm_s16le"):
+    """Send raw mono audio as binary frames, then the text frame "end".
+
+    Receives a "sentence" event (with running WER/score) for every sentence that
+    closes while audio is streaming, and a "final" event after "end".
+    """
+    await websocket.accept()
+    try:
+        scorer = StreamingScorer(sample_rate=sample_rate, encoding=encoding)
+    except ValueError as e:
+        await websocket.send_json({"event": "error", "detail": str(e)})
+        await websocket.close(code=1003)
+        return
 
-    results = []
+    executor = get_inference_executor()
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes"):
+                events = await executor.run(lambda token, chunk: scorer.feed(chunk), message["bytes"],
+                                            timeout=INFERENCE_TIMEOUT)
+                for event in events:
+                    await websocket.send_json(event)
+            elif _is_end_frame(message.get("text")):
+                events = await executor.run(lambda token: scorer.finish(), timeout=INFERENCE_TIMEOUT)
+                for event in events:
+                    await websocket.send_json(event)
+                await websocket.send_json(scorer.summary())
+                await websocket.close()
+                return
+    except WebSocketDisconnect:
+        return
+    except ExecutorSaturated:
+        await websocket.send_json({"event": "error", "detail": "Scoring capacity exhausted, retry later"})
+        await websocket.close(code=1013)
+    except asyncio.TimeoutError:
+        await websocket.send_json({"event": "error", "detail": f"Scoring timed out after {INFERENCE_TIMEOUT}s"})
+        await websocket.close(code=1011)
+    except Exception as e:
+        await websocket.send_json({"event": "error", "detail": str(e)})
+        await websocket.close(code=1011)
 
-    for audio_path in audio_files:
-        try:
-            asr = transcribe_from_path(audio_path)
-            corrected = correct_grammar(asr)
-            wer_val, score = compute_wer_and_score(asr, corrected)
-
-            results.append({
-                "audio": os.path.basename(audio_path),
-                "asr_text": asr,
-                "corrected_text": corrected,
-                "wer": round(wer_val, 4),
-                "score": score
-            })
 
-        except Exception as e:
-            results.append({
-                "audio": os.path.basename(audio_path),
-                "error": str(e)
-            })
+# -----------------------------
+# Background jobs for the long-running endpoints
+# -----------------------------
+def _submit_job(kind: str, fn, **params):
+    try:
+        job = get_job_manager().submit(kind, fn, params)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(INFERENCE_RETRY_AFTER)})
+    return {
+        "job_id": job.id,
+        "kind": kind,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events",
+    }
+
+
+def _get_job(job_id: str):
+    try:
+        return get_job_manager().get(job_id)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail="job not found")
+
+
+@app.get("/jobs")
+def list_jobs():
+    return {"jobs": get_job_manager().list(), **get_job_manager().metrics()}
 
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    """Progress counts, throughput, ETA, the latest partial results and, once done, the result."""
+    return _get_job(job_id).snapshot()
+
+
+@app.get("/jobs/{job_id}/events")
+def job_events(job_id: str):
+    """Server-sent events with a snapshot on every change; the last event is `end`."""
+    _get_job(job_id)
+    return StreamingResponse(get_job_manager().events(job_id), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+
+@app.post("/jobs/{job_id}/cancel")
+def job_cancel(job_id: str):
+    _get_job(job_id)
+    return get_job_manager().cancel(job_id).snapshot(partial=False)
+
+
+# -----------------------------
+# Batch Processing: All files in data/kaggle_samples/audio
+# -----------------------------
+@app.post("/batch/process-audio", status_code=202)
+def batch_process_audio(alignment: bool = False, only_new: bool = False):
+    """Queue a job scoring every clip (or only those new since the last only_new run); poll /jobs/{job_id}."""
+    return _submit_job("batch-process-audio", _batch_process_audio_job, alignment=alignment, only_new=only_new)
+
+
+def _batch_process_audio_job(ctx, alignment: bool = False, only_new: bool = False):
+    if only_new:
+        audio_files, generation = load_new_audio_files("batch-process-audio")
+    else:
+        audio_files = load_audio_files()
+
+    if not audio_files:
+        return {"message": "done", "processed": 0, "note": "no new audio files" if only_new else "no audio files found"}
+
+    # decode -> ASR -> grammar -> scoring run as overlapping stages; rows are written as they finish
     out_path = os.path.join("data", "submission_results.csv")
-    save_results_csv(results, out_path)
+    if only_new:
+        # score the new clips into their own file, then fold them into the full results
+        run_path = os.path.join("data", "submission_results.new.csv")
+        report = process_audio_files(audio_files, run_path, alignment=alignment, progress=ctx.progress)
+        merge_results_csv(out_path, run_path)
+        # failed clips stay pending for the next only_new run
+        mark_audio_processed("batch-process-audio", generation, failed=report["failed"])
+    else:
+        report = process_audio_files(audio_files, out_path, alignment=alignment, progress=ctx.progress)
 
     return {
         "message": "done",
-        "processed": len(results),
-        "csv": out_path
+        "processed": report["processed"],
+        "errors": report["errors"],
+        "csv": out_path,
+        "wall_s": report["wall_s"],
+        "stages": report["stages"]
     }
 
 
 @app.get("/batch/download")
 def download_csv():
+    """The results CSV; while a batch job is still writing it, the download follows the file as it grows.
+
+    If that job fails, the connection is dropped before the chunked body is
+    terminated, so clients see an incomplete download rather than a short CSV.
+    """
     p = os.path.join("data", "submission_results.csv")
 
+    if is_writing(p):
+        return StreamingResponse(
+            follow_result_file(p),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="submission_results.csv"'}
+        )
+
     if not os.path.exists(p):
         raise HTTPException(status_code=404, detail="results not found")
 
@@ -123,22 +381,103 @@ def download_csv():
     )
 
 
-@app.post("/kaggle/submit")
+@app.post("/kaggle/submit", status_code=202)
 def kaggle_submit():
-    path = run_kaggle_inference()
+    return _submit_job("kaggle-submit", _kaggle_submit_job)
+
+def _kaggle_submit_job(ctx):
+    path = run_kaggle_inference(progress=ctx.progress)
     return {"message": "submission ready", "file": path}
 
-@app.post("/train/evaluate")
-def train_evaluate():
-    path = run_train_evaluation()
+@app.post("/train/evaluate", status_code=202)
+def train_evaluate(resume: bool = True):
+    """Resumes from the last checkpointed shard unless resume=false."""
+    return _submit_job("train-evaluate", _train_evaluate_job, resume=resume)
+
+def _train_evaluate_job(ctx, resume: bool = True):
+    path = run_train_evaluation(resume=resume, progress=ctx.progress)
     return {"message": "train evaluation complete", "file": path}
 
 @app.post("/model/train")
-def model_train():
-    result = train_regression_model()
+def model_train(mode: str = "fixed", cv: int = TRAIN_CV_FOLDS):
+    """mode=fixed trains the default forest; mode=search runs the cross-validated model search."""
+    if mode not in ("fixed", "search"):
+        raise HTTPException(status_code=400, detail="mode must be 'fixed' or 'search'")
+    if cv < 2:
+        raise HTTPException(status_code=400, detail="cv must be at least 2")
+    result = train_regression_model(mode=mode, cv=cv)
+    # load the new model in the background; current requests keep the old one
+    get_model_manager().notify()
     return result
 
-@app.post("/model/predict-kaggle")
+@app.post("/model/predict-kaggle", status_code=202)
 def model_predict():
-    path = predict_kaggle_submission()
-    return {"message": "submission ready", "file": path}
+    try:
+        get_model_manager().get()
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return _submit_job("model-predict-kaggle", _model_predict_job)
+
+def _model_predict_job(ctx):
+    # the model active when the job starts is used for the whole submission
+    model, info = get_model_manager().get()
+    path = predict_kaggle_submission(model, progress=ctx.progress)
+    return {"message": "submission ready", "file": path, "model_version": info["version"]}
+
+@app.get("/model/status")
+def model_status():
+    return get_model_manager().status()
+
+@app.post("/model/predict")
+async def model_predict_clip(file: UploadFile = File(...)):
+    """Grade one clip with the resident regressor."""
+    if not file.filename.lower().endswith(('.wav', '.mp3', '.m4a', '.flac', '.ogg')):
+        raise HTTPException(status_code=400, detail="Upload a valid audio file")
+
+    audio_bytes = await file.read()
+    if not audio_bytes:
+        raise HTTPException(status_code=400, detail="Empty file uploaded")
+
+    try:
+        model, info = get_model_manager().get()
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    try:
+        if micro_batching_enabled():
+            asr_text, label = await get_inference_executor().run_flow(
+                _predict_audio_coalesced, model, audio_bytes, timeout=INFERENCE_TIMEOUT
+            )
+        else:
+            asr_text, label = await get_inference_executor().run(
+                _predict_audio_bytes, model, audio_bytes, timeout=INFERENCE_TIMEOUT
+            )
+    except ExecutorSaturated:
+        raise HTTPException(
+            status_code=503,
+            detail="Scoring capacity exhausted, retry later",
+            headers={"Retry-After": str(INFERENCE_RETRY_AFTER)},
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Prediction timed out after {INFERENCE_TIMEOUT}s")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "filename": file.filename,
+        "asr_text": asr_text,
+        "label": label,
+        "model_version": info["version"],
+    }
+
+
+def _predict_audio_bytes(token, model, audio_bytes: bytes):
+    asr_text = transcribe_bytes_from_bytes(audio_bytes)
+    token.check()
+    return asr_text, predict_label(model, asr_text)
+
+
+async def _predict_audio_coalesced(model, audio_bytes: bytes):
+    asr_text = await _transcribe_upload_coalesced(audio_bytes)
+    label = await get_inference_executor().run(lambda token: predict_label(model, asr_text), reserved=True)
+    return asr_text, label
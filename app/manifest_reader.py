@@ -0,0 +1,46 @@
+"""
+Chunked reader for the Kaggle train/test manifests.
+Manifests are read in fixed-size chunks with only the requested columns and
+explicit dtypes, and each chunk is handed out as plain per-column lists (no
+per-row Series). Audio paths are resolved against a single listing of the
+audio directory instead of one os.path.exists call per row, so memory stays
+bounded by the chunk size however long the manifest is.
+"""
+import logging
+import pandas as pd
+from app.config import MANIFEST_CHUNK_ROWS
+from app.kaggle_loader import list_audio_dir, resolve_audio_paths
+
+logger = logging.getLogger(__name__)
+
+# only the columns the pipelines use, with fixed dtypes so every chunk agrees
+MANIFEST_DTYPES = {"filename": str, "label": "float64"}
+
+
+def count_manifest_rows(path: str) -> int:
+    """Data rows in a manifest (line count minus the header), without parsing it."""
+    with open(path, "rb") as f:
+        lines = sum(block.count(b"\n") for block in iter(lambda: f.read(1 << 20), b""))
+        f.seek(0, 2)
+        if f.tell():
+            f.seek(-1, 2)
+            lines += f.read(1) != b"\n"  # last line without a trailing newline
+    return max(lines - 1, 0)
+
+
+def iter_manifest(path: str, columns=("filename",), chunk_rows: int = MANIFEST_CHUNK_ROWS,
+                  audio_dir: str = None, suffix: str = ""):
+    """Yield {column: list} per chunk of at most chunk_rows rows.
+
+    With audio_dir, each chunk also has "audio_path": the file for
+    filename + suffix in audio_dir, or None when it is missing. The directory
+    is listed once per call.
+    """
+    columns = list(columns)
+    names = list_audio_dir(audio_dir) if audio_dir is not None else None
+    dtypes = {c: MANIFEST_DTYPES[c] for c in columns if c in MANIFEST_DTYPES}
+    for frame in pd.read_csv(path, usecols=columns, dtype=dtypes, chunksize=max(1, chunk_rows)):
+        chunk = {c: frame[c].tolist() for c in columns}
+        if names is not None:
+            chunk["audio_path"] = resolve_audio_paths(chunk["filename"], audio_dir, suffix, names)
+        yield chunk
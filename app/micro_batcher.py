@@ -0,0 +1,163 @@
+"""
+Dynamic micro-batching for concurrent /score/ requests.
+Requests arriving within a short window (or up to a max batch size) are coalesced
+into one batched Whisper / grammar call and results are scattered back to each
+caller's future. A batch is dispatched early when its oldest request would
+otherwise miss its latency SLO, or when no other request could still join it.
+"""
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from app.config import MICRO_BATCH_WINDOW_MS, MICRO_BATCH_MAX_SIZE, MICRO_BATCH_SLO_MS
+
+logger = logging.getLogger(__name__)
+
+
+class _Item:
+    __slots__ = ("payload", "future", "enqueued", "deadline")
+
+    def __init__(self, payload, deadline):
+        self.payload = payload
+        self.future = Future()
+        self.enqueued = time.monotonic()
+        self.deadline = deadline
+
+
+class MicroBatcher:
+    """Coalesce single-item calls into batch_fn(list) -> list calls on a dispatcher thread."""
+
+    def __init__(self, batch_fn, name: str, window_ms: float = MICRO_BATCH_WINDOW_MS,
+                 max_batch_size: int = MICRO_BATCH_MAX_SIZE, slo_ms: float = MICRO_BATCH_SLO_MS,
+                 concurrency_hint=None):
+        self.batch_fn = batch_fn
+        self.name = name
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self.slo = slo_ms / 1000.0 if slo_ms else None
+        # callable returning how many requests could currently submit; when the
+        # batch already holds all of them there is no point waiting for the window
+        self.concurrency_hint = concurrency_hint
+        self.batches = 0
+        self.items = 0
+        self._service_time = 0.0  # EMA of batch_fn duration, used for SLO slack
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name=f"microbatch-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, payload) -> Future:
+        deadline = time.monotonic() + self.slo if self.slo else None
+        item = _Item(payload, deadline)
+        self._queue.put(item)
+        return item.future
+
+    def _dispatch_by(self, batch) -> float:
+        """Latest time the batch may wait before the window or an SLO is violated."""
+        limit = batch[0].enqueued + self.window
+        deadlines = [i.deadline for i in batch if i.deadline is not None]
+        if deadlines:
+            limit = min(limit, min(deadlines) - self._service_time)
+        return limit
+
+    def _collect(self):
+        batch = []
+        while not batch:
+            self._take(batch, self._queue.get())
+        while len(batch) < self.max_batch_size:
+            # anything that queued up while the previous batch ran joins immediately
+            try:
+                self._take(batch, self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            if self.concurrency_hint is not None and self.concurrency_hint() <= len(batch):
+                break
+            remaining = self._dispatch_by(batch) - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                self._take(batch, self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def _take(batch, item):
+        # callers that gave up (timed-out awaits cancel their future) are dropped; the
+        # rest can no longer be cancelled, so setting their results cannot fail
+        if item.future.set_running_or_notify_cancel():
+            batch.append(item)
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            try:
+                results = self.batch_fn([i.payload for i in batch])
+                for item, result in zip(batch, results):
+                    if isinstance(result, Exception):
+                        item.future.set_exception(result)
+                    else:
+                        item.future.set_result(result)
+            except Exception as e:
+                logger.exception("Micro-batch %s failed: %s", self.name, e)
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+            elapsed = time.monotonic() - started
+            self._service_time = elapsed if self.batches == 0 else 0.8 * self._service_time + 0.2 * elapsed
+            self.batches += 1
+            self.items += len(batch)
+            logger.debug("Micro-batch %s: %d item(s) in %.3fs", self.name, len(batch), elapsed)
+
+    def metrics(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "service_time_ms": round(self._service_time * 1000, 1),
+            "pending": self._queue.qsize(),
+        }
+
+
+def _inference_concurrency():
+    # admitted /score/ flows wait on the batchers without holding a worker, so every one could join
+    from app.inference_executor import get_inference_executor
+    return get_inference_executor().in_flight
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def micro_batching_enabled() -> bool:
+    return MICRO_BATCH_WINDOW_MS > 0
+
+
+def _get_batcher(name, factory):
+    with _batchers_lock:
+        if name not in _batchers:
+            _batchers[name] = factory()
+        return _batchers[name]
+
+
+def get_asr_batcher() -> MicroBatcher:
+    """Batches decoded 16 kHz buffers through transcribe_audio_batch (cached as LOCAL_BATCH_BACKEND)."""
+    from app.transcriber_enhanced import transcribe_audio_batch
+    return _get_batcher("asr", lambda: MicroBatcher(
+        transcribe_audio_batch, "asr", concurrency_hint=_inference_concurrency
+    ))
+
+
+def get_grammar_batcher() -> MicroBatcher:
+    """Batches transcripts through correct_grammar_batch."""
+    from app.grammar_enhanced import correct_grammar_batch
+    return _get_batcher("grammar", lambda: MicroBatcher(
+        correct_grammar_batch, "grammar", concurrency_hint=_inference_concurrency
+    ))
+
+
+def micro_batch_metrics() -> dict:
+    with _batchers_lock:
+        return {name: b.metrics() for name, b in _batchers.items()}
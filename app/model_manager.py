@@ -0,0 +1,137 @@
+"""
+Resident grammar regressor with hot reload.
+The current model lives in memory as one immutable (model, info) snapshot. A
+watcher thread polls the artifact and, when a newer version appears, loads it in
+the background and swaps the snapshot reference; requests that already took the
+old snapshot finish on the old model.
+"""
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from app.config import MODEL_WATCH_INTERVAL
+from app.forest_artifact import META, load_model, resolve_model_source
+from app.model_predict import MODEL_PATH, COMPILED_MODEL_DIR
+
+logger = logging.getLogger(__name__)
+
+
+class ModelManager:
+    """Keeps the newest trained model loaded and swaps it in atomically."""
+
+    def __init__(self, artifact_dir: str = COMPILED_MODEL_DIR, pickle_path: str = MODEL_PATH,
+                 poll_interval: float = MODEL_WATCH_INTERVAL):
+        self.artifact_dir = artifact_dir
+        self.pickle_path = pickle_path
+        self.poll_interval = poll_interval
+        self._snapshot = None          # (model, info), replaced as a whole
+        self._load_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.reloads = 0
+        self.last_error = None
+
+    def _signature(self):
+        """(source kind, path, mtime_ns) of the artifact load_model would pick, or None."""
+        source = resolve_model_source(self.artifact_dir, self.pickle_path)
+        if source is None:
+            return None
+        kind, path = source
+        stat_path = os.path.join(path, META) if kind == "compiled" else path
+        try:
+            return kind, path, os.stat(stat_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def reload_if_changed(self) -> bool:
+        """Load the artifact if it differs from the active one. Returns True on a swap."""
+        with self._load_lock:
+            signature = self._signature()
+            if signature is None:
+                return False
+            if self._snapshot is not None and self._snapshot[1]["signature"] == signature:
+                return False
+            started = time.perf_counter()
+            try:
+                model = load_model(self.artifact_dir, self.pickle_path)
+            except Exception as e:
+                # keep serving the previous model; the next poll retries
+                self.last_error = str(e)
+                logger.exception("Model reload from %s failed: %s", signature[1], e)
+                return False
+            info = {
+                "signature": signature,
+                "source": signature[0],
+                "path": signature[1],
+                "version": datetime.fromtimestamp(signature[2] / 1e9, timezone.utc).isoformat(),
+                "loaded_at": datetime.now(timezone.utc).isoformat(),
+                "load_time_ms": round((time.perf_counter() - started) * 1000, 2),
+            }
+            self._snapshot = (model, info)
+            self.reloads += 1
+            self.last_error = None
+            logger.info("Loaded model %s (%s) in %.1f ms", info["version"], info["source"], info["load_time_ms"])
+            return True
+
+    def get(self):
+        """(model, info) currently active; loads synchronously on first use."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.reload_if_changed()
+            snapshot = self._snapshot
+            if snapshot is None:
+                raise FileNotFoundError("Train model first using /model/train")
+        return snapshot
+
+    def notify(self):
+        """Ask the watcher to check for a new version now (e.g. right after training)."""
+        self._wake.set()
+
+    def _watch(self):
+        while not self._stop.is_set():
+            try:
+                self.reload_if_changed()
+            except Exception as e:
+                logger.exception("Model watcher error: %s", e)
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def start(self):
+        if self.poll_interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="model-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def status(self) -> dict:
+        snapshot = self._snapshot
+        info = {k: v for k, v in snapshot[1].items() if k != "signature"} if snapshot else None
+        return {
+            "loaded": snapshot is not None,
+            "active": info,
+            "reloads": self.reloads,
+            "watching": self._thread is not None and self._thread.is_alive(),
+            "poll_interval": self.poll_interval,
+            "last_error": self.last_error,
+        }
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_model_manager() -> ModelManager:
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ModelManager()
+        return _manager
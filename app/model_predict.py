@@ -1,84 +1,134 @@
 import os
-import pandas as pd
-import joblib
+import numpy as np
 import logging
-from app.transcriber_enhanced import transcribe_from_path
-from app.train_evaluate import extract_fluency_features
-from app.kaggle_loader import load_test_audio_path
+from joblib import Parallel, delayed, effective_n_jobs
+from app.config import PREDICT_N_JOBS
+from app.forest_artifact import load_model
+from app.transcriber_enhanced import transcribe_from_path, transcribe_batch
+from app.fluency_features import extract_fluency_features_batch, FLUENCY_FEATURES
+from app.kaggle_loader import TEST_AUDIO_DIR
+from app.manifest_reader import iter_manifest, count_manifest_rows
+from app.result_writer import ResultWriter
 
 MODEL_PATH = "data/model.pkl"
+COMPILED_MODEL_DIR = "data/model.forest"
 TEST_CSV = "data/kaggle/test.csv"
 OUTPUT_SUBMISSION = "data/kaggle/submission.csv"
 DEBUG_SUBMISSION = "data/kaggle/submission_debug.csv"
 
+# below this many rows per thread, splitting costs more than it saves
+_MIN_ROWS_PER_JOB = 256
 
-def predict_kaggle_submission():
 
-    if not os.path.exists(MODEL_PATH):
-        raise FileNotFoundError("Train model first using /model/train")
+def _predict_rows(model, X, n_jobs: int = PREDICT_N_JOBS):
+    """model.predict(X), parallel over row blocks.
 
-    model = joblib.load(MODEL_PATH)
+    Each block runs with the model's own n_jobs, so trees are still summed in
+    the same order and every row gets exactly the value a one-row predict gives.
+    """
+    n_jobs = effective_n_jobs(n_jobs)
+    if n_jobs <= 1 or len(X) < 2 * _MIN_ROWS_PER_JOB:
+        return model.predict(X)
+    blocks = np.array_split(X, min(n_jobs, len(X) // _MIN_ROWS_PER_JOB))
+    parts = Parallel(n_jobs=len(blocks), prefer="threads")(delayed(model.predict)(b) for b in blocks)
+    return np.concatenate(parts)
 
-    df = pd.read_csv(TEST_CSV)
-    results = []
-    debug_rows = []
+
+def predict_label(model, asr_text: str) -> float:
+    """Clipped, rounded grade for one transcript (same steps as the Kaggle submission)."""
+    X = extract_fluency_features_batch([asr_text], FLUENCY_FEATURES).to_numpy(dtype=np.float64)
+    pred = min(5.0, max(0.0, float(model.predict(X)[0])))
+    return round(pred, 3)
+
+
+def predict_kaggle_submission(model=None, progress=None):
+    """Write the submission for test.csv; progress(done=, total=, ...) is called per clip."""
+
+    if model is None:
+        if not os.path.exists(MODEL_PATH) and not os.path.isdir(COMPILED_MODEL_DIR):
+            raise FileNotFoundError("Train model first using /model/train")
+        model = load_model(COMPILED_MODEL_DIR, MODEL_PATH)
 
     # basic logger
     logging.basicConfig(level=logging.INFO)
     logger = logging.getLogger(__name__)
 
-    for _, row in df.iterrows():
-        filename = row["filename"]
-        audio_path = load_test_audio_path(filename)
-
-        if audio_path is None:
-            results.append({"filename": filename, "label": ""})
-            debug_rows.append({"filename": filename, "label": "", "error": "audio_file_missing"})
-            logger.warning("Missing audio file for %s", filename)
-            continue
-
-        try:
-            asr = transcribe_from_path(audio_path)
-            feats = extract_fluency_features(asr)
-
-            features = [[
-                feats["len_words"],
-                feats["avg_word_len"],
-                feats["fillers"],
-                feats["repetitions"],
-                feats["punctuation"],
-            ]]
-
-            pred = float(model.predict(features)[0])
-            # Clip prediction to valid grammar score range [0, 5]
-            pred = min(5.0, max(0.0, pred))
-
-            results.append({
-                "filename": filename,
-                "label": round(pred, 3)
-            })
-            debug_rows.append({"filename": filename, "label": round(pred, 3), "error": ""})
-
-        except Exception as e:
-            # record the error for debugging; keep official submission format unchanged
-            results.append({"filename": filename, "label": ""})
-            debug_rows.append({"filename": filename, "label": "", "error": str(e)})
-            logger.exception("Prediction failed for %s: %s", filename, e)
-
-    out = pd.DataFrame(results)
-    out.to_csv(OUTPUT_SUBMISSION, index=False)
-
-    # write debug CSV with error messages to help diagnose missing predictions
-    try:
-        dbg = pd.DataFrame(debug_rows)
-        dbg.to_csv(DEBUG_SUBMISSION, index=False)
-        logger.info("Wrote debug submission to %s", DEBUG_SUBMISSION)
-    except Exception:
-        logger.exception("Failed writing debug submission file")
+    total = count_manifest_rows(TEST_CSV)
+    if progress:
+        progress(total=total, phase="transcribe")
+
+    # rows are streamed out; both files appear under their final names once complete
+    done = 0
+    missing = 0
+    with ResultWriter(OUTPUT_SUBMISSION, ["filename", "label"]) as out, \
+            ResultWriter(DEBUG_SUBMISSION, ["filename", "label", "error"]) as dbg:
+        # test.csv is processed in chunks; within a chunk the phases run over all rows at once
+        for chunk in iter_manifest(TEST_CSV, audio_dir=TEST_AUDIO_DIR, suffix=".wav"):
+            filenames, audio_paths = chunk["filename"], chunk["audio_path"]
+
+            # Phase 1: resolve every transcript (cache + shared worker pool), retrying misses one by one
+            on_transcribed = None
+            if progress:
+                def on_transcribed(n, base=done):
+                    progress(done=base + n)
+            transcripts = transcribe_batch([p for p in audio_paths if p is not None], progress=on_transcribed)
+
+            asr_texts, errors = [None] * len(filenames), [None] * len(filenames)
+            for i, audio_path in enumerate(audio_paths):
+                if audio_path is None:
+                    continue
+                try:
+                    asr_texts[i] = transcripts.get(audio_path) or transcribe_from_path(audio_path)
+                except Exception as e:
+                    errors[i] = e
+                if progress:
+                    progress(done=done + i + 1)
+
+            # Phase 2: featurize every transcript in one columnar pass
+            ready = [i for i, asr in enumerate(asr_texts) if asr is not None]
+            preds = {}
+            if ready:
+                X = extract_fluency_features_batch([asr_texts[i] for i in ready], FLUENCY_FEATURES).to_numpy(dtype=np.float64)
+
+                # Phase 3: one predict over the whole matrix
+                try:
+                    preds = dict(zip(ready, _predict_rows(model, X).tolist()))
+                except Exception as e:
+                    for i in ready:
+                        errors[i] = e
+
+            for i, (filename, audio_path) in enumerate(zip(filenames, audio_paths)):
+                if audio_path is None:
+                    out.write({"filename": filename, "label": ""})
+                    dbg.write({"filename": filename, "label": "", "error": "audio_file_missing"})
+                    logger.warning("Missing audio file for %s", filename)
+                    missing += 1
+                    continue
+
+                if errors[i] is not None:
+                    # record the error for debugging; keep official submission format unchanged
+                    e = errors[i]
+                    out.write({"filename": filename, "label": ""})
+                    dbg.write({"filename": filename, "label": "", "error": str(e)})
+                    logger.error("Prediction failed for %s: %s", filename, e, exc_info=e)
+                    missing += 1
+                    continue
+
+                # Clip prediction to valid grammar score range [0, 5]
+                pred = min(5.0, max(0.0, float(preds[i])))
+
+                out.write({
+                    "filename": filename,
+                    "label": round(pred, 3)
+                })
+                dbg.write({"filename": filename, "label": round(pred, 3), "error": ""})
+            done += len(filenames)
+            if progress:
+                progress(done=done, errors=missing)
+    logger.info("Wrote debug submission to %s", DEBUG_SUBMISSION)
 
     # summary
-    missing = sum(1 for r in results if r.get('label') in (None, ""))
-    logger.info("Total test rows: %d, missing labels: %d", len(results), missing)
+    logger.info("Total test rows: %d, missing labels: %d", done, missing)
     logger.info("Submission saved to %s", OUTPUT_SUBMISSION)
 
     return OUTPUT_SUBMISSION
@@ -0,0 +1,173 @@
+"""
+Cross-validated hyperparameter search for the grammar regressor.
+Forest and gradient-boosting configs compete in one successive-halving search:
+every candidate is scored with k-fold CV on a small sample, the best 1/factor
+move on to the next round with factor times more rows, and the rest stop early.
+Folds run in parallel on all cores; the feature matrix is saved once and
+memory-mapped read-only, so workers share its pages instead of each holding a
+copy. Every candidate lands on a leaderboard with CV RMSE, fit time and predict
+latency.
+"""
+import os
+import json
+import time
+import logging
+import tempfile
+import numpy as np
+import pandas as pd
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import HalvingGridSearchCV, KFold
+from sklearn.base import clone
+from sklearn.pipeline import Pipeline
+from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
+from app.config import TRAIN_CV_FOLDS, TRAIN_SEARCH_FACTOR, TRAIN_SEARCH_SPACE, TRAIN_N_JOBS
+from app.model_train import MODEL_PATH, COMPILED_MODEL_DIR, load_training_data, save_model
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_PATH = "data/model_leaderboard.csv"
+
+# estimators stay single-threaded; the search parallelises across folds and candidates
+MODEL_FAMILIES = {
+    "random_forest": RandomForestRegressor(random_state=42, n_jobs=1),
+    "gradient_boosting": GradientBoostingRegressor(random_state=42),
+}
+
+DEFAULT_SEARCH_SPACE = {
+    "random_forest": {
+        "n_estimators": [150, 300],
+        "max_depth": [8, 12, None],
+        "min_samples_leaf": [1, 3],
+    },
+    "gradient_boosting": {
+        "n_estimators": [200, 400],
+        "learning_rate": [0.05, 0.1],
+        "max_depth": [2, 3],
+        "subsample": [0.8, 1.0],
+    },
+}
+
+
+def load_search_space(path: str = TRAIN_SEARCH_SPACE) -> dict:
+    """Default grid, with families/params replaced by those in the JSON file at path (if set)."""
+    space = {family: dict(grid) for family, grid in DEFAULT_SEARCH_SPACE.items()}
+    if not path:
+        return space
+    with open(path, encoding="utf-8") as f:
+        override = json.load(f)
+    unknown = [family for family in override if family not in MODEL_FAMILIES]
+    if unknown:
+        raise ValueError(f"unknown model families in {path}: {unknown}")
+    for family, grid in override.items():
+        if grid is None:
+            space.pop(family, None)  # null disables a family
+        else:
+            space[family] = {name: list(values) for name, values in grid.items()}
+    return space
+
+
+def _param_grid(space: dict) -> list:
+    """One sub-grid per family over a single-step pipeline, so families share the halving rounds."""
+    grid = []
+    for family, params in space.items():
+        sub = {"model": [MODEL_FAMILIES[family]]}
+        sub.update({f"model__{name}": values for name, values in params.items()})
+        grid.append(sub)
+    return grid
+
+
+def _family(model) -> str:
+    for family, estimator in MODEL_FAMILIES.items():
+        if isinstance(model, type(estimator)):
+            return family
+    return type(model).__name__
+
+
+def _leaderboard(search, cv: int) -> pd.DataFrame:
+    """One row per candidate, taken from the last round it reached."""
+    res = search.cv_results_
+    rows = {}
+    for k, params in enumerate(res["params"]):
+        hyper = {name.split("__", 1)[1]: value for name, value in params.items() if name != "model"}
+        key = (_family(params["model"]), json.dumps(hyper, sort_keys=True, default=str))
+        n_resources = int(res["n_resources"][k])
+        # the score time is spent predicting one test fold of n_resources / cv rows
+        test_rows = max(n_resources // cv, 1)
+        rows[key] = {
+            "family": key[0],
+            "params": key[1],
+            "rounds": int(res["iter"][k]) + 1,
+            "n_samples": n_resources,
+            "cv_rmse": -float(res["mean_test_score"][k]),
+            "cv_rmse_std": float(res["std_test_score"][k]),
+            "fit_time_s": float(res["mean_fit_time"][k]),
+            "predict_ms_per_1k": float(res["mean_score_time"][k]) / test_rows * 1e6,
+        }
+    board = pd.DataFrame(list(rows.values()))
+    # survivors of the last round first; that round's best is the search's best_params_
+    board = board.sort_values(["rounds", "cv_rmse"], ascending=[False, True], kind="stable")
+    board.insert(0, "rank", np.arange(1, len(board) + 1))
+    return board.reset_index(drop=True)
+
+
+def search_regression_model(cv: int = TRAIN_CV_FOLDS, space: dict = None,
+                            factor: int = TRAIN_SEARCH_FACTOR, n_jobs: int = TRAIN_N_JOBS):
+    """Run the search, refit the winner on all rows, save it and the leaderboard."""
+    if cv < 2:
+        raise ValueError("cv must be at least 2")
+    space = space if space is not None else load_search_space()
+    if not space:
+        raise ValueError("search space is empty")
+
+    X, y = load_training_data()
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="model-search-") as tmp:
+        # one read-only copy on disk; joblib hands workers the memory map, not the data
+        path = os.path.join(tmp, "X.npy")
+        np.save(path, np.ascontiguousarray(X.to_numpy(dtype=np.float64)))
+        X_shared = np.load(path, mmap_mode="r")
+        y_shared = y.to_numpy(dtype=np.float64)
+
+        search = HalvingGridSearchCV(
+            Pipeline([("model", MODEL_FAMILIES["random_forest"])]),
+            _param_grid(space),
+            factor=factor,
+            cv=KFold(n_splits=cv, shuffle=True, random_state=42),
+            scoring="neg_root_mean_squared_error",
+            refit=False,
+            n_jobs=n_jobs,
+            random_state=42,
+        )
+        search.fit(X_shared, y_shared)
+
+    board = _leaderboard(search, cv)
+    os.makedirs(os.path.dirname(LEADERBOARD_PATH), exist_ok=True)
+    board.to_csv(LEADERBOARD_PATH, index=False)
+
+    # refit the winner on the full in-memory frame with all cores where the model allows
+    best = search.best_params_
+    model = clone(best["model"]).set_params(
+        **{name.split("__", 1)[1]: value for name, value in best.items() if name != "model"})
+    if "n_jobs" in model.get_params():
+        model.set_params(n_jobs=n_jobs)
+    model.fit(X, y)
+    save_model(model)
+    elapsed = time.perf_counter() - started
+    top = board.iloc[0]
+    logger.info("Model search: %d candidates, best %s (cv rmse %.4f) in %.1fs",
+                len(board), top["family"], top["cv_rmse"], elapsed)
+
+    return {
+        "message": "Model trained successfully",
+        "mode": "search",
+        "model_path": MODEL_PATH,
+        "compiled_model_dir": COMPILED_MODEL_DIR if isinstance(model, RandomForestRegressor) else None,
+        "best_family": top["family"],
+        "best_params": json.loads(top["params"]),
+        "cv_folds": cv,
+        "cv_rmse": float(top["cv_rmse"]),
+        "candidates": int(len(board)),
+        "search_time_s": round(elapsed, 2),
+        "leaderboard_path": LEADERBOARD_PATH,
+        "leaderboard": board.head(10).to_dict(orient="records"),
+    }
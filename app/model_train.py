@@ -1,31 +1,65 @@
 import pandas as pd
 import os
+import shutil
 import joblib
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.metrics import mean_absolute_error, r2_score, root_mean_squared_error
+from app.config import TRAIN_CV_FOLDS
+from app.feature_store import get_feature_store
+from app.forest_artifact import export_forest
+from app.fluency_features import FLUENCY_FEATURES
 
 
 TRAIN_FEATURES = "data/kaggle/train_features.csv"
 MODEL_PATH = "data/model.pkl"
+COMPILED_MODEL_DIR = "data/model.forest"
 
 
-def train_regression_model():
-
-    if not os.path.exists(TRAIN_FEATURES):
-        raise FileNotFoundError("Run /train/evaluate first to generate train_features.csv")
+def load_training_data():
+    """(X, y) from the feature store (memory-mapped columns) or train_features.csv."""
+    # Features used for training
+    FEATURE_COLS = list(FLUENCY_FEATURES)
+    TARGET_COL = "true_label"
 
-    df = pd.read_csv(TRAIN_FEATURES)
+    store = get_feature_store()
+    if store.exists():
+        # memory-mapped read of just the columns the model needs
+        df = store.load([TARGET_COL] + FEATURE_COLS)
+    elif os.path.exists(TRAIN_FEATURES):
+        df = pd.read_csv(TRAIN_FEATURES)
+    else:
+        raise FileNotFoundError("Run /train/evaluate first to generate train features")
 
     # Drop rows with errors and missing data
     df = df.dropna(subset=["true_label", "len_words", "avg_word_len"])
 
-    # Features used for training
-    FEATURE_COLS = ["len_words", "avg_word_len", "fillers", "repetitions", "punctuation"]
-    TARGET_COL = "true_label"
+    return df[FEATURE_COLS], df[TARGET_COL]
 
-    X = df[FEATURE_COLS]
-    y = df[TARGET_COL]
+
+def save_model(model):
+    """Pickle the model and, for forests, the flattened fast-loading artifact."""
+    # trained with all cores; predict single-threaded so trees are summed in a fixed order
+    if "n_jobs" in model.get_params():
+        model.set_params(n_jobs=None)
+    joblib.dump(model, MODEL_PATH)
+    if isinstance(model, RandomForestRegressor):
+        export_forest(model, COMPILED_MODEL_DIR)
+    elif os.path.isdir(COMPILED_MODEL_DIR):
+        # a stale forest artifact must not shadow a different model type
+        shutil.rmtree(COMPILED_MODEL_DIR, ignore_errors=True)
+
+
+def train_regression_model(mode: str = "fixed", cv: int = TRAIN_CV_FOLDS):
+    """mode="fixed": one RandomForest on an 80/20 split. mode="search": k-fold CV
+    successive-halving search over forest and boosting configs (see model_search)."""
+    if mode == "search":
+        from app.model_search import search_regression_model
+        return search_regression_model(cv=cv)
+    if mode != "fixed":
+        raise ValueError("mode must be 'fixed' or 'search'")
+
+    X, y = load_training_data()
 
     # Simple split for validation
     X_train, X_val, y_train, y_val = train_test_split(
@@ -36,22 +70,27 @@ def train_regression_model():
     model = RandomForestRegressor(
         n_estimators=300,
         max_depth=12,
-        random_state=42
+        random_state=42,
+        n_jobs=-1
     )
 
     model.fit(X_train, y_train)
+    model.set_params(n_jobs=None)
 
     # Validation metrics
     val_pred = model.predict(X_val)
     mae = mean_absolute_error(y_val, val_pred)
+    rmse = root_mean_squared_error(y_val, val_pred)
     r2 = r2_score(y_val, val_pred)
 
-    # Save model
-    joblib.dump(model, MODEL_PATH)
+    # Save model (pickle for sklearn, flattened artifact for fast loading)
+    save_model(model)
 
     return {
         "message": "Model trained successfully",
         "model_path": MODEL_PATH,
+        "compiled_model_dir": COMPILED_MODEL_DIR,
         "val_mae": mae,
+        "val_rmse": rmse,
         "val_r2": r2
     }
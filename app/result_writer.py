@@ -0,0 +1,205 @@
+"""
+Incremental writer for batch result files.
+Rows are written as they complete against a schema fixed up front, into
+`<path>.partial`; every flush_rows rows the buffer is pushed to the OS so
+readers (see follow_result_file) can stream the file while it grows, and
+closing renames it over `<path>` atomically; an aborted writer leaves `<path>`
+untouched and followers end with ResultWriteAborted. CSV and JSONL are built in;
+Parquet needs pyarrow and is written one row group per flush.
+"""
+import os
+import csv
+import json
+import time
+import logging
+import threading
+from app.config import RESULT_FLUSH_ROWS
+
+logger = logging.getLogger(__name__)
+
+PARTIAL_SUFFIX = ".partial"
+FORMATS = ("csv", "jsonl", "parquet")
+
+# final paths with a writer currently open
+_active = set()
+# final paths whose last writer aborted instead of publishing
+_aborted = set()
+_active_lock = threading.Lock()
+
+
+class ResultWriteAborted(IOError):
+    """Raised to a follower when the writer stopped without publishing the file."""
+
+
+def partial_path(path: str) -> str:
+    return path + PARTIAL_SUFFIX
+
+
+def is_writing(path: str) -> bool:
+    with _active_lock:
+        return os.path.abspath(path) in _active
+
+
+def _format_for(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    fmt = {"ndjson": "jsonl", "pq": "parquet"}.get(ext, ext)
+    if fmt not in FORMATS:
+        raise ValueError(f"cannot infer result format from {path}; pass one of {FORMATS}")
+    return fmt
+
+
+class ResultWriter:
+    """Write dict rows to path with a fixed column list; use as a context manager.
+
+    Keys outside `columns` are dropped and missing ones left empty. `types`
+    optionally maps columns to Arrow type names for Parquet; other columns take
+    their type from the first flushed batch.
+    """
+
+    def __init__(self, path: str, columns: list, fmt: str = None, flush_rows: int = RESULT_FLUSH_ROWS,
+                 types: dict = None):
+        if not columns:
+            raise ValueError("columns must be declared up front")
+        self.path = path
+        self.columns = list(columns)
+        self.fmt = fmt or _format_for(path)
+        if self.fmt not in FORMATS:
+            raise ValueError(f"unknown result format {self.fmt}")
+        self.flush_rows = max(1, flush_rows)
+        self.types = types or {}
+        self.rows = 0
+        self._buffer = []
+        self._file = None
+        self._writer = None
+
+    def open(self) -> "ResultWriter":
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.fmt == "parquet":
+            import pyarrow  # noqa: F401  fail now rather than at the first flush
+        else:
+            self._file = open(partial_path(self.path), "w", newline="", encoding="utf-8")
+            if self.fmt == "csv":
+                self._writer = csv.DictWriter(self._file, fieldnames=self.columns, restval="",
+                                              extrasaction="ignore")
+                self._writer.writeheader()
+                self._file.flush()
+        with _active_lock:
+            _active.add(os.path.abspath(self.path))
+            _aborted.discard(os.path.abspath(self.path))
+        return self
+
+    def write(self, row: dict):
+        self._buffer.append(row)
+        self.rows += 1
+        if len(self._buffer) >= self.flush_rows:
+            self.flush()
+
+    def write_many(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        rows, self._buffer = self._buffer, []
+        if self.fmt == "csv":
+            self._writer.writerows(rows)
+        elif self.fmt == "jsonl":
+            self._file.writelines(
+                json.dumps({c: row.get(c) for c in self.columns}, default=str) + "\n" for row in rows)
+        elif rows or self._writer is None:
+            self._write_parquet(rows)
+        if self._file is not None:
+            self._file.flush()
+
+    def _write_parquet(self, rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        data = {c: [row.get(c) for row in rows] for c in self.columns}
+        if self._writer is None:
+            fields = []
+            for c in self.columns:
+                if c in self.types:
+                    dtype = pa.type_for_alias(self.types[c])
+                else:
+                    dtype = pa.array(data[c]).type
+                    if pa.types.is_null(dtype):
+                        dtype = pa.string()
+                fields.append(pa.field(c, dtype))
+            self._writer = pq.ParquetWriter(partial_path(self.path), pa.schema(fields))
+        table = pa.Table.from_pydict(data, schema=self._writer.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        """Flush the rest and atomically publish the file at path."""
+        try:
+            self.flush()
+            if self.fmt == "parquet":
+                self._writer.close()
+            else:
+                self._file.close()
+            os.replace(partial_path(self.path), self.path)
+        finally:
+            self._release()
+
+    def abort(self):
+        """Stop writing; what was written stays in <path>.partial and path is left untouched."""
+        try:
+            if self._file is not None and not self._file.closed:
+                self.flush()
+                self._file.close()
+            elif self.fmt == "parquet" and self._writer is not None:
+                self._writer.close()
+        except Exception as e:
+            logger.warning("Could not flush partial results for %s: %s", self.path, e)
+        finally:
+            with _active_lock:
+                _aborted.add(os.path.abspath(self.path))
+            self._release()
+
+    def _release(self):
+        with _active_lock:
+            _active.discard(os.path.abspath(self.path))
+
+    def __enter__(self) -> "ResultWriter":
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def follow_result_file(path: str, chunk_size: int = 1 << 16, poll: float = 0.5):
+    """Yield the bytes of a result file, following `<path>.partial` while it is being written.
+
+    The open handle keeps reading the same file after the writer renames it into
+    place, so the stream ends with exactly the finished file. If the writer aborts
+    instead, ResultWriteAborted is raised after the rows written so far, so the
+    stream fails rather than ending like a complete file.
+    """
+    try:
+        f = open(partial_path(path), "rb")
+    except FileNotFoundError:
+        # finished between the caller's check and here
+        f = open(path, "rb")
+    with f:
+        while True:
+            chunk = f.read(chunk_size)
+            if chunk:
+                yield chunk
+                continue
+            if not is_writing(path):
+                # drain whatever the final flush added after our last read
+                rest = f.read()
+                if rest:
+                    yield rest
+                with _active_lock:
+                    aborted = os.path.abspath(path) in _aborted
+                if aborted:
+                    raise ResultWriteAborted(f"writer for {path} aborted; the streamed file is incomplete")
+                return
+            time.sleep(poll)
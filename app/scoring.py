@@ -1,12 +1,99 @@
-from jiwer import wer
+import re
+from jiwer import wer, process_words
+from app.wer_engine import batch_wer
+
+# jiwer's word tokenisation: runs of 2+ whitespace or a single space separate words
+_WORD_GAP = re.compile(r"\s\s+| ")
+_OP_CODES = {"equal": "=", "substitute": "S", "delete": "D", "insert": "I"}
+
+
+def _word_spans(text: str) -> list:
+    """(start, end) character span in `text` of every word jiwer sees."""
+    spans, pos = [], 0
+    for m in _WORD_GAP.finditer(text):
+        spans.append([pos, m.start()])
+        pos = m.end()
+    spans.append([pos, len(text)])
+    # jiwer strips the whole string, so only the outermost whitespace is dropped
+    first, last = spans[0], spans[-1]
+    first[0] += len(text[first[0]:first[1]]) - len(text[first[0]:first[1]].lstrip())
+    last[1] -= len(text[last[0]:last[1]]) - len(text[last[0]:last[1]].rstrip())
+    return [(a, b) for a, b in spans if a < b]
+
+
+def _char_span(spans: list, start: int, end: int, text_len: int) -> list:
+    if end > start:
+        return [spans[start][0], spans[end - 1][1]]
+    # zero-width: the position the other side's words are inserted at / deleted from
+    pos = spans[start][0] if start < len(spans) else text_len
+    return [pos, pos]
+
+
+def _alignment(original: str, corrected: str, chunks, counts: dict) -> dict:
+    """Compact alignment: run-length encoded ops, one entry per edit run, counts."""
+    o_spans, c_spans = _word_spans(original), _word_spans(corrected)
+    ops, edits = [], []
+    for ch in chunks:
+        code = _OP_CODES[ch.type]
+        ops.append(f"{code}{max(ch.ref_end_idx - ch.ref_start_idx, ch.hyp_end_idx - ch.hyp_start_idx)}")
+        if code == "=":
+            continue
+        o_chars = _char_span(o_spans, ch.ref_start_idx, ch.ref_end_idx, len(original))
+        c_chars = _char_span(c_spans, ch.hyp_start_idx, ch.hyp_end_idx, len(corrected))
+        edits.append({
+            "op": code,
+            "words": [ch.ref_start_idx, ch.ref_end_idx, ch.hyp_start_idx, ch.hyp_end_idx],
+            "chars": o_chars + c_chars,
+            "original": original[o_chars[0]:o_chars[1]],
+            "corrected": corrected[c_chars[0]:c_chars[1]],
+        })
+    return {"ops": " ".join(ops), "edits": edits, "counts": counts}
+
+
+def compute_wer_and_score(original: str, corrected: str, return_alignment: bool = False):
+    """WER of corrected vs original and the 0-100 score.
+
+    With return_alignment=True a third value describes the word alignment found
+    while computing the WER (see _alignment): "ops" like "=3 S1 =4 I1",
+    "edits" with word spans [orig_start, orig_end, corr_start, corr_end] and
+    character spans into both strings, and hit/substitution/deletion/insertion counts.
+    """
+    if not return_alignment:
+        try:
+            error = wer(original, corrected)
+        except Exception:
+            error = 1.0
+        score = max(0.0, 1.0 - error) * 100.0
+        return error, round(score, 2)
 
-def compute_wer_and_score(original: str, corrected: str):
     try:
-        error = wer(original, corrected)
+        out = process_words(original, corrected)
+        error = out.wer
+        alignment = _alignment(original, corrected, out.alignments[0], {
+            "hits": out.hits, "substitutions": out.substitutions,
+            "deletions": out.deletions, "insertions": out.insertions,
+        })
     except Exception:
         error = 1.0
+        # nothing to align against (e.g. empty original): every corrected word is an insertion
+        c_words = len(_word_spans(corrected)) if isinstance(corrected, str) else 0
+        alignment = {
+            "ops": f"I{c_words}" if c_words else "",
+            "edits": [],
+            "counts": {"hits": 0, "substitutions": 0, "deletions": 0, "insertions": c_words},
+        }
     score = max(0.0, 1.0 - error) * 100.0
-    return error, round(score, 2)
+    return error, round(score, 2), alignment
+
+
+def compute_wer_and_score_batch(originals: list, corrected: list):
+    """compute_wer_and_score for many pairs in one vectorized pass; same numbers."""
+    results = []
+    for error in batch_wer(originals, corrected).tolist():
+        if error != error:  # NaN: jiwer would have raised
+            error = 1.0
+        results.append((error, round(max(0.0, 1.0 - error) * 100.0, 2)))
+    return results
 
 
 def batch_score(pairs: list[dict]):
@@ -17,11 +104,10 @@ def batch_score(pairs: list[dict]):
         ...
     ]
     """
+    originals = [p["original"] for p in pairs]
+    corrected = [p["corrected"] for p in pairs]
     results = []
-    for p in pairs:
-        o = p["original"]
-        c = p["corrected"]
-        wer_value, score = compute_wer_and_score(o, c)
+    for o, c, (wer_value, score) in zip(originals, corrected, compute_wer_and_score_batch(originals, corrected)):
         results.append({
             "original": o,
             "corrected": c,
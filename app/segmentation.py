@@ -0,0 +1,150 @@
+"""
+Silence-based segmentation for long recordings.
+Audio is read as a stream of 16 kHz blocks (16 kHz WAV directly, anything else
+resampled by ffmpeg in one continuous pass), an energy VAD over fixed-size
+NumPy frames picks cut points inside pauses, and segments of at most
+VAD_MAX_SEGMENT_S are emitted as soon as they are complete, so memory stays
+bounded by one segment (plus one read block) regardless of file length.
+"""
+import wave
+import logging
+import subprocess
+import numpy as np
+from app.audio_decode import SAMPLE_RATE, decode_audio_bytes
+from app.config import (
+    VAD_MAX_SEGMENT_S, VAD_MIN_SILENCE_MS, VAD_ENERGY_THRESHOLD_DB, VAD_FRAME_MS
+)
+
+logger = logging.getLogger(__name__)
+
+_BLOCK_SECONDS = 10
+
+
+def audio_duration(audio_path: str):
+    """Duration in seconds from a WAV header, or None when it can't be read cheaply."""
+    try:
+        with wave.open(audio_path, "rb") as w:
+            return w.getnframes() / float(w.getframerate())
+    except (wave.Error, EOFError, OSError):
+        return None
+
+
+def _stream_wav(audio_path: str, block_seconds: float):
+    with wave.open(audio_path, "rb") as w:
+        if w.getsampwidth() != 2:
+            raise wave.Error("only 16-bit PCM is streamed natively")
+        if w.getframerate() != SAMPLE_RATE:
+            # resampling block by block leaves a filter edge at every block boundary;
+            # ffmpeg's resampler (or a whole-file decode) is continuous
+            raise wave.Error("only 16 kHz is streamed natively")
+        channels = w.getnchannels()
+        frames_per_block = int(SAMPLE_RATE * block_seconds)
+        while True:
+            raw = w.readframes(frames_per_block)
+            if not raw:
+                break
+            block = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+            if channels > 1:
+                block = block.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+            yield block
+
+
+def _stream_ffmpeg(audio_path: str, block_seconds: float):
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0", "-i", audio_path,
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "pipe:1",
+    ]
+    block_bytes = int(SAMPLE_RATE * block_seconds) * 2
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            raw = proc.stdout.read(block_bytes)
+            if not raw:
+                break
+            yield np.frombuffer(raw[:len(raw) - len(raw) % 2], dtype="<i2").astype(np.float32) / 32768.0
+    finally:
+        proc.stdout.close()
+        proc.wait()
+
+
+def stream_audio(source, block_seconds: float = _BLOCK_SECONDS):
+    """Yield float32 16 kHz mono blocks from a path or an in-memory buffer."""
+    if not isinstance(source, str):
+        step = int(SAMPLE_RATE * block_seconds)
+        for start in range(0, len(source), step):
+            yield source[start:start + step]
+        return
+    try:
+        yield from _stream_wav(source, block_seconds)
+    except (wave.Error, EOFError):
+        try:
+            yield from _stream_ffmpeg(source, block_seconds)
+        except FileNotFoundError:
+            # no ffmpeg: decode in one piece (memory is then proportional to file length)
+            with open(source, "rb") as f:
+                yield from stream_audio(decode_audio_bytes(f.read()), block_seconds)
+
+
+def frame_db(audio: np.ndarray, frame_len: int) -> np.ndarray:
+    """RMS level in dBFS of consecutive non-overlapping frames."""
+    n = len(audio) // frame_len
+    frames = audio[:n * frame_len].reshape(n, frame_len)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+    return 20.0 * np.log10(np.maximum(rms, 1e-10))
+
+
+def find_pause_cut(buffer: np.ndarray, frame_len: int, min_silence_frames: int, threshold_db: float):
+    """Sample index of the middle of the last long-enough pause, or None."""
+    silent = frame_db(buffer, frame_len) < threshold_db
+    if not silent.any():
+        return None
+    # run-length encode the silence mask
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], silent.astype(np.int8), [0]))))
+    starts, ends = edges[0::2], edges[1::2]
+    long_runs = np.flatnonzero(ends - starts >= min_silence_frames)
+    # ignore pauses at the very start; they would produce an empty segment
+    long_runs = long_runs[(starts[long_runs] + ends[long_runs]) // 2 > 0]
+    if len(long_runs) == 0:
+        return None
+    k = long_runs[-1]
+    return int((starts[k] + ends[k]) // 2) * frame_len
+
+
+def segment_audio(source, max_segment_s: float = VAD_MAX_SEGMENT_S,
+                  min_silence_ms: float = VAD_MIN_SILENCE_MS,
+                  threshold_db: float = VAD_ENERGY_THRESHOLD_DB, frame_ms: float = VAD_FRAME_MS):
+    """Yield (index, offset_seconds, samples) segments cut at pauses.
+
+    Segments never exceed max_segment_s; when a window has no pause long enough
+    it is cut hard at the limit. Fully silent segments are skipped.
+    """
+    frame_len = int(SAMPLE_RATE * frame_ms / 1000)
+    min_silence_frames = max(1, int(min_silence_ms / frame_ms))
+    max_len = int(SAMPLE_RATE * max_segment_s)
+
+    index = 0
+    offset = 0  # samples consumed before `buffer`
+    buffer = np.zeros(0, dtype=np.float32)
+
+    def emit(segment, seg_offset):
+        nonlocal index
+        if len(segment) >= frame_len and (frame_db(segment, frame_len) >= threshold_db).any():
+            out = (index, seg_offset / SAMPLE_RATE, segment)
+            index += 1
+            return out
+        return None
+
+    for block in stream_audio(source):
+        buffer = np.concatenate((buffer, block))
+        while len(buffer) >= max_len:
+            cut = find_pause_cut(buffer[:max_len], frame_len, min_silence_frames, threshold_db) or max_len
+            seg = emit(buffer[:cut], offset)
+            if seg:
+                yield seg
+            buffer = buffer[cut:]
+            offset += cut
+
+    if len(buffer):
+        seg = emit(buffer, offset)
+        if seg:
+            yield seg
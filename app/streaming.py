@@ -0,0 +1,163 @@
+"""
+Incremental scoring for live audio (used by the /ws/score WebSocket).
+Audio chunks accumulate at the client's sample rate in a rolling buffer;
+whenever the speaker pauses (or the buffer reaches VAD_MAX_SEGMENT_S) the
+utterance before the pause is resampled to 16 kHz in one pass and transcribed,
+every sentence it completes is grammar-corrected and scored, and a running
+word-weighted WER/score is updated. At end of stream only the tail after the
+last pause is left to process, so the final score follows within one short pass.
+"""
+import io
+import re
+import wave
+import logging
+import numpy as np
+from app.audio_decode import SAMPLE_RATE
+from app.segmentation import find_pause_cut, frame_db
+from app.grammar_enhanced import correct_grammar
+from app.scoring import compute_wer_and_score
+from app.config import (
+    USE_LOCAL_WHISPER, VAD_MAX_SEGMENT_S, VAD_MIN_SILENCE_MS, VAD_ENERGY_THRESHOLD_DB, VAD_FRAME_MS
+)
+
+logger = logging.getLogger(__name__)
+
+# a sentence is complete once it ends in terminal punctuation (optionally quoted)
+_SENTENCE_END = re.compile(r"""[.!?]["')\]]*$""")
+_SENTENCE_SPLIT = re.compile(r"""(?<=[.!?])["')\]]*\s+""")
+
+SUPPORTED_ENCODINGS = ("pcm_s16le", "f32le")
+
+
+def _pcm_to_wav_bytes(samples: np.ndarray) -> bytes:
+    bio = io.BytesIO()
+    with wave.open(bio, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes((np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes())
+    return bio.getvalue()
+
+
+def transcribe_utterance(samples: np.ndarray) -> str:
+    """Local Whisper on the buffer, falling back to Groq with an in-memory WAV."""
+    from app.transcriber_enhanced import transcribe_with_local_whisper, transcribe_with_groq_api
+    if USE_LOCAL_WHISPER:
+        try:
+            return transcribe_with_local_whisper(samples)
+        except Exception as e:
+            logger.warning(f"Local Whisper failed on stream utterance, trying Groq: {e}")
+    return transcribe_with_groq_api(_pcm_to_wav_bytes(samples)).strip()
+
+
+class StreamingScorer:
+    """Rolling-buffer transcriber plus running sentence-level WER/score."""
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, encoding: str = "pcm_s16le",
+                 max_segment_s: float = VAD_MAX_SEGMENT_S, min_silence_ms: float = VAD_MIN_SILENCE_MS,
+                 threshold_db: float = VAD_ENERGY_THRESHOLD_DB, frame_ms: float = VAD_FRAME_MS):
+        if encoding not in SUPPORTED_ENCODINGS:
+            raise ValueError(f"encoding must be one of {SUPPORTED_ENCODINGS}")
+        self.sample_rate = sample_rate
+        self.encoding = encoding
+        # the buffer stays at the client's rate, so lengths are in its samples
+        self.frame_len = int(sample_rate * frame_ms / 1000)
+        self.min_silence_frames = max(1, int(min_silence_ms / frame_ms))
+        self.max_len = int(sample_rate * max_segment_s)
+        self.threshold_db = threshold_db
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._carry = ""          # transcript of an unfinished sentence
+        self._scanned = 0         # samples of _buffer already searched for a pause
+        self.sentences = []
+        self._errors = 0.0        # sum of wer_i * ref_words_i
+        self._ref_words = 0
+
+    def _decode_chunk(self, chunk: bytes) -> np.ndarray:
+        if self.encoding == "pcm_s16le":
+            samples = np.frombuffer(chunk[:len(chunk) - len(chunk) % 2], dtype="<i2").astype(np.float32) / 32768.0
+        else:
+            samples = np.frombuffer(chunk[:len(chunk) - len(chunk) % 4], dtype="<f4")
+        return samples
+
+    def _resample(self, utterance: np.ndarray) -> np.ndarray:
+        """Whole utterance to 16 kHz; resampling frame by frame would leave filter edges at every frame."""
+        if self.sample_rate == SAMPLE_RATE:
+            return utterance
+        from math import gcd
+        from scipy.signal import resample_poly
+        g = gcd(SAMPLE_RATE, self.sample_rate)
+        return resample_poly(utterance, SAMPLE_RATE // g, self.sample_rate // g).astype(np.float32)
+
+    def feed(self, chunk: bytes) -> list:
+        """Add raw audio; returns events for any sentences finalised by it."""
+        self._buffer = np.concatenate((self._buffer, self._decode_chunk(chunk)))
+        events = []
+        while True:
+            cut = self._next_cut()
+            if cut is None:
+                break
+            utterance, self._buffer = self._buffer[:cut], self._buffer[cut:]
+            self._scanned = 0
+            events.extend(self._process(utterance, final=False))
+        return events
+
+    def _next_cut(self):
+        # only look for a pause in audio that arrived after the last search
+        # (plus one pause-length of overlap), so every chunk is scanned once
+        overlap = self.min_silence_frames * self.frame_len
+        start = max(0, self._scanned - overlap)
+        window = self._buffer[:self.max_len]
+        if len(window) - start >= self.min_silence_frames * self.frame_len:
+            cut = find_pause_cut(window[start:], self.frame_len, self.min_silence_frames, self.threshold_db)
+            if cut is not None:
+                return start + cut
+        self._scanned = len(window)
+        if len(self._buffer) >= self.max_len:
+            return self.max_len
+        return None
+
+    def finish(self) -> list:
+        """Flush the tail after the last pause and close any open sentence."""
+        tail, self._buffer = self._buffer, np.zeros(0, dtype=np.float32)
+        return self._process(tail, final=True)
+
+    def _process(self, utterance: np.ndarray, final: bool) -> list:
+        text = ""
+        if len(utterance) >= self.frame_len and (frame_db(utterance, self.frame_len) >= self.threshold_db).any():
+            text = transcribe_utterance(self._resample(utterance))
+        text = " ".join(t for t in (self._carry, text.strip()) if t)
+        parts = [p.strip() for p in _SENTENCE_SPLIT.split(text) if p.strip()]
+        if parts and not final and not _SENTENCE_END.search(parts[-1]):
+            self._carry = parts.pop()
+        else:
+            self._carry = ""
+        return [self._score_sentence(p) for p in parts]
+
+    def _score_sentence(self, sentence: str) -> dict:
+        corrected = correct_grammar(sentence)
+        wer_val, score = compute_wer_and_score(sentence, corrected)
+        ref_words = len(sentence.split())
+        self._errors += wer_val * ref_words
+        self._ref_words += ref_words
+        self.sentences.append({"asr_text": sentence, "corrected_text": corrected,
+                               "wer": round(wer_val, 4), "score": score})
+        return {"event": "sentence", "index": len(self.sentences) - 1, **self.sentences[-1], **self.running()}
+
+    def running(self) -> dict:
+        """Word-weighted WER over all closed sentences and the matching 0-100 score."""
+        wer_val = self._errors / self._ref_words if self._ref_words else 0.0
+        return {
+            "running_wer": round(wer_val, 4),
+            "running_score_0_100": round(max(0.0, 1.0 - wer_val) * 100.0, 2),
+        }
+
+    def summary(self) -> dict:
+        running = self.running()
+        return {
+            "event": "final",
+            "asr_text": " ".join(s["asr_text"] for s in self.sentences),
+            "corrected_text": " ".join(s["corrected_text"] for s in self.sentences),
+            "sentences": len(self.sentences),
+            "wer": running["running_wer"],
+            "grammar_score_0_100": running["running_score_0_100"],
+        }
@@ -1,10 +1,20 @@
 import os
-import pandas as pd
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import time
+import shutil
+import logging
 
-from app.kaggle_loader import load_train_audio_path
+from app.kaggle_loader import load_train_audio_path, TRAIN_AUDIO_DIR
+from app.manifest_reader import iter_manifest, count_manifest_rows
 from app.transcriber_enhanced import transcribe_from_path, transcribe_batch
-from app.config import BATCH_SIZE
+from app.config import BATCH_SIZE, TRAIN_SHARD_SIZE, TRAIN_CHECKPOINT_DIR
+from app.feature_store import get_feature_store
+from app.fluency_features import registered_features
+from app.result_writer import ResultWriter
+
+logger = logging.getLogger(__name__)
+
+TRAIN_CSV = "data/kaggle/train.csv"
 
 # ---- Feature extractor ----
 def extract_fluency_features(text: str):
@@ -60,70 +70,186 @@ def process_single_train(row):
         }
 
 
-# ----- Main threaded evaluation -----
-def run_train_evaluation():
-    df = pd.read_csv("data/kaggle/train.csv")
-
-    # Prepare list of audio paths for batch transcription
-    audio_paths = []
-    filename_to_path = {}
-    for _, row in df.iterrows():
-        fn = row["filename"]
-        p = load_train_audio_path(fn)
-        filename_to_path[fn] = p
-        if p is not None:
-            audio_paths.append(p)
-
-    # Transcribe in parallel (uses local whisper worker pool)
-    transcripts = {}
-    if audio_paths:
-        try:
-            transcripts = transcribe_batch(audio_paths, max_workers=BATCH_SIZE)
-        except Exception:
-            # Fallback: try single-threaded transcriptions
-            transcripts = {}
-            for p in audio_paths:
-                try:
-                    transcripts[p] = transcribe_from_path(p)
-                except Exception as e:
-                    transcripts[p] = None
-
-    results = []
-    for _, row in df.iterrows():
-        filename, true_label = row["filename"], row["label"]
-        audio_path = filename_to_path.get(filename)
-        if audio_path is None:
-            results.append({
-                "filename": filename,
-                "true_label": true_label,
-                "error": "file_not_found"
-            })
+# ----- Checkpointed, sharded evaluation -----
+MANIFEST = "manifest.json"
+CHECKPOINT_FORMAT = 1
+
+
+def _source_fingerprint(path: str) -> dict:
+    st = os.stat(path)
+    return {"path": path, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _write_json_atomic(path: str, obj):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _load_checkpoint(checkpoint_dir: str, source: dict, shard_size: int, resume: bool) -> dict:
+    """Manifest of a previous run over the same train.csv and shard size, else a fresh one.
+
+    Shards that finished with error rows stay in the manifest but are not done:
+    the next run retries just those rows (see _process_shard).
+    """
+    fresh = {"format": CHECKPOINT_FORMAT, "source": source, "shard_size": shard_size, "shards": {}}
+    path = os.path.join(checkpoint_dir, MANIFEST)
+    if resume and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if (manifest.get("format") == CHECKPOINT_FORMAT and manifest.get("source") == source
+                and manifest.get("shard_size") == shard_size):
+            # a shard counts only if its part file survived too
+            manifest["shards"] = {k: v for k, v in manifest["shards"].items()
+                                  if os.path.exists(os.path.join(checkpoint_dir, v["file"]))}
+            manifest.pop("completed", None)
+            return manifest
+        logger.info("Train checkpoint in %s is for other inputs; starting over", checkpoint_dir)
+    if os.path.isdir(checkpoint_dir):
+        shutil.rmtree(checkpoint_dir)
+    os.makedirs(checkpoint_dir)
+    return fresh
+
+
+def _transcribe_paths(audio_paths: list) -> dict:
+    # Transcribe in parallel (reuses the persistent local whisper worker pool)
+    if not audio_paths:
+        return {}
+    try:
+        return transcribe_batch(audio_paths, max_workers=BATCH_SIZE)
+    except Exception:
+        # Fallback: try single-threaded transcriptions
+        transcripts = {}
+        for p in audio_paths:
+            try:
+                transcripts[p] = transcribe_from_path(p)
+            except Exception:
+                transcripts[p] = None
+        return transcripts
+
+
+def _process_shard(shard: dict, previous: list = None) -> list:
+    """Transcription result per clip: filename, true_label, and asr_text or error.
+
+    shard is one iter_manifest chunk (filename, label and resolved audio_path lists).
+    previous holds the rows of an earlier attempt at this shard; only its error
+    rows are transcribed again.
+    """
+    kept = {}
+    if previous is not None:
+        kept = {(r["filename"], r["true_label"]): r for r in previous if "error" not in r}
+    todo = [p for fn, label, p in zip(shard["filename"], shard["label"], shard["audio_path"])
+            if p is not None and (fn, float(label)) not in kept]
+    transcripts = _transcribe_paths(todo)
+
+    rows = []
+    for filename, true_label, audio_path in zip(shard["filename"], shard["label"], shard["audio_path"]):
+        row = kept.get((filename, float(true_label)))
+        if row is not None:
+            rows.append(row)
             continue
-
-        asr_text = transcripts.get(audio_path)
-        if not asr_text:
-            results.append({
-                "filename": filename,
-                "true_label": true_label,
-                "error": "transcription_failed"
-            })
+        if audio_path is None:
+            error, asr_text = "file_not_found", None
+        else:
+            asr_text = transcripts.get(audio_path)
+            error = None if asr_text else "transcription_failed"
+        row = {"filename": filename, "true_label": float(true_label)}
+        if error:
+            row["error"] = error
+        else:
+            row["asr_text"] = asr_text
+        rows.append(row)
+    return rows
+
+
+def _shard_errors(manifest: dict, shard_ids: list) -> int:
+    return sum(manifest["shards"][k]["errors"] for k in shard_ids if k in manifest["shards"])
+
+
+def _read_part(path: str):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def run_train_evaluation(resume: bool = True, shard_size: int = TRAIN_SHARD_SIZE,
+                         checkpoint_dir: str = TRAIN_CHECKPOINT_DIR, progress=None):
+    """Transcribe train.csv shard by shard, then build features and train_features.csv.
+
+    Each shard's transcripts go to an append-only JSONL part and are recorded in
+    the checkpoint manifest once written, so a killed run resumes after the last
+    completed shard. A shard with error rows (missing audio, failed ASR) is not
+    done: later runs retry those rows. Only one shard of rows is held at a time.
+    progress(done=, errors=, phase=) is called after every shard.
+    """
+    source = _source_fingerprint(TRAIN_CSV)
+    manifest = _load_checkpoint(checkpoint_dir, source, shard_size, resume)
+    done = sum(1 for v in manifest["shards"].values() if not v["errors"])
+    if manifest["shards"]:
+        logger.info("Resuming train evaluation: %d shards done, %d to retry",
+                    done, len(manifest["shards"]) - done)
+
+    if progress:
+        progress(total=count_manifest_rows(TRAIN_CSV), phase="transcribe")
+    n_rows = 0
+    shard_ids = []
+    shards = iter_manifest(TRAIN_CSV, ("filename", "label"), chunk_rows=shard_size,
+                           audio_dir=TRAIN_AUDIO_DIR, suffix=".wav")
+    for k, shard in enumerate(shards):
+        n_rows += len(shard["filename"])
+        shard_ids.append(str(k))
+        entry = manifest["shards"].get(str(k))
+        if entry is not None and not entry["errors"]:
+            if progress:
+                progress(done=n_rows, errors=_shard_errors(manifest, shard_ids), phase="transcribe")
             continue
-
-        try:
-            feats = extract_fluency_features(asr_text)
-            results.append({
-                "filename": filename,
-                "true_label": true_label,
-                "asr_text": asr_text,
-                **feats
-            })
-        except Exception as e:
-            results.append({
-                "filename": filename,
-                "true_label": true_label,
-                "error": str(e)
-            })
-
+        started = time.perf_counter()
+        previous = None
+        if entry is not None:
+            previous = list(_read_part(os.path.join(checkpoint_dir, entry["file"])))
+        rows = _process_shard(shard, previous)
+        part = f"part-{k:05d}.jsonl"
+        part_path = os.path.join(checkpoint_dir, part)
+        with open(f"{part_path}.tmp", "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+        os.replace(f"{part_path}.tmp", part_path)
+        manifest["shards"][str(k)] = {
+            "file": part,
+            "rows": len(rows),
+            "errors": sum(1 for r in rows if "error" in r),
+            "seconds": round(time.perf_counter() - started, 2),
+        }
+        _write_json_atomic(os.path.join(checkpoint_dir, MANIFEST), manifest)
+        logger.info("Train shard %d done (%d rows, %.1fs)", k, len(rows), manifest["shards"][str(k)]["seconds"])
+        if progress:
+            progress(done=n_rows, errors=_shard_errors(manifest, shard_ids), phase="transcribe")
+
+    manifest["rows"] = n_rows
+    parts = [os.path.join(checkpoint_dir, manifest["shards"][k]["file"]) for k in shard_ids]
+
+    if progress:
+        progress(phase="features")
+    names = registered_features()
+    # fixed column order so every part lines up under one header
+    columns = ["filename", "true_label", "asr_text"] + names
+    if _shard_errors(manifest, shard_ids):
+        columns.append("error")
+
+    # features come from the store, fed and written to the CSV one part at a time;
+    # only new/changed clips and columns are computed
     out_path = "data/kaggle/train_features.csv"
-    pd.DataFrame(results).to_csv(out_path, index=False)
+    with get_feature_store().open_update() as update, ResultWriter(out_path, columns) as writer:
+        for part in parts:
+            rows = list(_read_part(part))
+            stored = update.append([r["filename"] for r in rows], [r["true_label"] for r in rows],
+                                   [r.get("asr_text") for r in rows], [r.get("error") for r in rows])
+            for i, row in enumerate(rows):
+                if stored["valid"][i]:
+                    row.update({name: stored["values"][name][i].item() for name in names})
+                writer.write(row)
+
+    manifest["completed"] = True
+    _write_json_atomic(os.path.join(checkpoint_dir, MANIFEST), manifest)
     return out_path
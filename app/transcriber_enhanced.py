@@ -3,41 +3,111 @@ Enhanced transcriber with local Whisper fallback and caching.
 Priority: Local Whisper (offline, no quotas) → Groq Whisper (API, limited) → Error
 """
 import os
-import json
+import hashlib
 import logging
-from pathlib import Path
+import threading
 from app.config import (
     GROQ_API_KEY, GROQ_ASR_MODEL, REQUEST_TIMEOUT,
-    USE_LOCAL_WHISPER, LOCAL_WHISPER_MODEL
+    USE_LOCAL_WHISPER, LOCAL_WHISPER_MODEL, LONG_AUDIO_THRESHOLD_S, USE_LEGACY_TRANSCRIPTS
 )
+from app.whisper_registry import get_whisper_registry, whisper_fp16
+from app.transcript_store import get_transcript_store, get_cache_key
+from app.audio_decode import decode_audio_bytes, SAMPLE_RATE
 
 logger = logging.getLogger(__name__)
 
-# Transcript cache directory
-CACHE_DIR = Path("data/transcripts_cache")
-CACHE_DIR.mkdir(parents=True, exist_ok=True)
-
 # ==================== LOCAL WHISPER ====================
-def transcribe_with_local_whisper(audio_path: str) -> str:
-    """Transcribe using local OpenAI Whisper (offline, no API quota limits)."""
-    try:
-        import whisper
-    except ImportError:
-        logger.error("whisper not installed. Run: pip install openai-whisper")
-        raise ImportError("Install openai-whisper: pip install openai-whisper")
-    
+def transcribe_with_local_whisper(audio, model_name: str = None) -> str:
+    """Transcribe using local OpenAI Whisper (offline, no API quota limits).
+
+    `audio` is a file path or a float32 16 kHz mono NumPy buffer. The model comes
+    from the process-wide registry, so weights are loaded once per process.
+    """
+    label = audio if isinstance(audio, str) else f"<{len(audio)} samples>"
     try:
-        # Load model once (cached after first load)
-        model = whisper.load_model(LOCAL_WHISPER_MODEL)
-        result = model.transcribe(audio_path, language="en", verbose=False)
+        with get_whisper_registry().use(model_name) as model:
+            result = model.transcribe(audio, language="en", verbose=False, fp16=whisper_fp16())
         text = result["text"].strip()
-        logger.info(f"Local Whisper transcribed {audio_path}: {len(text)} chars")
+        logger.info(f"Local Whisper transcribed {label}: {len(text)} chars")
         return text
     except Exception as e:
-        logger.error(f"Local Whisper failed for {audio_path}: {e}")
+        logger.error(f"Local Whisper failed for {label}: {e}")
         raise
 
 
+def transcribe_segment_with_words(audio, offset: float = 0.0, model_name: str = None) -> dict:
+    """Transcribe one segment with word-level timestamps shifted by `offset` seconds."""
+    with get_whisper_registry().use(model_name) as model:
+        result = model.transcribe(audio, language="en", verbose=False, fp16=whisper_fp16(),
+                                  word_timestamps=True)
+    words = [
+        {"word": w["word"], "start": round(w["start"] + offset, 3), "end": round(w["end"] + offset, 3)}
+        for seg in result.get("segments", [])
+        for w in seg.get("words", [])
+    ]
+    return {"text": result["text"].strip(), "words": words}
+
+
+def transcribe_long_audio(source, model_name: str = None) -> dict:
+    """Transcribe a long recording (path or 16 kHz buffer) in parallel segments.
+
+    The audio is split at pauses (see app.segmentation), segments are transcribed
+    across the worker pool and stitched back in order.
+    Returns {"text", "words": [{"word", "start", "end"}], "segments"}.
+    """
+    from app.segmentation import segment_audio
+    from app.transcription_pool import get_transcription_pool
+
+    pool = get_transcription_pool(model_name)
+    done = {}
+    for res in pool.map_segments(segment_audio(source)):
+        if res["error"]:
+            raise RuntimeError(f"Segment {res['index']} at {res['offset']:.1f}s failed: {res['error']}")
+        done[res["index"]] = res
+    ordered = [done[i] for i in sorted(done)]
+    return {
+        "text": " ".join(r["text"] for r in ordered if r["text"]),
+        "words": [w for r in ordered for w in r["words"]],
+        "segments": len(ordered),
+    }
+
+
+def _is_long_audio(audio) -> bool:
+    if isinstance(audio, str):
+        from app.segmentation import audio_duration
+        duration = audio_duration(audio)
+        return duration is not None and duration > LONG_AUDIO_THRESHOLD_S
+    return len(audio) > LONG_AUDIO_THRESHOLD_S * SAMPLE_RATE
+
+
+def transcribe_audio_batch(audios, model_name: str = None):
+    """Transcribe several 16 kHz buffers with one batched Whisper decode.
+
+    Each buffer is cut into 30 s windows and every window of every buffer is
+    decoded in a single batch, so unlike model.transcribe() there is no
+    conditioning on the previous window. Returns one transcript per buffer.
+    """
+    import torch
+    import whisper
+
+    with get_whisper_registry().use(model_name) as model:
+        mels, owners = [], []
+        for i, audio in enumerate(audios):
+            for start in range(0, max(len(audio), 1), whisper.audio.N_SAMPLES):
+                window = whisper.pad_or_trim(audio[start:start + whisper.audio.N_SAMPLES])
+                mels.append(whisper.log_mel_spectrogram(window, n_mels=model.dims.n_mels))
+                owners.append(i)
+        options = whisper.DecodingOptions(language="en", without_timestamps=True, fp16=whisper_fp16())
+        decoded = whisper.decode(model, torch.stack(mels).to(model.device), options)
+
+    parts = [[] for _ in audios]
+    for owner, result in zip(owners, decoded):
+        parts[owner].append(result.text.strip())
+    texts = [" ".join(p for p in chunks if p) for chunks in parts]
+    logger.info(f"Local Whisper batch-transcribed {len(audios)} buffer(s) in {len(mels)} window(s)")
+    return texts
+
+
 def transcribe_with_groq_api(audio_bytes: bytes) -> str:
     """Transcribe using Groq API (fallback, limited quota)."""
     import requests
@@ -72,161 +142,357 @@ def transcribe_with_groq_api(audio_bytes: bytes) -> str:
     return text or str(payload)
 
 
-def get_cache_path(audio_path: str) -> Path:
-    """Get cache file path for audio transcript."""
-    filename = Path(audio_path).stem + ".json"
-    return CACHE_DIR / filename
+# ==================== TRANSCRIPT CACHE ====================
+# Entries are content-addressed: the key covers the audio bytes plus the ASR
+# backend, model and language, so renamed/duplicate uploads share an entry and
+# switching LOCAL_WHISPER_MODEL never serves a transcript from another model.
+ASR_LANGUAGE = "en"
+LOCAL_BACKEND = "whisper-local"
+# transcribe_audio_batch decodes windows independently, so its text is kept apart
+LOCAL_BATCH_BACKEND = "whisper-local-batch"
+GROQ_BACKEND = "groq"
+# stem-named entries from the old JSON cache never recorded who transcribed them
+LEGACY_BACKEND = "legacy"
+LEGACY_MODEL = "unknown"
+_HASH_BLOCK = 1 << 20
+
+# realpath -> ((dev, inode, mtime_ns, size), sha256) so unchanged files are not re-read;
+# backed by the store's fingerprints table so the memo survives restarts
+_fingerprints = {}
+_fingerprints_lock = threading.Lock()
+
+
+def hash_audio_bytes(audio_bytes: bytes) -> str:
+    return hashlib.sha256(audio_bytes).hexdigest()
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
 
 
-def load_from_cache(audio_path: str) -> str:
-    """Load transcript from cache if available."""
-    cache_path = get_cache_path(audio_path)
-    if cache_path.exists():
+def hash_audio_files(audio_paths, errors: dict = None) -> dict:
+    """Streaming sha256 of many files, memoised on their (inode, mtime, size) fingerprint.
+
+    Fingerprints not already in memory are resolved with one bulk store query,
+    and only files whose fingerprint changed are read. Returns {audio_path: sha256}.
+    Unreadable paths raise OSError, or are recorded in `errors` and skipped when given.
+    """
+    stats = {}
+    for p in audio_paths:
         try:
-            with open(cache_path, "r") as f:
-                data = json.load(f)
-                logger.info(f"Loaded cached transcript for {audio_path}")
-                return data.get("text", "")
+            real = os.path.realpath(p)
+            st = os.stat(real)
+        except OSError as e:
+            if errors is None:
+                raise
+            errors[p] = str(e)
+            continue
+        stats[p] = (real, (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size))
+
+    with _fingerprints_lock:
+        known = {real: _fingerprints.get(real) for real, _ in stats.values()}
+    missing = [real for real, v in known.items() if v is None]
+    if missing:
+        known.update(get_transcript_store().get_fingerprints(missing))
+
+    digests, fresh = {}, []
+    for p, (real, fingerprint) in stats.items():
+        entry = known.get(real)
+        if entry and tuple(entry[0]) == fingerprint:
+            digests[p] = entry[1]
+        else:
+            try:
+                digests[p] = _file_sha256(real)
+            except OSError as e:
+                if errors is None:
+                    raise
+                errors[p] = str(e)
+                continue
+            fresh.append((real, fingerprint, digests[p]))
+
+    with _fingerprints_lock:
+        for p, sha in digests.items():
+            _fingerprints[stats[p][0]] = (stats[p][1], sha)
+    if fresh:
+        try:
+            get_transcript_store().put_fingerprints(fresh)
         except Exception as e:
-            logger.warning(f"Failed to load cache {cache_path}: {e}")
-    return None
+            logger.warning(f"Failed to save audio fingerprints: {e}")
+    return digests
+
+
+def hash_audio_file(audio_path: str) -> str:
+    return hash_audio_files([audio_path])[audio_path]
 
 
-def save_to_cache(audio_path: str, text: str):
-    """Save transcript to cache."""
-    cache_path = get_cache_path(audio_path)
+def cache_backends(model_name: str = None):
+    """(backend, model) pairs to look up, in the order transcription would try them."""
+    backends = []
+    if USE_LOCAL_WHISPER:
+        backends.append((LOCAL_BACKEND, model_name or LOCAL_WHISPER_MODEL))
+    if GROQ_API_KEY:
+        backends.append((GROQ_BACKEND, GROQ_ASR_MODEL))
+    if USE_LEGACY_TRANSCRIPTS:
+        backends.append((LEGACY_BACKEND, LEGACY_MODEL))  # last resort
+    return backends
+
+
+def load_many_from_cache(audio_sha256s, backends=None) -> dict:
+    """Resolve many transcripts with one store query. Returns {sha256: text} for hits."""
+    backends = backends if backends is not None else cache_backends()
+    keys = {
+        sha: [get_cache_key(sha, backend, model, ASR_LANGUAGE) for backend, model in backends]
+        for sha in set(audio_sha256s)
+    }
+    try:
+        found = get_transcript_store().get_many(k for ks in keys.values() for k in ks)
+    except Exception as e:
+        logger.warning(f"Failed to read transcript cache: {e}")
+        return {}
+    hits = {}
+    for sha, ks in keys.items():
+        # first backend in priority order wins
+        text = next((found[k] for k in ks if found.get(k)), None)
+        if text:
+            hits[sha] = text
+    return hits
+
+
+def load_from_cache(audio_sha256: str, backends=None) -> str:
+    """Load transcript from cache if any of the backends has one for this audio."""
+    text = load_many_from_cache([audio_sha256], backends).get(audio_sha256)
+    if text:
+        logger.info(f"Loaded cached transcript for {audio_sha256[:12]}")
+    return text
+
+
+def save_many_to_cache(entries, backend: str, model: str):
+    """entries: iterable of (audio_sha256, text, audio_path[, words]), written in one transaction."""
+    rows = [{
+        "cache_key": get_cache_key(sha, backend, model, ASR_LANGUAGE),
+        "text": text,
+        "audio": str(audio_path) if audio_path else None,
+        "sha256": sha,
+        "backend": backend,
+        "model": model,
+        "language": ASR_LANGUAGE,
+        "words": words[0] if words else None,
+    } for sha, text, audio_path, *words in entries]
+    if not rows:
+        return
     try:
-        with open(cache_path, "w") as f:
-            json.dump({"text": text, "audio": str(audio_path)}, f, indent=2)
-        logger.info(f"Cached transcript for {audio_path}")
+        get_transcript_store().put_many(rows)
+        logger.info(f"Cached {len(rows)} transcript(s)")
     except Exception as e:
-        logger.warning(f"Failed to save cache {cache_path}: {e}")
+        logger.warning(f"Failed to save transcript cache: {e}")
 
 
-def transcribe_from_path(audio_path: str) -> str:
+def save_to_cache(audio_sha256: str, text: str, backend: str, model: str, audio_path: str = None,
+                  words: list = None):
+    """Save transcript (and word timestamps, when the backend produced them) to cache."""
+    save_many_to_cache([(audio_sha256, text, audio_path, words)], backend, model)
+
+
+def load_words_from_cache(audio_sha256: str, backends=None):
+    """Word timestamps stored with this audio's transcript, or None.
+
+    Only the segmented long-recording path (transcribe_long_audio) records them.
     """
-    Transcribe audio with priority:
-    1. Check cache
-    2. Use local Whisper (if enabled)
-    3. Fall back to Groq API (if available)
+    backends = backends if backends is not None else cache_backends()
+    keys = [get_cache_key(audio_sha256, backend, model, ASR_LANGUAGE) for backend, model in backends]
+    try:
+        found = get_transcript_store().get_words_many(keys)
+    except Exception as e:
+        logger.warning(f"Failed to read transcript cache: {e}")
+        return None
+    return next((found[k] for k in keys if k in found), None)
+
+
+def _transcribe_uncached(audio_sha256: str, audio_path: str = None, audio_bytes: bytes = None) -> str:
+    """Run the ASR backends in priority order and cache the first success.
+
+    Exactly one of audio_path / audio_bytes is given; bytes are decoded in memory.
     """
-    # Try cache first
-    cached = load_from_cache(audio_path)
-    if cached:
-        return cached
-    
-    text = None
-    
+    source = audio_path or "<upload>"
     # Try local Whisper first (no quota limits, offline)
     if USE_LOCAL_WHISPER:
         try:
-            text = transcribe_with_local_whisper(audio_path)
-            save_to_cache(audio_path, text)
+            audio = audio_path if audio_path else decode_audio_bytes(audio_bytes)
+            words = None
+            if _is_long_audio(audio):
+                result = transcribe_long_audio(audio)
+                text, words = result["text"], result["words"]
+            else:
+                text = transcribe_with_local_whisper(audio)
+            save_to_cache(audio_sha256, text, LOCAL_BACKEND, LOCAL_WHISPER_MODEL, audio_path, words=words)
             return text
         except Exception as e:
             logger.warning(f"Local Whisper failed, trying Groq: {e}")
-    
+
     # Fall back to Groq API
     try:
-        with open(audio_path, "rb") as f:
-            audio_bytes = f.read()
+        if audio_bytes is None:
+            with open(audio_path, "rb") as f:
+                audio_bytes = f.read()
         text = transcribe_with_groq_api(audio_bytes)
-        save_to_cache(audio_path, text)
+        save_to_cache(audio_sha256, text, GROQ_BACKEND, GROQ_ASR_MODEL, audio_path)
         return text
     except Exception as e:
-        logger.error(f"All transcription methods failed for {audio_path}: {e}")
+        logger.error(f"All transcription methods failed for {source}: {e}")
         raise
 
 
+def transcribe_from_path(audio_path: str) -> str:
+    """
+    Transcribe audio with priority:
+    1. Check cache
+    2. Use local Whisper (if enabled)
+    3. Fall back to Groq API (if available)
+    """
+    # Try cache first
+    audio_sha256 = hash_audio_file(audio_path)
+    cached = load_from_cache(audio_sha256)
+    if cached:
+        return cached
+
+    return _transcribe_uncached(audio_sha256, audio_path=audio_path)
+
+
 def transcribe_bytes_from_bytes(audio_bytes: bytes) -> str:
     """Transcribe from raw bytes (used by FastAPI endpoints).
 
-    Writes bytes to a temporary WAV file and calls transcribe_from_path so
-    local Whisper can be used when enabled (and caching works).
+    The cache is checked on the uploaded bytes; on a miss they are decoded in
+    memory and the sample buffer is fed straight to Whisper (no temp file).
     """
-    import tempfile
-    import os
-    # On Windows NamedTemporaryFile keeps the file open which can cause
-    # permission errors when another reader/process tries to open it.
-    # Use mkstemp + close the fd, then remove file in finally block.
-    suffix = ".wav"
-    fd, path = tempfile.mkstemp(suffix=suffix)
-    try:
-        # write bytes using the file descriptor then close it
-        with os.fdopen(fd, "wb") as f:
-            f.write(audio_bytes)
-            f.flush()
-        return transcribe_from_path(path)
-    finally:
+    audio_sha256 = hash_audio_bytes(audio_bytes)
+    cached = load_from_cache(audio_sha256)
+    if cached:
+        return cached
+
+    return _transcribe_uncached(audio_sha256, audio_bytes=audio_bytes)
+
+
+# --------------------------
+# Micro-batched uploads
+# --------------------------
+def prepare_upload_for_batch(audio_bytes: bytes) -> tuple:
+    """Cache probe and in-memory decode for an upload headed to the ASR micro-batcher.
+
+    Returns (sha256, transcript, None) when no batch is needed (cache hit, long
+    clip, no local Whisper, undecodable bytes; the transcript then comes from
+    the regular chain) and (sha256, None, buffer) otherwise.
+    """
+    audio_sha256 = hash_audio_bytes(audio_bytes)
+    cached = load_from_cache(audio_sha256, cache_backends() + [(LOCAL_BATCH_BACKEND, LOCAL_WHISPER_MODEL)])
+    if cached:
+        return audio_sha256, cached, None
+    if USE_LOCAL_WHISPER:
         try:
-            if os.path.exists(path):
-                os.remove(path)
+            audio = decode_audio_bytes(audio_bytes)
+            if not _is_long_audio(audio):
+                return audio_sha256, None, audio
         except Exception as e:
-            logger.warning(f"Failed to remove temp file {path}: {e}")
+            logger.warning(f"Could not decode upload for batching: {e}")
+    return audio_sha256, _transcribe_uncached(audio_sha256, audio_bytes=audio_bytes), None
+
+
+def save_batched_transcript(audio_sha256: str, text: str):
+    """Cache a transcribe_audio_batch result under its own backend tag."""
+    save_to_cache(audio_sha256, text, LOCAL_BATCH_BACKEND, LOCAL_WHISPER_MODEL)
+
+
+def transcribe_upload_unbatched(audio_sha256: str, audio_bytes: bytes) -> str:
+    """Regular fallback chain for an upload whose micro-batch failed."""
+    return _transcribe_uncached(audio_sha256, audio_bytes=audio_bytes)
 
 
 # --------------------------
 # Parallel batch transcription
 # --------------------------
-def _transcribe_file_worker(args):
-    """Worker function for ProcessPoolExecutor: loads model and transcribes a single file.
-    args: tuple(audio_path, model_name)
+def transcribe_uncached_path(audio_path: str, audio_sha256: str, model_name: str = None) -> str:
+    """Transcribe one file that already missed the cache and cache the result.
+
+    With local Whisper the file goes to the shared worker pool, so several
+    callers on different threads keep all pool workers busy. If the pool fails
+    on it, the file takes the same fallback chain as transcribe_from_path.
     """
-    audio_path, model_name = args
+    from app.transcription_pool import get_transcription_pool
+
+    if not USE_LOCAL_WHISPER:
+        return _transcribe_uncached(audio_sha256, audio_path=audio_path)
+    model_name = model_name or LOCAL_WHISPER_MODEL
     try:
-        import whisper
-        model = whisper.load_model(model_name)
-        res = model.transcribe(audio_path, language='en', verbose=False)
-        text = res.get('text', '').strip()
-        return (audio_path, text, None)
+        for _, text, err in get_transcription_pool(model_name).imap_unordered([audio_path], chunk_size=1):
+            if err:
+                raise RuntimeError(err)
+            save_to_cache(audio_sha256, text, LOCAL_BACKEND, model_name, audio_path)
+            return text
+        raise RuntimeError(f"no transcription result for {audio_path}")
     except Exception as e:
-        return (audio_path, None, str(e))
+        logger.warning(f"Whisper pool failed on {audio_path}, falling back: {e}")
+    return _transcribe_uncached(audio_sha256, audio_path=audio_path)
 
 
-def transcribe_batch(audio_paths, max_workers=2, model_name=None):
-    """Transcribe a list of audio file paths in parallel using multiple processes.
+def transcribe_batch(audio_paths, max_workers=None, model_name=None, return_errors=False, progress=None):
+    """Transcribe a list of audio file paths in parallel using the persistent worker pool.
 
     - Checks cache first and only transcribes missing entries.
-    - Uses ProcessPoolExecutor to avoid GIL limitations.
-    - Returns dict: {audio_path: transcript}
+    - Reuses the shared TranscriptionPool, so worker processes (and their loaded
+      models) survive across calls. max_workers only applies when the pool is first created.
+    - Returns dict: {audio_path: transcript}, or (results, errors) when return_errors is set.
+    - progress(n) gets the number of paths resolved so far (cache hits at once, then
+      one per transcribed file); an exception it raises (e.g. job cancellation) stops the batch.
     """
-    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from app.transcription_pool import get_transcription_pool
 
     if model_name is None:
         model_name = LOCAL_WHISPER_MODEL
 
     # Prepare results dict, load cached where available
     results = {}
+    errors = {}
+    # one stat pass + one fingerprint query, then one bulk transcript query
+    digests = hash_audio_files(audio_paths, errors)
+    hits = load_many_from_cache(digests.values(), cache_backends(model_name))
     to_process = []
-    for p in audio_paths:
-        cached = load_from_cache(p)
-        if cached:
-            results[p] = cached
+    for p, sha in digests.items():
+        if sha in hits:
+            results[p] = hits[sha]
         else:
             to_process.append(p)
-
+    if progress:
+        progress(len(results) + len(errors))
     if not to_process:
         logger.info("All %d transcripts loaded from cache", len(audio_paths))
-        return results
-
-    logger.info("Transcribing %d files in parallel (workers=%d)", len(to_process), max_workers)
+        return (results, errors) if return_errors else results
 
-    # Prepare worker args
-    worker_args = [(p, model_name) for p in to_process]
-
-    with ProcessPoolExecutor(max_workers=max_workers) as exe:
-        future_to_path = {exe.submit(_transcribe_file_worker, arg): arg[0] for arg in worker_args}
-        for fut in as_completed(future_to_path):
-            path = future_to_path[fut]
+    if not USE_LOCAL_WHISPER:
+        # No local model to parallelise over; go through the API fallback one by one
+        for p in to_process:
             try:
-                p, text, err = fut.result()
-                if err:
-                    logger.error("Transcription failed for %s: %s", p, err)
-                else:
-                    results[p] = text
-                    save_to_cache(p, text)
-                    logger.info("Transcribed and cached %s", p)
+                results[p] = transcribe_from_path(p)
             except Exception as e:
-                logger.exception("Worker failed for %s: %s", path, e)
+                errors[p] = str(e)
+            if progress:
+                progress(len(results) + len(errors))
+        return (results, errors) if return_errors else results
+
+    pool = get_transcription_pool(model_name, workers=max_workers)
+    logger.info("Transcribing %d files in parallel (workers=%d)", len(to_process), pool.workers)
+
+    for p, text, err in pool.imap_unordered(to_process):
+        if err:
+            errors[p] = err
+            logger.error("Transcription failed for %s: %s", p, err)
+        else:
+            results[p] = text
+            save_to_cache(digests[p], text, LOCAL_BACKEND, model_name, p)
+            logger.info("Transcribed and cached %s", p)
+        if progress:
+            progress(len(results) + len(errors))
 
-    return results
+    return (results, errors) if return_errors else results
@@ -0,0 +1,216 @@
+"""
+Single-file SQLite store for transcripts and audio fingerprints.
+Replaces one JSON file per clip: lookups are indexed, writes are transactional,
+and bulk get_many/put_many resolve a whole batch in one query.
+WAL mode plus a busy timeout lets several threads and worker processes write safely.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from app.config import TRANSCRIPT_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+# Per-clip JSON cache used before the store existed (imported once by get_transcript_store)
+LEGACY_CACHE_DIR = Path("data/transcripts_cache")
+
+# SQLite's default limit on bound parameters is 999 on older builds
+_MAX_VARS = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    cache_key  TEXT PRIMARY KEY,
+    text       TEXT NOT NULL,
+    audio      TEXT,
+    sha256     TEXT,
+    backend    TEXT,
+    model      TEXT,
+    language   TEXT,
+    created_at REAL,
+    words      TEXT
+);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    path     TEXT PRIMARY KEY,
+    dev      INTEGER,
+    ino      INTEGER,
+    mtime_ns INTEGER,
+    size     INTEGER,
+    sha256   TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def get_cache_key(audio_sha256: str, backend: str, model: str, language: str) -> str:
+    """Content-addressed transcript key: audio hash + ASR backend/model/language."""
+    return hashlib.sha256(f"{audio_sha256}|{backend}|{model}|{language}".encode()).hexdigest()
+
+
+class TranscriptStore:
+    """Transcript and fingerprint tables in one SQLite file."""
+
+    def __init__(self, path: str = TRANSCRIPT_DB_PATH):
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            # stores created before word timestamps were kept
+            if "words" not in {row[1] for row in conn.execute("PRAGMA table_info(transcripts)")}:
+                conn.execute("ALTER TABLE transcripts ADD COLUMN words TEXT")
+
+    def _connect(self) -> sqlite3.Connection:
+        # one connection per thread and per process (forked workers must not share one)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _select_in(self, sql: str, keys):
+        conn = self._connect()
+        keys = list(keys)
+        for i in range(0, len(keys), _MAX_VARS):
+            chunk = keys[i:i + _MAX_VARS]
+            yield from conn.execute(sql.format(",".join("?" * len(chunk))), chunk)
+
+    def _write_many(self, sql: str, rows):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(sql, rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # ---- transcripts ----
+    def get(self, cache_key: str):
+        return self.get_many([cache_key]).get(cache_key)
+
+    def get_many(self, cache_keys) -> dict:
+        """Return {cache_key: text} for every key present."""
+        return dict(self._select_in(
+            "SELECT cache_key, text FROM transcripts WHERE cache_key IN ({})", cache_keys
+        ))
+
+    def get_words_many(self, cache_keys) -> dict:
+        """Return {cache_key: [{"word", "start", "end"}, ...]} for keys stored with word timestamps."""
+        return {
+            key: json.loads(words)
+            for key, words in self._select_in(
+                "SELECT cache_key, words FROM transcripts WHERE words IS NOT NULL AND cache_key IN ({})", cache_keys
+            )
+        }
+
+    def put_many(self, rows):
+        """rows: iterable of dicts with cache_key, text, audio, sha256, backend, model, language
+        and optionally words (list of word timestamps)."""
+        now = time.time()
+        self._write_many(
+            "INSERT OR REPLACE INTO transcripts "
+            "(cache_key, text, audio, sha256, backend, model, language, created_at, words) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(r["cache_key"], r["text"], r.get("audio"), r.get("sha256"), r.get("backend"),
+              r.get("model"), r.get("language"), now,
+              json.dumps(r["words"]) if r.get("words") is not None else None) for r in rows],
+        )
+
+    # ---- fingerprints ----
+    def get_fingerprints(self, paths) -> dict:
+        """Return {path: ((dev, ino, mtime_ns, size), sha256)}."""
+        return {
+            path: ((dev, ino, mtime_ns, size), sha256)
+            for path, dev, ino, mtime_ns, size, sha256 in self._select_in(
+                "SELECT path, dev, ino, mtime_ns, size, sha256 FROM fingerprints WHERE path IN ({})", paths
+            )
+        }
+
+    def put_fingerprints(self, items):
+        """items: iterable of (path, (dev, ino, mtime_ns, size), sha256)."""
+        self._write_many(
+            "INSERT OR REPLACE INTO fingerprints (path, dev, ino, mtime_ns, size, sha256) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(path, *fp, sha256) for path, fp, sha256 in items],
+        )
+
+    # ---- meta ----
+    def get_meta(self, key: str):
+        row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        self._write_many("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [(key, value)])
+
+    def migrate_json_dir(self, cache_dir) -> dict:
+        """One-shot import of the per-clip JSON cache directory.
+
+        Content-addressed entries record their sha256/backend/model and import as
+        is. Older stem-named entries ({text, audio}) are keyed by hashing the clip
+        they name; they never recorded their backend or model, so they are filed
+        under the legacy backend, which lookups only use when USE_LEGACY_TRANSCRIPTS
+        is set. Entries whose clip is gone are skipped.
+        """
+        from app.transcriber_enhanced import LEGACY_BACKEND, LEGACY_MODEL, ASR_LANGUAGE, _file_sha256
+
+        rows, fingerprints, skipped = [], [], 0
+        for p in Path(cache_dir).glob("*.json"):
+            try:
+                with open(p, "r") as f:
+                    data = json.load(f)
+                if "sha256" in data:
+                    sha256, backend, model, language = data["sha256"], data["backend"], data["model"], data["language"]
+                else:
+                    real = os.path.realpath(data["audio"])
+                    st = os.stat(real)
+                    sha256 = _file_sha256(real)
+                    backend, model, language = LEGACY_BACKEND, LEGACY_MODEL, ASR_LANGUAGE
+                    fingerprints.append((real, (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size), sha256))
+                if not data["text"]:
+                    raise ValueError("empty transcript")
+                rows.append({
+                    "cache_key": get_cache_key(sha256, backend, model, language),
+                    "text": data["text"],
+                    "audio": data.get("audio"),
+                    "sha256": sha256,
+                    "backend": backend,
+                    "model": model,
+                    "language": language,
+                })
+            except (KeyError, TypeError, ValueError, OSError):
+                skipped += 1
+        if rows:
+            self.put_many(rows)
+        if fingerprints:
+            self.put_fingerprints(fingerprints)
+        self.set_meta("json_migrated_from", str(cache_dir))
+        logger.info("Migrated %d transcript(s) from %s (%d skipped)", len(rows), cache_dir, skipped)
+        return {"migrated": len(rows), "skipped": skipped}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_transcript_store() -> TranscriptStore:
+    """Return the shared store, importing the legacy JSON cache the first time."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            store = TranscriptStore()
+            if store.get_meta("json_migrated_from") is None and LEGACY_CACHE_DIR.is_dir():
+                store.migrate_json_dir(LEGACY_CACHE_DIR)
+            _store = store
+        return _store
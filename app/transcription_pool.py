@@ -0,0 +1,203 @@
+"""
+Long-lived process pool for local Whisper transcription.
+Each worker loads the model once in its initializer and then streams many files,
+so a batch job pays the model load per worker instead of per file. If a worker
+process dies the pool is broken for good, so it is replaced and the files it
+held are reported as per-file errors.
+"""
+import os
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from app.config import LOCAL_WHISPER_MODEL, ASR_WORKERS, ASR_TORCH_THREADS, ASR_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+# model name the current worker process was initialised with
+_worker_model_name = None
+
+
+def _default_torch_threads(workers: int) -> int:
+    """Split the machine's cores across workers so N x M threads don't oversubscribe."""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def _init_worker(model_name, torch_threads):
+    """Process initializer: pin torch thread count and warm the Whisper model."""
+    global _worker_model_name
+    _worker_model_name = model_name
+    os.environ["OMP_NUM_THREADS"] = str(torch_threads)
+    os.environ["MKL_NUM_THREADS"] = str(torch_threads)
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+    try:
+        from app.whisper_registry import get_whisper_registry
+        get_whisper_registry().warmup([model_name])
+    except Exception as e:
+        # a failed warmup is reported per file by the chunk worker instead
+        logger.error("Worker %d failed to load Whisper model %s: %s", os.getpid(), model_name, e)
+
+
+def _transcribe_chunk(audio_paths):
+    """Transcribe a chunk of files in a worker. Returns [(audio_path, text, error)]."""
+    from app.transcriber_enhanced import transcribe_with_local_whisper
+    out = []
+    for audio_path in audio_paths:
+        try:
+            out.append((audio_path, transcribe_with_local_whisper(audio_path, _worker_model_name), None))
+        except Exception as e:
+            out.append((audio_path, None, str(e)))
+    return out
+
+
+def _transcribe_segment(index, offset, audio):
+    """Transcribe one segment of a long recording with word timestamps shifted by offset."""
+    from app.transcriber_enhanced import transcribe_segment_with_words
+    try:
+        res = transcribe_segment_with_words(audio, offset, _worker_model_name)
+        return {"index": index, "offset": offset, "error": None, **res}
+    except Exception as e:
+        return {"index": index, "offset": offset, "error": str(e), "text": "", "words": []}
+
+
+class TranscriptionPool:
+    """Persistent Whisper worker pool yielding results in completion order."""
+
+    def __init__(self, workers: int = ASR_WORKERS, torch_threads: int = ASR_TORCH_THREADS,
+                 model_name: str = None, chunk_size: int = ASR_CHUNK_SIZE):
+        self.workers = max(1, workers)
+        self.torch_threads = torch_threads or _default_torch_threads(self.workers)
+        self.model_name = model_name or LOCAL_WHISPER_MODEL
+        self.chunk_size = max(1, chunk_size)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                logger.info(
+                    "Starting transcription pool (workers=%d, torch_threads=%d, model=%s)",
+                    self.workers, self.torch_threads, self.model_name,
+                )
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_init_worker,
+                    initargs=(self.model_name, self.torch_threads),
+                )
+            return self._executor
+
+    def _discard(self, exe: ProcessPoolExecutor):
+        """Drop a broken executor so the next submit starts fresh workers."""
+        with self._lock:
+            if self._executor is not exe:
+                return  # already replaced
+            self._executor = None
+        logger.warning("Transcription pool broken (a worker died); restarting it")
+        exe.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, fn, *args) -> tuple:
+        """(future, executor) for fn(*args), replacing the executor once if it is broken."""
+        exe = self._get_executor()
+        try:
+            return exe.submit(fn, *args), exe
+        except BrokenProcessPool:
+            self._discard(exe)
+            exe = self._get_executor()
+            return exe.submit(fn, *args), exe
+
+    def imap_unordered(self, audio_paths, chunk_size: int = None):
+        """Yield (audio_path, text, error) for every path, as chunks complete."""
+        audio_paths = list(audio_paths)
+        if not audio_paths:
+            return
+        chunk_size = chunk_size or self.chunk_size
+        futures = {}
+        for i in range(0, len(audio_paths), chunk_size):
+            chunk = audio_paths[i:i + chunk_size]
+            try:
+                fut, exe = self._submit(_transcribe_chunk, chunk)
+            except BrokenProcessPool as e:
+                for p in chunk:
+                    yield (p, None, str(e))
+                continue
+            futures[fut] = (chunk, exe)
+        try:
+            for fut in as_completed(futures):
+                chunk, exe = futures[fut]
+                try:
+                    yield from fut.result()
+                except Exception as e:
+                    # the worker process died (e.g. OOM); report every file in the chunk
+                    logger.exception("Transcription worker failed: %s", e)
+                    if isinstance(e, BrokenProcessPool):
+                        self._discard(exe)
+                    for p in chunk:
+                        yield (p, None, str(e) or type(e).__name__)
+        finally:
+            # caller stopped early (e.g. job cancelled): drop chunks that have not started
+            for fut in futures:
+                fut.cancel()
+
+    def map_segments(self, segments, max_in_flight: int = None):
+        """Transcribe (index, offset_s, samples) segments; yields result dicts in completion order.
+
+        Segments are pulled lazily and at most max_in_flight (default 2 per worker)
+        are submitted at once, so a long stream never sits in memory as a whole.
+        """
+        max_in_flight = max_in_flight or 2 * self.workers
+        submitted = {}
+        for index, offset, audio in segments:
+            if len(submitted) >= max_in_flight:
+                done, _ = wait(submitted, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield self._segment_result(fut, *submitted.pop(fut))
+            try:
+                fut, exe = self._submit(_transcribe_segment, index, offset, audio)
+            except BrokenProcessPool as e:
+                yield {"index": index, "offset": offset, "error": str(e), "text": "", "words": []}
+                continue
+            submitted[fut] = (index, offset, exe)
+        for fut in as_completed(submitted):
+            yield self._segment_result(fut, *submitted[fut])
+
+    def _segment_result(self, fut, index, offset, exe) -> dict:
+        try:
+            return fut.result()
+        except BrokenProcessPool as e:
+            logger.exception("Transcription worker failed: %s", e)
+            self._discard(exe)
+            return {"index": index, "offset": offset, "error": str(e) or type(e).__name__, "text": "", "words": []}
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=True)
+                self._executor = None
+                logger.info("Transcription pool shut down")
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_transcription_pool(model_name: str = None, workers: int = None) -> TranscriptionPool:
+    """Return the shared pool for a model, creating it on first use."""
+    model_name = model_name or LOCAL_WHISPER_MODEL
+    with _pools_lock:
+        pool = _pools.get(model_name)
+        if pool is None:
+            pool = TranscriptionPool(workers=workers or ASR_WORKERS, model_name=model_name)
+            _pools[model_name] = pool
+        return pool
+
+
+def shutdown_transcription_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown()
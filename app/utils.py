@@ -1,11 +1,42 @@
+import os
 import csv
+from app.result_writer import ResultWriter
 
-def save_results_csv(results, out_path):
+
+def result_columns(results) -> list:
+    """Union of the rows' keys, in first-seen order."""
+    columns = {}
+    for r in results:
+        columns.update(dict.fromkeys(r))
+    return list(columns)
+
+
+def save_results_csv(results, out_path, columns=None):
     if not results:
         return
-    keys = list(results[0].keys())
-    with open(out_path, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=keys)
-        writer.writeheader()
-        for r in results:
-            writer.writerow(r)
\ No newline at end of file
+    # every row's keys count, so error rows with other fields keep their columns
+    with ResultWriter(out_path, columns or result_columns(results), fmt="csv") as writer:
+        writer.write_many(results)
+
+
+def merge_results_csv(base_path, new_path, key="audio"):
+    """Fold the rows of new_path into base_path, replacing base rows with the same key.
+
+    Both files are streamed; only the new rows' keys are held in memory. new_path
+    is removed afterwards.
+    """
+    if not os.path.exists(base_path):
+        os.replace(new_path, base_path)
+        return
+    with open(new_path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        new_columns = reader.fieldnames or []
+        new_keys = {row[key] for row in reader}
+    with open(base_path, newline="", encoding="utf-8") as base, open(new_path, newline="", encoding="utf-8") as new:
+        base_reader = csv.DictReader(base)
+        columns = list(dict.fromkeys((base_reader.fieldnames or []) + new_columns))
+        # the writer publishes over base_path only on close, after both readers are done
+        with ResultWriter(base_path, columns, fmt="csv") as writer:
+            writer.write_many(row for row in base_reader if row.get(key) not in new_keys)
+            writer.write_many(csv.DictReader(new))
+    os.remove(new_path)
@@ -0,0 +1,171 @@
+"""
+Process-wide registry of loaded Whisper models.
+Models are keyed by (model name, device, dtype) and kept resident with an LRU limit,
+so every ASR call site in a process shares the same weights instead of reloading them.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from app.config import (
+    LOCAL_WHISPER_MODEL, WHISPER_DEVICE, WHISPER_DTYPE, WHISPER_MAX_RESIDENT_MODELS
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _resolve_device(device: str = None) -> str:
+    """Pick the torch device: explicit setting, else CUDA when available, else CPU."""
+    if device:
+        return device
+    try:
+        import torch
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    except ImportError:
+        return "cpu"
+
+
+_warned_cpu_fp16 = False
+
+
+def _resolve_dtype(dtype: str, device: str) -> str:
+    """The configured dtype, except float16 on CPU (unsupported there), which falls back to float32."""
+    global _warned_cpu_fp16
+    if dtype == "float16" and device == "cpu":
+        if not _warned_cpu_fp16:
+            logger.warning("WHISPER_DTYPE=float16 is GPU only; using float32 on cpu")
+            _warned_cpu_fp16 = True
+        return "float32"
+    return dtype
+
+
+class _Entry:
+    def __init__(self, model):
+        self.model = model
+        # Whisper installs kv-cache hooks on the model during decoding, so two
+        # concurrent transcribe() calls on the same instance must not interleave.
+        self.lock = threading.Lock()
+
+
+class WhisperModelRegistry:
+    """Thread-safe LRU cache of Whisper models keyed by (name, device, dtype)."""
+
+    def __init__(self, max_resident: int = WHISPER_MAX_RESIDENT_MODELS):
+        self.max_resident = max(1, max_resident)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # one lock per key so two threads asking for the same model load it only once
+        self._load_locks = {}
+
+    def _key(self, name=None, device=None, dtype=None):
+        device = _resolve_device(device or WHISPER_DEVICE)
+        return (
+            name or LOCAL_WHISPER_MODEL,
+            device,
+            _resolve_dtype(dtype or WHISPER_DTYPE, device),
+        )
+
+    def _load(self, key):
+        try:
+            import whisper
+        except ImportError:
+            logger.error("whisper not installed. Run: pip install openai-whisper")
+            raise ImportError("Install openai-whisper: pip install openai-whisper")
+
+        name, device, dtype = key
+        model = whisper.load_model(name, device=device)
+        if dtype == "float16":
+            model = model.half()
+        logger.info("Loaded Whisper model %s on %s (%s)", name, device, dtype)
+        return _Entry(model)
+
+    def _get_entry(self, name=None, device=None, dtype=None) -> _Entry:
+        key = self._key(name, device, dtype)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            # another thread may have finished loading while we waited
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    return entry
+
+            entry = self._load(key)
+
+            with self._lock:
+                self._entries[key] = entry
+                while len(self._entries) > self.max_resident:
+                    evicted, _ = self._entries.popitem(last=False)
+                    logger.info("Evicted Whisper model %s from registry (LRU)", evicted)
+                self._load_locks.pop(key, None)
+            return entry
+
+    def get(self, name=None, device=None, dtype=None):
+        """Return the resident model, loading it on first use."""
+        return self._get_entry(name, device, dtype).model
+
+    @contextmanager
+    def use(self, name=None, device=None, dtype=None):
+        """Borrow a model for exclusive inference; eviction does not affect a borrowed model."""
+        entry = self._get_entry(name, device, dtype)
+        with entry.lock:
+            yield entry.model
+
+    def warmup(self, names=None, device=None, dtype=None):
+        """Eagerly load the given model names (default: LOCAL_WHISPER_MODEL)."""
+        for name in names or [LOCAL_WHISPER_MODEL]:
+            self.get(name, device, dtype)
+
+    def unload(self, name=None, device=None, dtype=None) -> bool:
+        """Drop one model from the registry. Returns True if it was resident."""
+        key = self._key(name, device, dtype)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._release_memory(key[1])
+        logger.info("Unloaded Whisper model %s", key)
+        return True
+
+    def unload_all(self):
+        with self._lock:
+            keys = list(self._entries.keys())
+            self._entries.clear()
+        for key in keys:
+            self._release_memory(key[1])
+        if keys:
+            logger.info("Unloaded %d Whisper model(s)", len(keys))
+
+    def loaded(self):
+        """List resident model keys, least recently used first."""
+        with self._lock:
+            return list(self._entries.keys())
+
+    @staticmethod
+    def _release_memory(device: str):
+        import gc
+        gc.collect()
+        if device.startswith("cuda"):
+            try:
+                import torch
+                torch.cuda.empty_cache()
+            except ImportError:
+                pass
+
+
+_registry = WhisperModelRegistry()
+
+
+def get_whisper_registry() -> WhisperModelRegistry:
+    return _registry
+
+
+def whisper_fp16() -> bool:
+    """fp16 decoding flag matching the dtype the registry loads for the configured device."""
+    return _resolve_dtype(WHISPER_DTYPE, _resolve_device(WHISPER_DEVICE)) == "float16"
@@ -0,0 +1,73 @@
+import io
+import os
+import struct
+import subprocess
+import wave
+
+import numpy as np
+import pytest
+
+from app import audio_decode
+from app.audio_decode import decode_audio_bytes
+
+# ftyp box, then mdat, with the moov index last as phone recorders write it
+MP4_MOOV_LAST = (struct.pack(">I", 24) + b"ftypM4A " + b"\x00\x00\x02\x00" + b"M4A isom"
+                 + struct.pack(">I", 16) + b"mdat" + b"\x00" * 8
+                 + struct.pack(">I", 8) + b"moov")
+
+
+@pytest.fixture
+def ffmpeg_calls(monkeypatch):
+    """Record each ffmpeg invocation and what its input was; return 10 ms of silence."""
+    calls = []
+
+    def fake_run(cmd, input=None, **kwargs):
+        src = cmd[cmd.index("-i") + 1]
+        seen = input if src == "pipe:0" else open(src, "rb").read()
+        calls.append({"src": src, "input": input, "seen": seen})
+        return subprocess.CompletedProcess(cmd, 0, stdout=b"\x00\x00" * 160, stderr=b"")
+
+    monkeypatch.setattr(audio_decode.subprocess, "run", fake_run)
+    return calls
+
+
+def test_mp4_goes_through_a_temp_file(ffmpeg_calls):
+    samples = decode_audio_bytes(MP4_MOOV_LAST)
+    assert samples.dtype == np.float32 and len(samples) == 160
+    (call,) = ffmpeg_calls
+    assert call["src"] != "pipe:0" and call["input"] is None
+    assert call["seen"] == MP4_MOOV_LAST
+    assert not os.path.exists(call["src"])
+
+
+def test_other_compressed_audio_is_piped(ffmpeg_calls):
+    payload = b"ID3\x04" + b"\x00" * 64
+    decode_audio_bytes(payload)
+    (call,) = ffmpeg_calls
+    assert call["src"] == "pipe:0" and call["input"] == payload
+
+
+def test_temp_file_removed_when_ffmpeg_fails(monkeypatch):
+    paths = []
+
+    def failing_run(cmd, input=None, **kwargs):
+        paths.append(cmd[cmd.index("-i") + 1])
+        raise subprocess.CalledProcessError(1, cmd, stderr=b"moov atom not found")
+
+    monkeypatch.setattr(audio_decode.subprocess, "run", failing_run)
+    with pytest.raises(audio_decode.AudioDecodeError):
+        decode_audio_bytes(MP4_MOOV_LAST)
+    assert paths and not os.path.exists(paths[0])
+
+
+def test_wav_decoded_in_memory(ffmpeg_calls):
+    pcm = (np.sin(np.arange(1600) / 10) * 12000).astype("<i2")
+    bio = io.BytesIO()
+    with wave.open(bio, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(16000)
+        w.writeframes(pcm.tobytes())
+    samples = decode_audio_bytes(bio.getvalue())
+    assert not ffmpeg_calls
+    assert np.array_equal(samples, pcm.astype(np.float32) / 32768.0)
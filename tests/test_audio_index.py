@@ -0,0 +1,83 @@
+import os
+import time
+
+import pytest
+
+from app.audio_index import AudioDirIndex
+
+HOUR_NS = 3600 * 10**9
+
+
+@pytest.fixture
+def audio_dir(tmp_path):
+    d = tmp_path / "audio"
+    d.mkdir()
+    for name in ("a.wav", "b.wav"):
+        (d / name).write_bytes(b"x" * 10)
+    return d
+
+
+def _set_dir_mtime(d, mtime_ns):
+    os.utime(d, ns=(mtime_ns, mtime_ns))
+
+
+def _index(audio_dir, tmp_path, **kwargs):
+    kwargs.setdefault("check_interval", 0)
+    return AudioDirIndex(str(audio_dir), state_dir=str(tmp_path / "state"), **kwargs)
+
+
+def _names(paths):
+    return sorted(os.path.basename(p) for p in paths)
+
+
+def test_in_place_rewrite_found_after_restart(audio_dir, tmp_path):
+    old = time.time_ns() - HOUR_NS
+    _set_dir_mtime(audio_dir, old)
+    index = _index(audio_dir, tmp_path)
+    paths, generation = index.new_since("job")
+    index.mark_processed("job", generation)
+
+    (audio_dir / "a.wav").write_bytes(b"y" * 20)  # same name, directory mtime unchanged
+    _set_dir_mtime(audio_dir, old)
+    assert _names(_index(audio_dir, tmp_path).new_since("job")[0]) == ["a.wav"]
+
+
+def test_periodic_full_rescan(audio_dir, tmp_path):
+    old = time.time_ns() - HOUR_NS
+    _set_dir_mtime(audio_dir, old)
+    index = _index(audio_dir, tmp_path, full_rescan_every=3)
+    index.mark_processed("job", index.new_since("job")[1])
+
+    (audio_dir / "b.wav").write_bytes(b"y" * 20)
+    _set_dir_mtime(audio_dir, old)
+    assert index.new_since("job")[0] == []
+    assert index.new_since("job")[0] == []
+    assert _names(index.new_since("job")[0]) == ["b.wav"]
+
+
+def test_add_in_same_mtime_tick_is_found(audio_dir, tmp_path):
+    index = _index(audio_dir, tmp_path, full_rescan_every=0)
+    tick = os.stat(audio_dir).st_mtime_ns  # just now, so not trusted
+    index.mark_processed("job", index.new_since("job")[1])
+
+    (audio_dir / "c.wav").write_bytes(b"x")
+    _set_dir_mtime(audio_dir, tick)  # coarse clock: the add did not move the mtime
+    assert _names(index.new_since("job")[0]) == ["c.wav"]
+
+
+def test_saves_from_two_processes_merge(audio_dir, tmp_path):
+    first = _index(audio_dir, tmp_path)
+    second = _index(audio_dir, tmp_path)
+    first.refresh(force=True)
+    second.refresh(force=True)
+
+    first.mark_processed("score", first.new_since("score")[1])
+    (audio_dir / "c.wav").write_bytes(b"x")
+    first.refresh(full=True)
+    # second still holds the older listing; its save must not roll first's back
+    second.mark_processed("submit", second.new_since("submit")[1], failed=["b.wav"])
+
+    reloaded = _index(audio_dir, tmp_path)
+    assert set(reloaded.checkpoints) == {"score", "submit"}
+    assert "c.wav" in reloaded.files
+    assert reloaded.checkpoints["submit"]["retry"] == ["b.wav"]
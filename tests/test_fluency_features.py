@@ -0,0 +1,34 @@
+import random
+
+import numpy as np
+import pandas as pd
+
+from app.fluency_features import FLUENCY_FEATURES, extract_fluency_features_batch
+from app.train_evaluate import extract_fluency_features
+
+TOKENS = ["I", "i", "think", "think", "uh", "Uh", "UM", "erm", "hmm", "hmm.", "well,", "yes!", "no?",
+          "Mr.", "e.g.", "...", "?!", "café", "naïve", "don't", "—", "a"]
+
+
+def _transcript(rng):
+    words = [rng.choice(TOKENS) for _ in range(rng.randint(0, 25))]
+    return "".join(w + rng.choice([" ", "  ", "\n", "\t"]) for w in words)
+
+
+def test_batch_matches_row_extractor():
+    rng = random.Random(0)
+    texts = [_transcript(rng) for _ in range(500)] + ["", "   ", "uh uh uh", "word"]
+    got = extract_fluency_features_batch(texts, FLUENCY_FEATURES)
+    expected = pd.DataFrame([extract_fluency_features(t) for t in texts])[FLUENCY_FEATURES]
+    assert list(got.columns) == FLUENCY_FEATURES
+    for col in FLUENCY_FEATURES:
+        # exact equality, not approx: the batch path must reproduce the row extractor
+        assert got[col].tolist() == expected[col].tolist(), col
+
+
+def test_accepts_series_and_marks_non_strings_nan():
+    texts = pd.Series(["uh the the cat.", None, "ok"])
+    got = extract_fluency_features_batch(texts, FLUENCY_FEATURES)
+    assert got.loc[[0, 2]].to_dict("records") == [
+        extract_fluency_features("uh the the cat."), extract_fluency_features("ok")]
+    assert np.isnan(got.loc[1].to_numpy(dtype=float)).all()
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
+from app import forest_artifact
+from app.fluency_features import FLUENCY_FEATURES
+from app.forest_artifact import CompiledForest, export_forest
+
+
+def _data(rng, n, nan_frac=0.0):
+    X = np.column_stack([
+        rng.integers(0, 200, n),             # len_words
+        rng.normal(4.5, 1.2, n),             # avg_word_len, with ties after float32 rounding
+        rng.integers(0, 10, n),
+        rng.integers(0, 6, n),
+        rng.integers(0, 30, n),
+    ]).astype(np.float64)
+    if nan_frac:
+        X[rng.random(X.shape) < nan_frac] = np.nan
+    return X
+
+
+@pytest.fixture(scope="module", params=[False, True], ids=["dense", "missing"])
+def fitted(request, tmp_path_factory):
+    rng = np.random.default_rng(42)
+    nan_frac = 0.05 if request.param else 0.0
+    X = _data(rng, 600, nan_frac)
+    y = np.nan_to_num(X[:, 0]) * 0.01 + np.nan_to_num(X[:, 1]) + rng.normal(0, 0.3, len(X))
+    model = RandomForestRegressor(n_estimators=40, max_depth=12, random_state=42)
+    model.fit(pd.DataFrame(X, columns=FLUENCY_FEATURES), y)
+    out = export_forest(model, str(tmp_path_factory.mktemp("forest") / "compiled"))
+    return model, CompiledForest.load(out), _data(np.random.default_rng(7), 3000, nan_frac)
+
+
+@pytest.mark.parametrize("rows", [1, 37, 3000])
+def test_predict_bit_identical(fitted, rows):
+    # 3000 rows takes the tree-by-tree path, smaller batches the all-trees path
+    model, forest, X = fitted
+    df = pd.DataFrame(X[:rows], columns=FLUENCY_FEATURES)
+    expected = model.predict(df)
+    got = forest.predict(df)
+    assert got.dtype == expected.dtype
+    assert np.array_equal(got.view(np.int64), expected.view(np.int64))
+
+
+def test_both_paths_agree(fitted, monkeypatch):
+    model, forest, X = fitted
+    small = forest.predict(X[:500])
+    monkeypatch.setattr(forest_artifact, "_TREE_MAJOR_MIN_ROWS", 1)
+    assert np.array_equal(forest.predict(X[:500]), small)
+
+
+def test_apply_matches_sklearn(fitted):
+    model, forest, X = fitted
+    leaves = forest.apply(X[:200]) - np.asarray(forest.roots)
+    assert np.array_equal(leaves, model.apply(pd.DataFrame(X[:200], columns=FLUENCY_FEATURES)))
+
+
+def test_rejects_wrong_width(fitted):
+    _, forest, X = fitted
+    with pytest.raises(ValueError):
+        forest.predict(X[:, :3])
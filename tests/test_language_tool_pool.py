@@ -0,0 +1,73 @@
+import sys
+import types
+
+import pytest
+
+from app.language_tool_pool import LanguageToolPool, LanguageToolUnavailable
+
+
+class FakeTool:
+    def __init__(self, language, **kwargs):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def _server_is_alive(self):
+        return not self.closed
+
+
+@pytest.fixture(autouse=True)
+def fake_language_tool(monkeypatch):
+    module = types.SimpleNamespace(LanguageTool=FakeTool)
+    monkeypatch.setitem(sys.modules, "language_tool_python", module)
+    return module
+
+
+def test_tool_borrowed_across_close_is_not_reused():
+    pool = LanguageToolPool(size=1)
+    pool.start()
+    with pool.acquire() as stale:
+        pool.close()
+    assert stale.closed
+    pool.start()
+    with pool.acquire() as fresh:
+        assert fresh is not stale and not fresh.closed
+    assert pool.health()["idle"] == 1
+
+
+def test_failed_start_backs_off(fake_language_tool, monkeypatch):
+    attempts = []
+
+    def failing(language, **kwargs):
+        attempts.append(language)
+        raise OSError("no java")
+
+    fake_language_tool.LanguageTool = failing
+    clock = [1000.0]
+    monkeypatch.setattr("app.language_tool_pool.time.monotonic", lambda: clock[0])
+    pool = LanguageToolPool(size=2, retry_backoff=30)
+
+    with pytest.raises(OSError):
+        pool.start()
+    for _ in range(3):
+        with pytest.raises(LanguageToolUnavailable):
+            with pool.acquire():
+                pass
+    assert len(attempts) == 1
+
+    clock[0] += 31
+    with pytest.raises(OSError):
+        with pool.acquire():
+            pass
+    assert len(attempts) == 2
+    clock[0] += 31  # the second failure doubled the wait to 60 s
+    with pytest.raises(LanguageToolUnavailable):
+        with pool.acquire():
+            pass
+
+    fake_language_tool.LanguageTool = FakeTool
+    clock[0] += 30
+    with pool.acquire() as tool:
+        assert not tool.closed
+    assert pool.health()["start_failures"] == 0
@@ -0,0 +1,42 @@
+import wave
+
+import numpy as np
+from scipy.signal import resample_poly
+
+from app import segmentation
+from app.segmentation import stream_audio
+
+
+def _write_wav(path, samples, rate):
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes((samples * 32767).astype("<i2").tobytes())
+
+
+def _no_ffmpeg(audio_path, block_seconds):
+    raise FileNotFoundError("ffmpeg")
+    yield
+
+
+def test_16k_wav_streams_in_blocks(tmp_path):
+    samples = (0.5 * np.sin(np.arange(16000 * 3) / 7)).astype(np.float32)
+    _write_wav(tmp_path / "a.wav", samples, 16000)
+    blocks = list(stream_audio(str(tmp_path / "a.wav"), block_seconds=1))
+    assert [len(b) for b in blocks] == [16000] * 3
+    expected = (samples * 32767).astype("<i2").astype(np.float32) / 32768.0
+    assert np.array_equal(np.concatenate(blocks), expected)
+
+
+def test_48k_wav_resampled_in_one_pass(tmp_path, monkeypatch):
+    rate = 48000
+    t = np.arange(rate * 3) / rate
+    samples = (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+    _write_wav(tmp_path / "a.wav", samples, rate)
+    monkeypatch.setattr(segmentation, "_stream_ffmpeg", _no_ffmpeg)
+    got = np.concatenate(list(stream_audio(str(tmp_path / "a.wav"), block_seconds=1)))
+    pcm = (samples * 32767).astype("<i2").astype(np.float32) / 32768.0
+    expected = resample_poly(pcm, 1, 3).astype(np.float32)
+    # no filter edges at the 1 s block boundaries
+    np.testing.assert_allclose(got, expected, atol=1e-6)
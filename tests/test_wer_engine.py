@@ -0,0 +1,64 @@
+import random
+
+import jiwer
+import numpy as np
+import pytest
+
+from app import wer_engine
+from app.wer_engine import batch_wer, batch_cer, error_counts
+
+WORDS = ["the", "a", "cat", "sat", "on", "mat", "dog", "is", "was", "uh", "ran", "The", "mat."]
+
+
+def _sentence(rng, max_words=12):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(0, max_words))]
+    # irregular whitespace exercises jiwer's RemoveMultipleSpaces/Strip normalisation
+    return "".join(w + rng.choice([" ", " ", "  ", "\t"]) for w in words).strip(rng.choice([" ", ""]))
+
+
+@pytest.fixture(scope="module")
+def pairs():
+    rng = random.Random(0)
+    refs, hyps = [], []
+    for _ in range(400):
+        ref = _sentence(rng)
+        if not ref.strip():
+            ref = "the cat"
+        hyp = rng.choice([ref, _sentence(rng), "", ref.upper(), ref + " uh um"])
+        refs.append(ref)
+        hyps.append(hyp)
+    return refs, hyps
+
+
+def test_batch_wer_matches_jiwer(pairs):
+    refs, hyps = pairs
+    expected = [jiwer.wer(r, h) for r, h in zip(refs, hyps)]
+    assert batch_wer(refs, hyps, workers=1).tolist() == expected
+
+
+def test_batch_cer_matches_jiwer(pairs):
+    refs, hyps = pairs
+    expected = [jiwer.cer(r, h) for r, h in zip(refs, hyps)]
+    assert batch_cer(refs, hyps, workers=1).tolist() == expected
+
+
+def test_edit_split_matches_jiwer(pairs):
+    refs, hyps = pairs
+    counts = error_counts(refs, hyps, "word", workers=1)
+    for k, (r, h) in enumerate(zip(refs, hyps)):
+        out = jiwer.process_words(r, h)
+        got = (counts["substitutions"][k], counts["deletions"][k], counts["insertions"][k], counts["hits"][k])
+        assert got == (out.substitutions, out.deletions, out.insertions, out.hits), (r, h)
+
+
+def test_parallel_path_matches_serial(pairs, monkeypatch):
+    refs, hyps = pairs
+    monkeypatch.setattr(wer_engine, "WER_PARALLEL_MIN_PAIRS", 1)
+    assert batch_wer(refs, hyps, workers=2).tolist() == batch_wer(refs, hyps, workers=1).tolist()
+
+
+def test_empty_reference_is_nan():
+    rates = batch_wer(["", "a b"], ["a", "a b"], workers=1)
+    assert np.isnan(rates[0]) and rates[1] == 0.0
+    with pytest.raises(ValueError):
+        jiwer.wer("", "a")
@@ -0,0 +1,41 @@
+import sys
+import types
+
+import pytest
+
+from app import whisper_registry
+from app.whisper_registry import WhisperModelRegistry
+
+
+class FakeModel:
+    def __init__(self, name, device):
+        self.name, self.device, self.halved = name, device, False
+
+    def half(self):
+        self.halved = True
+        return self
+
+
+@pytest.fixture(autouse=True)
+def fake_whisper(monkeypatch):
+    module = types.SimpleNamespace(load_model=lambda name, device=None: FakeModel(name, device))
+    monkeypatch.setitem(sys.modules, "whisper", module)
+
+
+def test_float16_ignored_on_cpu():
+    registry = WhisperModelRegistry()
+    model = registry.get("base", device="cpu", dtype="float16")
+    assert not model.halved
+    assert registry.loaded() == [("base", "cpu", "float32")]
+
+
+def test_float16_on_gpu_halves_the_model():
+    model = WhisperModelRegistry().get("base", device="cuda", dtype="float16")
+    assert model.halved
+
+
+@pytest.mark.parametrize("device,expected", [("cpu", False), ("cuda", True)])
+def test_fp16_decoding_flag_follows_device(monkeypatch, device, expected):
+    monkeypatch.setattr(whisper_registry, "WHISPER_DTYPE", "float16")
+    monkeypatch.setattr(whisper_registry, "WHISPER_DEVICE", device)
+    assert whisper_registry.whisper_fp16() is expected